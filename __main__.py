@@ -0,0 +1,4 @@
+from .casp12_cli import main
+
+
+main()
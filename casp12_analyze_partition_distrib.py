@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
 from re import compile
-from sqlite3 import connect
-from casp12.database import create_result_database, store_domains
+from casp12.database import connect_database, create_result_database, \
+    materialise_domain_size, migrate_segment_length, save_or_dump, \
+    store_domains
+from casp12.internal.instrument import add_instrument_arguments, \
+    start_instrumentation
 
 '''
  Analyze domain partition distribution in target set, storing result in database
@@ -66,7 +69,7 @@ def print_domains(domains):
 # Main; for callable scripts
 def main():
     from argparse import ArgumentParser
-    from sys import argv, stdin, stdout
+    from sys import argv, stderr, stdin, stdout
     from os.path import isfile
     parser = ArgumentParser(
         description="Analyze domain partition distribution in a target set" +
@@ -81,17 +84,32 @@ def main():
         "-nameregex", nargs=1, default=["^.*/(T\d{4})/.*$"], metavar="TEXT",
         help="Regex to use for extracting targetnames from file pathnames" +
              ", default=^.*/(T\d{4})/.*$")
+    parser.add_argument(
+        "-gzip", action="store_true", default=False,
+        help="Compress the SQL dump to STDOUT, default=plain text")
     parser.add_argument(
         "-method", nargs=1, default=[None], metavar="INT",
         help="CASP experiment serial, default=12")
+    parser.add_argument(
+        "-pages", nargs=1, default=[-1], metavar="INT",
+        help="Pages to write per step of -snapshot, reporting progress on " +
+             "STDERR, default=-1 (all at once)")
+    parser.add_argument(
+        "-snapshot", nargs=1, default=[None], metavar="FILE",
+        help="Build a new database in memory and write it to FILE when " +
+             "done, rather than dumping it; not with -db, default=None")
     parser.add_argument(
         "-target", nargs=1, default=[None], metavar="TEXT",
         help="Target name (if reading STDIN), default=None")
+    add_instrument_arguments(parser, profile="ingest")
     parser.add_argument('-v', '--version', action='version',
                         version=get_version_str())
     parser.add_argument(
         "files", nargs="*", metavar="FILE", help="Files for input")
     arguments = parser.parse_args(argv[1:])
+    start_instrumentation(arguments.report[0], arguments.trace[0])
+    if arguments.db[0] is not None and arguments.snapshot[0] is not None:
+        parser.error("-snapshot can not be used with -db")
     files = arguments.files
     # Use stdin if no supplied interface
     if len(arguments.files) == 0:
@@ -127,24 +145,30 @@ def main():
     if db is not None:
         # If database already exists; just open it
         if isfile(db):
-            database = connect(db)
+            database = connect_database(db, profile=arguments.profile[0])
+            # Replace segment length triggers of older databases
+            migrate_segment_length(database)
+            # and the domain_size view, by its materialised table
+            materialise_domain_size(database)
         else:
             #otherwise create a new one
-            database = create_result_database(db)
+            database = create_result_database(
+                db, profile=arguments.profile[0])
     else:
-        database = create_result_database()
+        database = create_result_database(profile=arguments.profile[0])
 
     # Write data to database
     store_domains(domains, database, method, casp=casp)
 
-    # commit and close database,
-    if db is not None:
-        database.commit()
-        database.close()
-    else:
-        # or blurt sql-dump to stdout, if no database specified
-        for line in database.iterdump():
-            print(line)
+    # commit and close database, write a snapshot, or dump to STDOUT
+    pages = int(arguments.pages[0])
+    progress = None
+    if pages > 0:
+        progress = lambda status, remaining, total: print(
+            "Snapshot: {} of {} pages written".format(total - remaining, total),
+            file=stderr)
+    save_or_dump(database, db, snapshot=arguments.snapshot[0],
+                 compress=arguments.gzip, pages=pages, progress=progress)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+from os import makedirs, path
+from socket import gethostname
+from casp12.interface.batch import create_state_database, \
+    find_eligible_targets, partition_command, print_batch_summary, \
+    read_model_list, reset_interrupted_jobs, run_batch
+from casp12.database import get_target_run_times
+from casp12.interface.schedule import estimate_cost, predict_costs
+from casp12.interface.targets import find_models
+from casp12.internal.instrument import add_instrument_arguments, \
+    start_instrumentation
+
+'''
+ Run the CASP12 domain partitioner in parallel over a set of targets
+ Copyright (C) 2017  Robert Pilstål
+
+   This program is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+
+   This program is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with this program. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+# Version and license information
+def get_version_str():
+    return "\n".join([
+        "casp12_batch_partition  Copyright (C) 2017  Robert Pilstål;",
+        "This program comes with ABSOLUTELY NO WARRANTY.",
+        "This is free software, and you are welcome to redistribute it",
+        "under certain conditions; see supplied General Public License."
+    ])
+
+
+# Main; for callable scripts
+def main():
+    from argparse import ArgumentParser
+    from sys import argv, exit
+    parser = ArgumentParser(
+        description="Partition CASP targets in parallel, keeping track of " +
+                    "finished and failed jobs so that runs can be resumed.")
+    parser.add_argument(
+        "-models", nargs=1, default=[None], metavar="SUFFIX",
+        help="Model listing relative to target dir, e.g. " +
+             "server_models.stage2/pcons.in, default=search target dir for " +
+             "models")
+    parser.add_argument(
+        "-nodraw", action="store_true", default=False,
+        help="Do not draw the partitions")
+    parser.add_argument(
+        "-overwrite", action="store_true", default=False,
+        help="Partition again targets finished outside of the job state " +
+             "database (e.g. by casp12_partition.sh), default=keep their " +
+             "domains.def")
+    parser.add_argument(
+        "-partitioner", nargs=1,
+        default=["spectral_domain_partition_tensor_filtering_adjacency"],
+        metavar="str",
+        help="MATLAB partitioner function, " +
+             "default=spectral_domain_partition_tensor_filtering_adjacency")
+    parser.add_argument(
+        "-qa", nargs=1, default=["quality_assessment.pcs"], metavar="SUFFIX",
+        help="QA file relative to target dir, " +
+             "default=quality_assessment.pcs")
+    parser.add_argument(
+        "-lease", nargs=1, default=[3600], metavar="int",
+        help="Seconds until a queue lease of a crashed node may be " +
+             "reclaimed, default=3600")
+    parser.add_argument(
+        "-queue", nargs=1, default=[None], metavar="DIR",
+        help="Shared work queue directory; lease targets from it so that " +
+             "nodes mounting the same storage split the targets between " +
+             "them. Remove <target>.done from it to rerun a target; " +
+             "failed targets are marked <target>.failed until a -retry " +
+             "run, default=None")
+    parser.add_argument(
+        "-retry", action="store_true", default=False,
+        help="Rerun targets that failed in an earlier run")
+    parser.add_argument(
+        "-state", nargs=1, default=[None], metavar="FILE",
+        help="Job state database, default=<out_dir>/batch_state.db, or " +
+             "<out_dir>/batch_state_<host>.db with -queue")
+    parser.add_argument(
+        "-summary", action="store_true", default=False,
+        help="Only print the job summary of the state database")
+    parser.add_argument(
+        "-workers", nargs=1, default=[1], metavar="int",
+        help="Number of partitions to run concurrently, default=1")
+    add_instrument_arguments(parser)
+    parser.add_argument('-v', '--version', action='version',
+                        version=get_version_str())
+    parser.add_argument(
+        "output", nargs=1, metavar="DIR", help="Directory where to save output")
+    parser.add_argument(
+        "directories", nargs="*", metavar="DIR",
+        help="Directories wherein targets are found, as subdirs")
+    arguments = parser.parse_args(argv[1:])
+    start_instrumentation(arguments.report[0], arguments.trace[0])
+
+    # Set variables here
+    output = arguments.output[0]
+    modelsuffix = arguments.models[0]
+    qasuffix = arguments.qa[0]
+    partitioner = arguments.partitioner[0]
+    queue = arguments.queue[0]
+    expiry = float(arguments.lease[0])
+    statefile = arguments.state[0]
+    if statefile is None:
+        # Nodes sharing a queue keep separate state, never sharing a SQLite
+        # file over NFS
+        statefile = path.join(output, "batch_state.db" if queue is None else
+                              "batch_state_{}.db".format(gethostname()))
+    workers = int(arguments.workers[0])
+
+    makedirs(output, exist_ok=True)
+    database = create_state_database(statefile)
+
+    if not arguments.summary:
+        # Jobs still running in the state file were orphaned by a crash
+        interrupted = reset_interrupted_jobs(database)
+        if interrupted > 0:
+            print("Resuming {} interrupted jobs".format(interrupted))
+
+        # Check so that these are targets ready for partitioning
+        required = [qasuffix]
+        if modelsuffix is not None:
+            required.append(modelsuffix)
+        (eligible, skipped) = find_eligible_targets(arguments.directories,
+                                                    required=required)
+        for target in sorted(skipped):
+            print("{:<12} {}".format("SKIPPING", skipped[target]))
+
+        # Define the partition job of each target
+        jobs = {}
+        estimates = {}
+        for target in eligible:
+            targetdir = eligible[target]
+            outputdir = path.join(output, target)
+            try:
+                if modelsuffix is not None:
+                    models = read_model_list(path.join(targetdir, modelsuffix))
+                else:
+                    models = sorted(find_models(targetdir).values())
+            except FileNotFoundError:
+                print("{:<12} {}".format("SKIPPING", targetdir))
+                continue
+            jobs[target] = (outputdir, partition_command(
+                partitioner, outputdir, path.join(targetdir, qasuffix), models))
+            estimates[target] = estimate_cost(len(models), None)
+
+        # Start the largest targets first, as timed before if they were
+        (predicted, scale) = predict_costs(
+            estimates, get_target_run_times(database, "partition"))
+        run_batch(jobs, database, workers=workers, draw=not arguments.nodraw,
+                  retry=arguments.retry, queue=queue, expiry=expiry,
+                  costs=predicted if scale is not None else estimates,
+                  adopt=not arguments.overwrite)
+
+    (succeeded, failed) = print_batch_summary(database)
+    database.close()
+
+    if failed > 0:
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+from json import dump, load
+from casp12.interface.benchmark import benchmark_hotpaths, \
+    compare_hotpaths, hotpath_workloads, time_startup
+from casp12.interface.synthetic import synthetic_scales
+from casp12.internal.instrument import add_instrument_arguments, \
+    start_instrumentation
+
+
+'''
+ Benchmark the hot paths of the pipeline on synthetic datasets
+ Copyright (C) 2017  Robert Pilstål
+
+   This program is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+
+   This program is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with this program. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+# Version and license information
+def get_version_str():
+    return "\n".join([
+        "casp12_benchmark_hotpaths  Copyright (C) 2017  Robert Pilstål;",
+        "This program comes with ABSOLUTELY NO WARRANTY.",
+        "This is free software, and you are welcome to redistribute it",
+        "under certain conditions; see supplied General Public License."
+    ])
+
+
+# Library functions
+def format_timings(timings):
+    scales = list(timings)
+    hotpaths = list(next(iter(timings.values())))
+    lines = ["{:<28}".format("hot path") +
+             "".join(["{:>12}".format(scale) for scale in scales])]
+    for hotpath in hotpaths:
+        lines.append("{:<28}".format(hotpath) + "".join(
+            ["{:>12}".format("-" if timings[scale][hotpath] is None else
+                             "{:.4f}".format(timings[scale][hotpath]))
+             for scale in scales]))
+    return "\n".join(lines)
+
+
+def format_comparison(comparison):
+    lines = ["{:<10} {:<28} {:>10} {:>10} {:>7}".format(
+        "scale", "hot path", "baseline", "current", "ratio")]
+    for (scale, hotpath, before, seconds, ratio, slower) in comparison:
+        lines.append("{:<10} {:<28} {:>10.4f} {:>10.4f} {:>7.2f}{}".format(
+            scale, hotpath, before, seconds, ratio,
+            "  REGRESSION" if slower else ""))
+    return "\n".join(lines)
+
+
+# Main; for callable scripts
+def main():
+    from argparse import ArgumentParser
+    from sys import argv, exit
+    parser = ArgumentParser(
+        description="Time the hot paths of the pipeline on synthetic " +
+                    "datasets of several sizes, in seconds (best of " +
+                    "repeats); save the results as JSON and compare them " +
+                    "with an earlier run")
+    parser.add_argument(
+        "-baseline", nargs=1, default=[None], metavar="FILE",
+        help="JSON results of an earlier run to compare with; exit with " +
+             "status 1 on regressions, default=None")
+    parser.add_argument(
+        "-hotpaths", nargs=1, default=[None], metavar="str",
+        help="Hot paths to time [" + ",".join(hotpath_workloads) +
+             "], default=all")
+    parser.add_argument(
+        "-output", nargs=1, default=[None], metavar="FILE",
+        help="Save the results as JSON to FILE, default=None")
+    parser.add_argument(
+        "-repeat", nargs=1, default=[3], metavar="INT",
+        help="Runs of each hot path, the best is reported, default=3")
+    parser.add_argument(
+        "-scales", nargs=1, default=[None], metavar="str",
+        help="Dataset sizes [" + ",".join(synthetic_scales) +
+             "], default=all")
+    parser.add_argument(
+        "-seed", nargs=1, default=[0], metavar="INT",
+        help="Random seed of the datasets, default=0")
+    parser.add_argument(
+        "-startup", action="store_true", default=False,
+        help="Also time the start of each casp12 subcommand, as the " +
+             "startup scale")
+    parser.add_argument(
+        "-tolerance", nargs=1, default=[0.25], metavar="FLOAT",
+        help="Relative slowdown tolerated against the baseline, " +
+             "default=0.25")
+    add_instrument_arguments(parser)
+    parser.add_argument('-v', '--version', action='version',
+                        version=get_version_str())
+    arguments = parser.parse_args(argv[1:])
+    start_instrumentation(arguments.report[0], arguments.trace[0])
+
+    # Set variables here
+    scales = arguments.scales[0]
+    if scales is not None:
+        scales = scales.split(",")
+    hotpaths = arguments.hotpaths[0]
+    if hotpaths is not None:
+        hotpaths = hotpaths.split(",")
+
+    results = benchmark_hotpaths(scales=scales, hotpaths=hotpaths,
+                                 repeat=int(arguments.repeat[0]),
+                                 seed=int(arguments.seed[0]))
+    print(format_timings(results["timings"]))
+    if arguments.startup:
+        startup = time_startup(repeat=int(arguments.repeat[0]))
+        print(format_timings({"startup": startup}))
+        results["timings"]["startup"] = startup
+    if arguments.output[0] is not None:
+        with open(arguments.output[0], 'w') as outfile:
+            dump(results, outfile, indent=2)
+
+    if arguments.baseline[0] is not None:
+        with open(arguments.baseline[0], 'r') as infile:
+            baseline = load(infile)
+        comparison = compare_hotpaths(baseline, results,
+                                      tolerance=float(arguments.tolerance[0]))
+        print(format_comparison(comparison))
+        if any([slower for (scale, hotpath, before, seconds, ratio, slower)
+                in comparison]):
+            exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+from os import path
+from tempfile import gettempdir
+from casp12.database import connect_database, \
+    get_method_id_and_name_from_type
+from casp12.interface.benchmark import benchmark_profiles
+from casp12.internal.instrument import add_instrument_arguments, \
+    start_instrumentation
+
+
+'''
+ Benchmark SQLite PRAGMA profiles on ingest and query workloads
+ Copyright (C) 2017  Robert Pilstål
+
+   This program is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+
+   This program is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with this program. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+# Version and license information
+def get_version_str():
+    return "\n".join([
+        "casp12_benchmark_profiles  Copyright (C) 2017  Robert Pilstål;",
+        "This program comes with ABSOLUTELY NO WARRANTY.",
+        "This is free software, and you are welcome to redistribute it",
+        "under certain conditions; see supplied General Public License."
+    ])
+
+
+# Library functions
+def format_timings(timings):
+    profiles = list(next(iter(timings.values())))
+    lines = ["{:<20}".format("workload") +
+             "".join(["{:>12}".format(profile) for profile in profiles])]
+    for workload in timings:
+        lines.append("{:<20}".format(workload) + "".join(
+            ["{:>12}".format("-" if timings[workload][profile] is None else
+                             "{:.3f}".format(timings[workload][profile]))
+             for profile in profiles]))
+    return "\n".join(lines)
+
+
+# Main; for callable scripts
+def main():
+    from argparse import ArgumentParser
+    from sys import argv
+    parser = ArgumentParser(
+        description="Time ingest and query workloads on a result database " +
+                    "under each SQLite PRAGMA profile, in seconds (best of " +
+                    "repeats)")
+    parser.add_argument(
+        "-models", nargs=1, default=[200], metavar="INT",
+        help="Number of models to ingest, default=200")
+    parser.add_argument(
+        "-profiles", nargs=1, default=[None], metavar="str",
+        help="Profiles to benchmark [default,ingest,analysis,readonly], " +
+             "default=all")
+    parser.add_argument(
+        "-repeat", nargs=1, default=[3], metavar="INT",
+        help="Runs of each workload, the best is reported, default=3")
+    parser.add_argument(
+        "-scratch", nargs=1, default=[gettempdir()], metavar="DIR",
+        help="Directory for the ingest scratch database, default=" +
+             gettempdir())
+    add_instrument_arguments(parser)
+    parser.add_argument('-v', '--version', action='version',
+                        version=get_version_str())
+    parser.add_argument(
+        "database", nargs=1, metavar="DATABASE",
+        help="SQLite3 result database to benchmark on, not modified")
+    arguments = parser.parse_args(argv[1:])
+    start_instrumentation(arguments.report[0], arguments.trace[0])
+
+    # Set variables here
+    datafile = arguments.database[0]
+    profiles = arguments.profiles[0]
+    if profiles is not None:
+        profiles = profiles.split(",")
+    scratch = path.join(arguments.scratch[0], "casp12_benchmark_profiles.db")
+
+    database = connect_database(datafile, wal=False)
+    (method_ids, method_names) = get_method_id_and_name_from_type(
+        database, ["qa", "compounder"])
+    database.close()
+
+    timings = benchmark_profiles(datafile, method_ids, scratch,
+                                 profiles=profiles,
+                                 models=int(arguments.models[0]),
+                                 repeat=int(arguments.repeat[0]))
+    print(format_timings(timings))
+
+
+if __name__ == '__main__':
+    main()
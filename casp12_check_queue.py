@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+from multiprocessing import Process
+from os import O_APPEND, O_CREAT, O_WRONLY, close, getpid, makedirs, \
+    open as os_open, path, utime, write
+from random import Random
+from tempfile import mkdtemp
+from time import sleep, time
+from casp12.interface.workqueue import get_lease_file_name, is_done, \
+    work_queue
+
+
+'''
+ Check that workers sharing a queue process every item exactly once
+ Copyright (C) 2017  Robert Pilstål
+
+   This program is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+
+   This program is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with this program. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+# Version and license information
+def get_version_str():
+    return "\n".join([
+        "casp12_check_queue  Copyright (C) 2017  Robert Pilstål;",
+        "This program comes with ABSOLUTELY NO WARRANTY.",
+        "This is free software, and you are welcome to redistribute it",
+        "under certain conditions; see supplied General Public License."
+    ])
+
+
+# Library functions
+def get_log_file_name(queuedir):
+    return path.join(queuedir, "processed.log")
+
+
+def seed_stale_leases(queuedir, items, age):
+    """Leave leases of crashed workers on items, for the workers to reclaim
+
+    :param queuedir: shared queue directory, string
+    :param items: iterable of items
+    :param age: seconds since the leases were last renewed, float
+    """
+    for item in items:
+        leasefile = get_lease_file_name(queuedir, item)
+        with open(leasefile, 'w') as outfile:
+            outfile.write("crashed.0\n")
+        utime(leasefile, (time() - age, time() - age))
+
+
+def process_queue(queuedir, items, expiry, work, seed):
+    """Work through the queue as a worker would, logging each processed item
+       with one atomic append to a shared log
+
+    :param queuedir: shared queue directory, string
+    :param items: list of items
+    :param expiry: seconds until an unrenewed lease may be reclaimed, float
+    :param work: longest seconds of simulated work per item, float
+    :param seed: random seed of the work times
+    """
+    random = Random(seed)
+    for item in work_queue(queuedir, items, expiry=expiry, poll=0.05):
+        sleep(random.uniform(0, work))
+        descriptor = os_open(get_log_file_name(queuedir),
+                             O_WRONLY | O_APPEND | O_CREAT)
+        write(descriptor, "{} {}\n".format(item, getpid()).encode())
+        close(descriptor)
+
+
+def check_queue(queuedir, items, workers, expiry=60.0, work=0.01, stale=0):
+    """Run concurrent worker processes on a shared queue and count how many
+       times each item was processed
+
+    :param queuedir: shared queue directory, string
+    :param items: list of items
+    :param workers: number of worker processes, integer
+    :param expiry: seconds until an unrenewed lease may be reclaimed, float
+    :param work: longest seconds of simulated work per item, float
+    :param stale: number of items starting with an expired lease, integer
+    :return: dictionary with items as keys and times processed as values,
+             and list of items not marked done
+    """
+    makedirs(queuedir, exist_ok=True)
+    seed_stale_leases(queuedir, items[:stale], 10 * expiry)
+    processes = [Process(target=process_queue,
+                         args=(queuedir, items, expiry, work, worker))
+                 for worker in range(workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    counts = {item: 0 for item in items}
+    logfile = get_log_file_name(queuedir)
+    if path.exists(logfile):
+        with open(logfile, 'r') as infile:
+            for line in infile:
+                counts[line.split()[0]] += 1
+    return counts, [item for item in items if not is_done(queuedir, item)]
+
+
+# Main; for callable scripts
+def main():
+    from argparse import ArgumentParser
+    from sys import argv, exit
+    parser = ArgumentParser(
+        description="Start several worker processes on a shared work queue " +
+                    "directory, some items starting with expired leases of " +
+                    "crashed workers, and check that every item is " +
+                    "processed exactly once. Exits with status 1 otherwise.")
+    parser.add_argument(
+        "-items", nargs=1, default=[200], metavar="INT",
+        help="Number of queue items, default=200")
+    parser.add_argument(
+        "-queue", nargs=1, default=[None], metavar="DIR",
+        help="Queue directory, e.g. on NFS to check it there; must not " +
+             "exist, default=new temporary directory")
+    parser.add_argument(
+        "-stale", nargs=1, default=[50], metavar="INT",
+        help="Items starting with an expired lease, default=50")
+    parser.add_argument(
+        "-work", nargs=1, default=[0.01], metavar="FLOAT",
+        help="Longest seconds of simulated work per item, default=0.01")
+    parser.add_argument(
+        "-workers", nargs=1, default=[8], metavar="INT",
+        help="Number of worker processes, default=8")
+    parser.add_argument('-v', '--version', action='version',
+                        version=get_version_str())
+    arguments = parser.parse_args(argv[1:])
+
+    # Set variables here
+    queuedir = arguments.queue[0]
+    if queuedir is None:
+        queuedir = mkdtemp(prefix="casp12_queue_")
+    elif path.exists(queuedir):
+        parser.error("-queue {} exists, give a new directory".format(queuedir))
+    items = ["T{:04d}".format(item) for item in range(int(arguments.items[0]))]
+
+    (counts, undone) = check_queue(queuedir, items, int(arguments.workers[0]),
+                                   work=float(arguments.work[0]),
+                                   stale=int(arguments.stale[0]))
+    wrong = {item: counts[item] for item in counts if counts[item] != 1}
+    for item in sorted(wrong):
+        print("{:<12} processed {} times".format(item, wrong[item]))
+    for item in undone:
+        print("{:<12} not done".format(item))
+    print("{} items, {} processed other than once, {} not done ({})".format(
+        len(items), len(wrong), len(undone), queuedir))
+    if wrong or undone:
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+from importlib import import_module
+import sys
+
+
+'''
+ Single entry point to the casp12 programs, as subcommands
+ Copyright (C) 2017  Robert Pilstål
+
+   This program is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+
+   This program is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with this program. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+# Subcommands, with the module implementing each and a short summary; a module
+# (and with it numpy, pandas, matplotlib, lxml etc.) is only imported when its
+# subcommand is run
+subcommands = {
+    "analyze_partition_distrib": ("casp12_analyze_partition_distrib",
+                                  "Analyze domain partition distribution"),
+    "assign_topology": ("casp12_assign_topology",
+                        "Assign topology to tempfactors"),
+    "batch_partition": ("casp12_batch_partition",
+                        "Partition CASP targets in parallel"),
+    "benchmark_hotpaths": ("casp12_benchmark_hotpaths",
+                           "Time the hot paths on synthetic datasets"),
+    "benchmark_profiles": ("casp12_benchmark_profiles",
+                           "Time SQLite PRAGMA profiles on a database"),
+    "check_queue": ("casp12_check_queue",
+                    "Check concurrent workers on a shared work queue"),
+    "download_tables": ("casp12_download_tables",
+                        "Download table data from predictioncenter.org"),
+    "export_parquet": ("casp12_export_parquet",
+                       "Export QA results to Parquet files"),
+    "federate": ("casp12_federate",
+                 "Run one query over several result databases"),
+    "parse_lga_lddt": ("casp12_parse_lga_lddt",
+                       "Parse CASP LGA LDDT files"),
+    "parse_lga_sda": ("casp12_parse_lga_sda", "Parse CASP LGA SDA files"),
+    "parse_qa": ("casp12_parse_qa", "Parse CASP QA files"),
+    "pcons": ("casp12_pcons", "Run vanilla PCONS on CASP datadirs"),
+    "pcons_domain_defs": ("casp12_pcons_domain_defs",
+                          "Write pcons domain definitions"),
+    "pcons_domains": ("casp12_pcons_domains",
+                      "Run PCONS using domain definitions"),
+    "pdb_tensor": ("casp12_pdb_tensor", "Print a MATLAB distance tensor"),
+    "plot_correlation": ("casp12_plot_correlation",
+                         "Plot correlation matrices"),
+    "plot_partdistribution": ("casp12_plot_partdistribution",
+                              "Plot domain partition distributions"),
+    "plot_scatter": ("casp12_plot_scatter", "Plot correlate scatterplots"),
+    "plot_targets": ("casp12_plot_targets",
+                     "Render correlation and density figures per target"),
+    "qa_vector": ("casp12_qa_vector", "Operate on QA vectors"),
+    "read_server_translation": ("casp12_read_server_translation",
+                                "Identify CASP servers from online web"),
+    "reformat_partition": ("casp12_reformat_partition",
+                           "Reformat partition.dat to domains.def"),
+    "run_report": ("casp12_run_report",
+                   "Report the resources used by external tool runs"),
+    "shard_database": ("casp12_shard_database",
+                       "Split a result database into shards by target"),
+    "synthesize": ("casp12_synthesize", "Generate a synthetic CASP dataset"),
+    "target_information": ("casp12_target_information",
+                           "Read CASP target information from online web")
+}
+
+
+# Version and license information
+def get_version_str():
+    return "\n".join([
+        "casp12  Copyright (C) 2017  Robert Pilstål;",
+        "This program comes with ABSOLUTELY NO WARRANTY.",
+        "This is free software, and you are welcome to redistribute it",
+        "under certain conditions; see supplied General Public License."
+    ])
+
+
+# Library functions
+def format_subcommands():
+    return "\n".join(["subcommands:"] + [
+        "  {:<26}{}".format(subcommand, subcommands[subcommand][1])
+        for subcommand in subcommands])
+
+
+def run_subcommand(subcommand, arguments):
+    """Import the module of a subcommand and run its main function
+
+    :param subcommand: subcommand name, key of subcommands
+    :param arguments: list of command line arguments for the subcommand
+    :return: return value of main
+    """
+    # The programs read sys.argv themselves
+    sys.argv = ["casp12 " + subcommand] + list(arguments)
+    module = import_module("casp12." + subcommands[subcommand][0])
+    return module.main()
+
+
+# Main; for callable scripts
+def main():
+    from argparse import ArgumentParser, RawDescriptionHelpFormatter
+    parser = ArgumentParser(
+        prog="casp12",
+        description="Run one of the casp12 programs; see casp12 " +
+                    "SUBCOMMAND -h for its options",
+        epilog=format_subcommands(),
+        formatter_class=RawDescriptionHelpFormatter)
+    parser.add_argument('-v', '--version', action='version',
+                        version=get_version_str())
+    parser.add_argument(
+        "subcommand", nargs=1, metavar="SUBCOMMAND", choices=subcommands,
+        help="Program to run, see below")
+    # Only the subcommand is parsed here, the rest goes to the program
+    arguments = parser.parse_args(sys.argv[1:2])
+
+    run_subcommand(arguments.subcommand[0], sys.argv[2:])
+
+
+if __name__ == '__main__':
+    main()
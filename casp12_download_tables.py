@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 from casp12.interface.http import download_new_targets
 from casp12.interface.filesystem import identify_tarballs, unpack_tarballs
+from casp12.internal.instrument import add_instrument_arguments, \
+    start_instrumentation
 
 '''
  Download and unpack tables from predictioncenter.org or other
@@ -40,6 +42,7 @@ def main():
     parser.add_argument(
         "-regex", nargs=1, default=["^(T.\d+)[-.]"], metavar="str",
         help="Target regex to use, default='^(T.\d+)[-.]'")
+    add_instrument_arguments(parser)
     parser.add_argument('-v', '--version', action='version',
                         version=get_version_str())
     parser.add_argument(
@@ -47,6 +50,7 @@ def main():
     parser.add_argument(
         "destination", nargs=1, metavar="DIR", help="Destination directory")
     arguments = parser.parse_args(argv[1:])
+    start_instrumentation(arguments.report[0], arguments.trace[0])
 
     # Set variables here
     destination = arguments.destination[0]
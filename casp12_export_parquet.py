@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+from time import perf_counter
+from casp12.database import connect_database, \
+    get_method_id_and_name_from_type, iterate_result_rows
+from casp12.interface.pandas import write_parquet_dataset
+from casp12.internal.instrument import add_instrument_arguments, \
+    start_instrumentation
+
+
+'''
+ Export a quality assessment sqlite3 database to partitioned Parquet files
+ Copyright (C) 2017  Robert Pilstål
+
+   This program is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+
+   This program is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with this program. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+# Version and license information
+def get_version_str():
+    return "\n".join([
+        "casp12_export_parquet  Copyright (C) 2017  Robert Pilstål;",
+        "This program comes with ABSOLUTELY NO WARRANTY.",
+        "This is free software, and you are welcome to redistribute it",
+        "under certain conditions; see supplied General Public License."
+    ])
+
+
+# Library functions
+def read_target_selection(selection):
+    return set(selection.split(','))
+
+
+# Main; for callable scripts
+def main():
+    from argparse import ArgumentParser
+    from sys import argv
+    parser = ArgumentParser(
+        description="Export QA results to Parquet files partitioned by " +
+                    "target and method, for fast columnar loading with " +
+                    "casp12.interface.pandas.read_parquet_dataset")
+    parser.add_argument(
+        "-chunk", nargs=1, default=[100000], metavar="INT",
+        help="Number of rows to read from database at a time, " +
+             "default=100000")
+    parser.add_argument(
+        "-methods", nargs=1, default=[None], metavar="str",
+        help="QA method selection by name [method1,method2,etc.], " +
+             "default=None")
+    parser.add_argument(
+        "-targets", nargs=1, default=[None], metavar="str",
+        help="Target selection [target1,target2,target3,etc.], default=None")
+    add_instrument_arguments(parser, profile="analysis")
+    parser.add_argument('-v', '--version', action='version',
+                        version=get_version_str())
+    parser.add_argument(
+        "database", nargs=1, metavar="DATABASE", help="SQLite3 database to use")
+    parser.add_argument(
+        "output", nargs=1, metavar="DIR", help="Directory of Parquet dataset")
+    arguments = parser.parse_args(argv[1:])
+    start_instrumentation(arguments.report[0], arguments.trace[0])
+
+    # Set variables here
+    database = connect_database(arguments.database[0], wal=False,
+                                profile=arguments.profile[0])
+    output = arguments.output[0]
+    chunksize = int(arguments.chunk[0])
+    target_list = arguments.targets[0]
+    if target_list is not None:
+        target_list = sorted(read_target_selection(target_list))
+    methods = None
+    if arguments.methods[0] is not None:
+        selection = set(arguments.methods[0].split(','))
+        methods = [method_id for (method_id, name) in zip(
+            *get_method_id_and_name_from_type(database, ["qa", "compounder"]))
+                   if name in selection]
+
+    # Stream rows from database to Parquet
+    start = perf_counter()
+    rows = write_parquet_dataset(
+        iterate_result_rows(database, targets=target_list, methods=methods,
+                            chunksize=chunksize), output)
+    database.close()
+    print("Exported {} rows in {:.2f} s".format(rows, perf_counter() - start))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+from casp12.interface.federation import federate_query, open_federation
+from casp12.internal.instrument import add_instrument_arguments, \
+    start_instrumentation
+
+
+'''
+ Query several quality assessment sqlite3 databases as one
+ Copyright (C) 2017  Robert Pilstål
+
+   This program is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+
+   This program is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with this program. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+# Version and license information
+def get_version_str():
+    return "\n".join([
+        "casp12_federate  Copyright (C) 2017  Robert Pilstål;",
+        "This program comes with ABSOLUTELY NO WARRANTY.",
+        "This is free software, and you are welcome to redistribute it",
+        "under certain conditions; see supplied General Public License."
+    ])
+
+
+# Library functions
+
+
+# Main; for callable scripts
+def main():
+    from argparse import ArgumentParser
+    from sys import argv
+    parser = ArgumentParser(
+        description="Run one query over several result databases (e.g. one " +
+                    "per CASP round), attached side by side. Tables " +
+                    "method, target, model, qa, qascore and lscore are " +
+                    "union views with a source column, ID's are unique per " +
+                    "source only. A query with {schema} in place of the " +
+                    "schema of its tables (and optionally {source}) is run " +
+                    "on each database, and the results concatenated, which " +
+                    "keeps joins fast. Prints tab separated rows.")
+    add_instrument_arguments(parser, profile="readonly")
+    parser.add_argument('-v', '--version', action='version',
+                        version=get_version_str())
+    parser.add_argument(
+        "query", nargs=1, metavar="SQL", help="SELECT statement to run")
+    parser.add_argument(
+        "databases", nargs="+", metavar="DATABASE",
+        help="SQLite3 databases to query")
+    arguments = parser.parse_args(argv[1:])
+    start_instrumentation(arguments.report[0], arguments.trace[0])
+
+    # Set variables here
+    query = arguments.query[0].strip().rstrip(";")
+    (database, schemas) = open_federation(arguments.databases,
+                                          profile=arguments.profile[0])
+    for schema in schemas:
+        print("# {}\t{}".format(schema, schemas[schema]))
+
+    if "{schema}" in query:
+        query = federate_query(query, schemas)
+    cursor = database.execute(query)
+    print("\t".join([column[0] for column in cursor.description]))
+    for row in cursor:
+        print("\t".join([str(value) for value in row]))
+    database.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,10 @@
 #!/usr/bin/env python3
 from re import compile
-from sqlite3 import connect
-from casp12.database import get_or_add_method, save_or_dump
+from casp12.database import get_or_add_method, connect_database, save_or_dump
 from casp12.interface.filesystem import find_all_files
 from casp12.interface.casp import process_casp_lddt
+from casp12.internal.instrument import add_instrument_arguments, \
+    start_instrumentation
 
 
 '''
@@ -53,6 +54,11 @@ def main():
     parser.add_argument(
         "-casp", nargs=1, default=["12"], metavar="int",
         help="CASP integer experiment ID, default=12")
+    parser.add_argument(
+        "-commit", nargs=1, default=[60], metavar="int",
+        help="Seconds between commits, making results visible to " +
+             "concurrent readers, default=60")
+    add_instrument_arguments(parser, profile="ingest")
     parser.add_argument('-v', '--version', action='version',
                         version=get_version_str())
     parser.add_argument(
@@ -61,6 +67,7 @@ def main():
         "database", nargs=1, metavar="FILE",
         help="SQLite3 database file to store QA in")
     arguments = parser.parse_args(argv[1:])
+    start_instrumentation(arguments.report[0], arguments.trace[0])
 
     # Set variables here
     files = find_all_files(arguments.directory[0])
@@ -68,7 +75,9 @@ def main():
     m_model_domain = compile("(T.\d+)TS(\d+)_(\d+)-D(\d+)\.lddt\Z")
     casp = int(arguments.casp[0])
     databasefile = arguments.database[0]
-    database = connect(databasefile)
+    database = connect_database(databasefile,
+                                commit_interval=float(arguments.commit[0]),
+                                profile=arguments.profile[0])
 
     qa_method_name = "CASP{}_LGA_LDDT".format(casp)
     qa_method_desc = "CASP{} LGA_LDDT measure added by casp12_parse_lga_lddt.py".format(casp)
@@ -93,6 +102,7 @@ def main():
         for modelfile in models[target]:
             with open(modelfile, 'r') as infile:
                 qa = process_casp_lddt(infile, qa_method, database)
+            database.periodic_commit()
 
     # Save database
     save_or_dump(database, databasefile)
@@ -1,10 +1,11 @@
 #!/usr/bin/env python3
 from re import compile
-from sqlite3 import connect
-from casp12.database import get_caspserver_method, get_caspserver_name, get_method_type, update_caspserver_method, get_or_add_method, save_or_dump
+from casp12.database import get_caspserver_method, get_caspserver_name, get_method_type, update_caspserver_method, get_or_add_method, connect_database, save_or_dump
 from casp12.interface.filesystem import find_all_files
 from casp12.interface.casp import get_filename_info, process_casp_qa, QAError
 from casp12.definitions import method_type
+from casp12.internal.instrument import add_instrument_arguments, \
+    start_instrumentation
 
 
 '''
@@ -54,6 +55,11 @@ def main():
     parser.add_argument(
         "-casp", nargs=1, default=["12"], metavar="int",
         help="CASP integer experiment ID, default=12")
+    parser.add_argument(
+        "-commit", nargs=1, default=[60], metavar="int",
+        help="Seconds between commits, making results visible to " +
+             "concurrent readers, default=60")
+    add_instrument_arguments(parser, profile="ingest")
     parser.add_argument('-v', '--version', action='version',
                         version=get_version_str())
     parser.add_argument(
@@ -62,13 +68,16 @@ def main():
         "database", nargs=1, metavar="FILE",
         help="SQLite3 database file to store QA in")
     arguments = parser.parse_args(argv[1:])
+    start_instrumentation(arguments.report[0], arguments.trace[0])
 
     # Set variables here
     files = find_all_files(arguments.directory[0])
     m_model = compile("(T.\d+)QA(\d+)_(\d+)\Z")
     casp = int(arguments.casp[0])
     databasefile = arguments.database[0]
-    database = connect(databasefile)
+    database = connect_database(databasefile,
+                                commit_interval=float(arguments.commit[0]),
+                                profile=arguments.profile[0])
 
     qa_method_type = "qa"
 
@@ -101,6 +110,7 @@ def main():
                     qa = process_casp_qa(infile, qa_method, database)
                 except QAError:
                     print("Skipping {} : No QAs found".format(target))
+            database.periodic_commit()
 
     # Save database
     save_or_dump(database, databasefile)
@@ -1,10 +1,17 @@
 #!/usr/bin/env python3
+from time import perf_counter
 from casp12.interface.pcons import run_pcons, read_pcons, \
     write_scorefile, pcons_write_model_file, get_scorefile_name, which
 from casp12.interface.targets import find_targets, guess_casp_experiment, \
-    find_models, get_length
-from casp12.database import get_or_add_method, store_qa, store_models_and_servers, save_or_dump
-from sqlite3 import connect
+    find_models, load_target_domains
+from casp12.database import get_or_add_method, store_qa, store_models_and_servers, connect_database, save_or_dump, \
+    create_completed_table, get_completed_targets, store_completed_target, \
+    create_run_table, store_run, get_target_run_times, get_run_scaling
+from casp12.interface.schedule import estimate_cost, order_longest_first, \
+    predict_costs, run_longest_first, simulate_makespan
+from casp12.interface.workqueue import work_queue
+from casp12.internal.instrument import add_instrument_arguments, \
+    start_instrumentation
 
 '''
  Run vanilla PCONS on a CASP dataset
@@ -52,23 +59,41 @@ def main():
     parser.add_argument(
         "-db", nargs=1, metavar="file",
         help="database containing protein lengths")
+    parser.add_argument(
+        "-force", action="store_true", default=False,
+        help="Score targets again, default=skip targets already scored")
+    parser.add_argument(
+        "-lease", nargs=1, default=[3600], metavar="int",
+        help="Seconds until a queue lease of a crashed node may be " +
+             "reclaimed, default=3600")
     parser.add_argument(
         "-pcons", nargs=1, default=["pcons"], metavar="str",
         help="Location of pcons binary, if not in path etc.")
+    parser.add_argument(
+        "-queue", nargs=1, default=[None], metavar="DIR",
+        help="Shared work queue directory; lease targets from it so that " +
+             "nodes mounting the same storage split the targets between " +
+             "them (use a database per node), default=None")
     parser.add_argument(
         "-targets", nargs=1, default=[None], metavar="str",
         help="Target selection [target1,target2,target3,etc.], default=None")
     parser.add_argument(
         "-transform", action="store_true", default=False,
         help="Transform of distances (default=expect scores)")
+    parser.add_argument(
+        "-workers", nargs=1, default=[1], metavar="int",
+        help="Number of PCONS runs to have going at once, longest " +
+             "predicted first; 1 with -queue, default=1")
     parser.add_argument(
         "-write", action="store_true", default=False,
         help="Write out pcons text-files")
+    add_instrument_arguments(parser, profile="ingest")
     parser.add_argument('-v', '--version', action='version',
                         version=get_version_str())
     parser.add_argument(
         "files", nargs="*", metavar="PATH", help="Pathways to CASP data")
     arguments = parser.parse_args(argv[1:])
+    start_instrumentation(arguments.report[0], arguments.trace[0])
     files = arguments.files
 
     # Method definition
@@ -85,6 +110,11 @@ def main():
     target_casp = {}
     transform = arguments.transform
     write = arguments.write
+    queue = arguments.queue[0]
+    expiry = float(arguments.lease[0])
+    workers = int(arguments.workers[0])
+    if queue is not None and workers > 1:
+        parser.error("-workers can not be used with -queue, run more nodes")
 
     pcons = which(pcons)
 
@@ -107,19 +137,57 @@ def main():
         target_list = set(targets.keys())
 
     # Insert vanilla method, if not found
-    database = connect(sqlite_file)
+    database = connect_database(sqlite_file, profile=arguments.profile[0])
     method = get_or_add_method(method_name, method_desc, method_type_name, database)
 
-    # Run PCONS for each target
-    for target in target_list:
-        casp = target_casp[target]
+    # Skip targets already scored, e.g. by a run that crashed half way
+    create_completed_table(database)
+    create_run_table(database)
+    if not arguments.force:
+        completed = get_completed_targets(database, method)
+        for target in sorted(target_list & completed):
+            print("Skipping {} : already scored".format(target))
+        target_list = target_list - completed
+
+    # Read all target lengths at once
+    preloaded = load_target_domains(target_list, database)
+
+    # Start the targets predicted to take the longest first, so that no
+    # large target is left running alone at the end
+    target_models = {target: find_models(targets[target])
+                     for target in target_list}
+    estimates = {target: estimate_cost(len(target_models[target]),
+                                       preloaded[target]["length"])
+                 for target in target_list}
+    (predicted, scale) = predict_costs(
+        estimates, get_target_run_times(database, "pcons"),
+        scale=get_run_scaling(database).get("pcons", (0, None, None))[1])
+    order = order_longest_first(
+        predicted if scale is not None else estimates)
+
+    # Run PCONS on a target; in a worker thread, without using the database
+    def score_target(target):
+        models = target_models[target]
+        modelfile = pcons_write_model_file(targets[target], models)
+        usage = {}
+        pcons_results = read_pcons(run_pcons(modelfile, total_len=preloaded[target]["length"], d0=d0, pcons_binary=pcons, usage=usage), transform_distance=transform, d0=3)
+        return models, usage, pcons_results
+
+    # Only process the targets leased from the shared queue, if any
+    if queue is not None:
+        scored = ((target, score_target(target), None) for target in
+                  work_queue(queue, order, expiry=expiry))
+    else:
+        scored = run_longest_first(order, score_target, workers=workers)
+
+    # Store the results of each target as it is done
+    started = perf_counter()
+    processed = []
+    for (target, (models, usage, pcons_results), seconds) in scored:
         targetdir = targets[target]
-        models = find_models(targetdir)
-        # print(models)
-        modelfile = pcons_write_model_file(targetdir, models)
-        # print(modelfile)
-        length = get_length(target, database)
-        pcons_results = read_pcons(run_pcons(modelfile, total_len=length, d0=d0, pcons_binary=pcons), transform_distance=transform, d0=3)
+        length = preloaded[target]["length"]
+        store_run(database, "pcons", usage, target=target, method=method,
+                  models=len(models), length=length)
         # Store new servers and models
         (servers, modeltuples, filenames, servermethods,
          model_id) = store_models_and_servers(target, pcons_results, database)
@@ -132,6 +200,21 @@ def main():
             scorefile = get_scorefile_name(targetdir, method=method, partitioned=False)
             with open(scorefile, 'w') as outfile:
                 write_scorefile(outfile, pcons_results[0], pcons_results[1], d0=d0, transform=transform)
+        # Commit per target, so that a crash only loses the current target;
+        # also, results must be stored before the target is marked done in
+        # queue
+        store_completed_target(database, target, method)
+        database.commit()
+        processed.append(target)
+
+    if processed:
+        makespan = "unknown, no runs accounted before"
+        if scale is not None:
+            makespan = "{:.1f} s".format(simulate_makespan(
+                [target for target in order if target in processed],
+                predicted, workers=workers))
+        print("Makespan {:.1f} s, predicted {} ({} targets, {} workers)".format(
+            perf_counter() - started, makespan, len(processed), workers))
 
     # commit and close database
     save_or_dump(database, sqlite_file)
@@ -1,8 +1,11 @@
 #!/usr/bin/env python3
-from casp12.interface.pcons import pcons_domain_specifications, pcons_write_domain_files
+from casp12.interface.pcons import pcons_domain_specifications_all, \
+    pcons_write_all_domain_files
 from casp12.interface.targets import find_targets, guess_casp_experiment
 from casp12.casp12_pcons_domains import read_target_selection
-from sqlite3 import connect
+from casp12.database import connect_database
+from casp12.internal.instrument import add_instrument_arguments, \
+    start_instrumentation
 
 '''
  Write pcons domain definition (ignore) interface into given CASP datadir
@@ -45,17 +48,22 @@ def main():
     parser.add_argument(
         "-db", nargs=1, metavar="file",
         help="Domain definition database")
+    parser.add_argument(
+        "-force", action="store_true", default=False,
+        help="Rewrite ignore files even if their content is unchanged")
     parser.add_argument(
         "-method", nargs=1, metavar="int",
         help="Domain partition method ID")
     parser.add_argument(
         "-targets", nargs=1, default=[None], metavar="str",
         help="Target selection [target1,target2,target3,etc.], default=None")
+    add_instrument_arguments(parser, profile="analysis")
     parser.add_argument('-v', '--version', action='version',
                         version=get_version_str())
     parser.add_argument(
         "files", nargs="*", metavar="PATH", help="Pathways to CASP data")
     arguments = parser.parse_args(argv[1:])
+    start_instrumentation(arguments.report[0], arguments.trace[0])
     files = arguments.files
 
     # Set variables here
@@ -83,13 +91,17 @@ def main():
     else:
         target_list = set(targets.keys())
 
-    # Read domain definitions and write pcons ignore interface
-    database = connect(sqlite_file)
-    for target in target_list:
-        ignore_residues = pcons_domain_specifications(target_casp[target],
-                                                      target, database, method)
-        print(ignore_residues)
-        pcons_write_domain_files(targets[target], ignore_residues, method=method)
+    # Read all domain definitions and write pcons ignore interface
+    database = connect_database(sqlite_file, wal=False,
+                                profile=arguments.profile[0])
+    ignore_residues = pcons_domain_specifications_all(database, method,
+                                                      targets=target_list)
+    written = pcons_write_all_domain_files(targets, ignore_residues,
+                                           method=method,
+                                           only_changed=not arguments.force)
+    for target in sorted(written):
+        print("{}: {} domains, {} files written".format(
+            target, len(ignore_residues[target]), len(written[target])))
 
 
 if __name__ == '__main__':
@@ -1,11 +1,19 @@
 #!/usr/bin/env python3
+from time import perf_counter
 from casp12.interface.pcons import join_models, run_pcons, read_pcons, \
     write_scorefile, pcons_get_domain_file_name, pcons_get_model_file_name, \
     pcons_write_model_file, get_scorefile_name, which
 from casp12.interface.targets import find_targets, guess_casp_experiment, \
-    get_domain, find_models, get_length
-from casp12.database import get_or_add_method, store_qa, store_qa_compounded, store_models_and_servers, save_or_dump
-from sqlite3 import connect
+    find_models, load_target_domains
+from casp12.database import get_or_add_method, store_qa, store_qa_compounded, store_models_and_servers, connect_database, save_or_dump, \
+    create_completed_table, get_completed_targets, store_completed_target, \
+    create_run_table, store_run, get_target_run_times, get_run_scaling
+from casp12.interface.schedule import estimate_cost, order_longest_first, \
+    predict_costs, run_longest_first, simulate_makespan
+from casp12.interface.staging import remove_stale_stages, staged_models
+from casp12.interface.workqueue import work_queue
+from casp12.internal.instrument import add_instrument_arguments, \
+    start_instrumentation
 
 '''
  Run PCONS using domain definitions
@@ -56,23 +64,52 @@ def main():
     parser.add_argument(
         "-domainmethod", nargs=1, metavar="int",
         help="Domain partition method ID, as stored in DB (.e. check DB)")
+    parser.add_argument(
+        "-force", action="store_true", default=False,
+        help="Score targets again, default=skip targets already scored")
+    parser.add_argument(
+        "-lease", nargs=1, default=[3600], metavar="int",
+        help="Seconds until a queue lease of a crashed node may be " +
+             "reclaimed, default=3600")
     parser.add_argument(
         "-pcons", nargs=1, default=["pcons"], metavar="str",
         help="Location of pcons binary, if not in path etc.")
+    parser.add_argument(
+        "-queue", nargs=1, default=[None], metavar="DIR",
+        help="Shared work queue directory; lease targets from it so that " +
+             "nodes mounting the same storage split the targets between " +
+             "them (use a database per node), default=None")
+    parser.add_argument(
+        "-scratch", nargs=1, default=[None], metavar="DIR",
+        help="Node-local directory (disk or tmpfs, e.g. /dev/shm) to copy " +
+             "the models of a target to once, for all of its domain runs; " +
+             "removed when the target is done, default=None (read models " +
+             "where they are)")
+    parser.add_argument(
+        "-scratchlimit", nargs=1, default=[None], metavar="MB",
+        help="Megabytes of models to keep in -scratch at once, targets " +
+             "that do not fit read their models where they are, " +
+             "default=free space")
     parser.add_argument(
         "-targets", nargs=1, default=[None], metavar="str",
         help="Target selection [target1,target2,target3,etc.], default=None")
     parser.add_argument(
         "-transform", action="store_true", default=False,
         help="Transform distances (default=expect scores)")
+    add_instrument_arguments(parser, profile="ingest")
     parser.add_argument('-v', '--version', action='version',
                         version=get_version_str())
+    parser.add_argument(
+        "-workers", nargs=1, default=[1], metavar="int",
+        help="Number of targets to have going at once, longest " +
+             "predicted first; 1 with -queue, default=1")
     parser.add_argument(
         "-write", action="store_true", default=False,
         help="Write out pcons text-files")
     parser.add_argument(
         "files", nargs="*", metavar="PATH", help="Pathways to CASP data")
     arguments = parser.parse_args(argv[1:])
+    start_instrumentation(arguments.report[0], arguments.trace[0])
     files = arguments.files
 
     # Method definition
@@ -94,6 +131,15 @@ def main():
     target_casp = {}
     transform = arguments.transform
     write = arguments.write
+    queue = arguments.queue[0]
+    expiry = float(arguments.lease[0])
+    workers = int(arguments.workers[0])
+    scratch = arguments.scratch[0]
+    scratch_limit = arguments.scratchlimit[0]
+    if scratch_limit is not None:
+        scratch_limit = int(float(scratch_limit) * 1e6)
+    if queue is not None and workers > 1:
+        parser.error("-workers can not be used with -queue, run more nodes")
 
     pcons = which(pcons)
 
@@ -116,43 +162,96 @@ def main():
         target_list = set(targets.keys())
 
     # Determine method ID
-    database = connect(sqlite_file)
+    database = connect_database(sqlite_file, profile=arguments.profile[0])
     method = get_or_add_method(
         method_name + " on partitioner {}".format(domainmethod), method_desc,
         method_type_name, database)
     vanilla_method = get_or_add_method("vanilla", "PCONS on full model, vanilla style", "qa", database)
 
+    # Skip targets already scored, e.g. by a run that crashed half way
+    create_completed_table(database)
+    create_run_table(database)
+    if not arguments.force:
+        completed = get_completed_targets(database, method)
+        for target in sorted(target_list & completed):
+            print("Skipping {} : already scored".format(target))
+        target_list = target_list - completed
+
+    # Read domains, components and lengths of all targets at once
+    preloaded = load_target_domains(target_list, database, method=domainmethod)
 
-    # Run PCONS for each target and domain, then join the PCONS models
-    for target in target_list:
-        casp = target_casp[target]
-        (components, domains) = get_domain(target, domainmethod, database)
+    # Start the targets predicted to take the longest first, so that no
+    # large target is left running alone at the end
+    target_models = {target: find_models(targets[target])
+                     for target in target_list}
+    estimates = {target: estimate_cost(
+        len(target_models[target]), preloaded[target]["length"],
+        domains=len(preloaded[target]["components"]))
+        for target in target_list}
+    (predicted, scale) = predict_costs(
+        estimates, get_target_run_times(database, "pcons", domains=True),
+        scale=get_run_scaling(database).get("pcons", (0, None, None))[1])
+    order = order_longest_first(
+        predicted if scale is not None else estimates)
+
+    # Staging directories of crashed runs would fill up scratch
+    if scratch is not None:
+        for directory in remove_stale_stages(scratch):
+            print("Removed stale staging directory {}".format(directory))
+
+    # Run PCONS on each domain of a target; in a worker thread, without
+    # using the database
+    def score_target(target):
         targetdir = targets[target]
-        models = find_models(targetdir)
-        # print(models)
-        modelfile = pcons_write_model_file(targetdir, models)
-        # modelfile = pcons_get_model_file_name(targetdir)
-        # print(modelfile)
-        length = get_length(target, database, method=domainmethod)
+        models = target_models[target]
+        length = preloaded[target]["length"]
         pcons_results = {}
-        for (num, domain) in zip(components, domains):
-            # This below could be stored in the database as a path object
-            ignorefile = pcons_get_domain_file_name(targetdir, num,
-                                                    method=domainmethod)
-            # Run and parse results
-            pcons_results[domain] = read_pcons(
-                run_pcons(modelfile, total_len=length, d0=d0,
-                          ignore_file=ignorefile, pcons_binary=pcons),
-                transform_distance=transform, d0=3)
+        usages = {}
+        # Copy the models to scratch once rather than have every domain run
+        # read them over the network
+        with staged_models(targetdir, models, scratch=scratch,
+                           limit=scratch_limit) as (modeldir, staged):
+            modelfile = pcons_write_model_file(modeldir, staged)
+            # modelfile = pcons_get_model_file_name(targetdir)
+            for (num, domain) in zip(preloaded[target]["components"],
+                                     preloaded[target]["domains"]):
+                # This below could be stored in the database as a path object
+                ignorefile = pcons_get_domain_file_name(targetdir, num,
+                                                        method=domainmethod)
+                # Run and parse results
+                usages[domain] = {}
+                pcons_results[domain] = read_pcons(
+                    run_pcons(modelfile, total_len=length, d0=d0,
+                              ignore_file=ignorefile, pcons_binary=pcons,
+                              usage=usages[domain]),
+                    transform_distance=transform, d0=3)
+        return models, usages, pcons_results
+
+    # Only process the targets leased from the shared queue, if any
+    if queue is not None:
+        scored = ((target, score_target(target), None) for target in
+                  work_queue(queue, order, expiry=expiry))
+    else:
+        scored = run_longest_first(order, score_target, workers=workers)
+
+    # Store the results of each target and domain, then join the PCONS models
+    started = perf_counter()
+    processed = []
+    for (target, (models, usages, pcons_results), seconds) in scored:
+        domains = preloaded[target]["domains"]
+        component_ids = dict(zip(domains, preloaded[target]["component_ids"]))
+        targetdir = targets[target]
+        length = preloaded[target]["length"]
+        for domain in domains:
+            store_run(database, "pcons", usages[domain], target=target,
+                      method=vanilla_method, component=component_ids[domain],
+                      models=len(models), length=length)
         # Store domain results in database here as QA and QAscores
         qas = {}
         (servers, modeltuples, filenames, servermethods,
          model_id) = store_models_and_servers(target, pcons_results[next(iter(pcons_results))], database)
         for domain in pcons_results:
-            # this query could be dropped if we added this information to
-            # get_domain, which is called above in the loop.
-            query = 'SELECT domain.method, component.id FROM domain INNER JOIN component ON domain.id = component.domain WHERE domain.id = {}'.format(domain)
-            (partition_method, component) = database.execute(query).fetchone()
+            component = component_ids[domain]
             for model in pcons_results[domain][0]:
                 qa = store_qa(model_id[modeltuples[model]], pcons_results[domain][0][model], pcons_results[domain][1][model], vanilla_method, database, component=component)
                 # Initiate new empty lists of QA IDs if a new model is found
@@ -173,6 +272,21 @@ def main():
             with open(scorefile, 'w') as outfile:
                 write_scorefile(outfile, joint_quality[0], joint_quality[1],
                                 d0=d0, transform=transform)
+        # Commit per target, so that a crash only loses the current target;
+        # also, results must be stored before the target is marked done in
+        # queue
+        store_completed_target(database, target, method)
+        database.commit()
+        processed.append(target)
+
+    if processed:
+        makespan = "unknown, no runs accounted before"
+        if scale is not None:
+            makespan = "{:.1f} s".format(simulate_makespan(
+                [target for target in order if target in processed],
+                predicted, workers=workers))
+        print("Makespan {:.1f} s, predicted {} ({} targets, {} workers)".format(
+            perf_counter() - started, makespan, len(processed), workers))
 
     # Commit database
     save_or_dump(database, sqlite_file)
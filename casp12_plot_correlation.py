@@ -1,8 +1,12 @@
 #!/usr/bin/env python3
-import sqlite3
-from casp12.plots import convert_data, d2S, get_correlates, plot_correlates
+from casp12.plots import plot_correlates
 from casp12.definitions import method_type
-from casp12.database import get_method_id_and_name_from_type
+from casp12.database import connect_database, get_method_id_and_name_from_type
+from casp12.interface.plotting import correlation_matrix_local
+from casp12.internal.calculations import d2S
+from casp12.internal.data import get_method_id_dictionaries
+from casp12.internal.instrument import add_instrument_arguments, \
+    start_instrumentation
 
 
 '''
@@ -45,9 +49,18 @@ def main():
         description="{one line to give a brief idea of what the program does.}")
     parser.add_argument(
         "-a", action="store_true", default=False, help="Prints nothing")
+    parser.add_argument(
+        "-chunk", nargs=1, default=[100000], metavar="INT",
+        help="Number of correlates to read from database at a time, " +
+             "default=100000")
     parser.add_argument(
         "-d0", nargs=1, default=["3.0"], metavar="FLOAT",
         help="TMscore cutoff, default=3.0")
+    parser.add_argument(
+        "-spearman", action="store_true", default=False,
+        help="Spearman rank correlation of residues within each model, " +
+             "default=Pearson correlation")
+    add_instrument_arguments(parser, profile="analysis")
     parser.add_argument('-v', '--version', action='version',
                         version=get_version_str())
     parser.add_argument(
@@ -55,31 +68,28 @@ def main():
     parser.add_argument(
         "plot", nargs=1, metavar="FIGURE", help="Output filename for figure.")
     arguments = parser.parse_args(argv[1:])
+    start_instrumentation(arguments.report[0], arguments.trace[0])
     databasefile = arguments.database[0]
 
     # Set variables here
-    database = sqlite3.connect(databasefile)
+    database = connect_database(databasefile, wal=False,
+                                profile=arguments.profile[0])
     outfile = arguments.plot[0]
     d0 = float(arguments.d0[0])
+    chunksize = int(arguments.chunk[0])
 
     # Get methods
     (method_ids, method_names) = get_method_id_and_name_from_type(database, ["qa", "compounder"])
+    (id2name, name2id) = get_method_id_dictionaries(method_ids, method_names)
 
-    # Select correlates from database
-    correlates = get_correlates(database, method_ids)
-
-    # Convert to pandas table
-    correlates = convert_data(correlates, method_names)
-
-    # Convert SDA
-    # to_convert = None
-    # for (method_id, method_name) in zip(method_ids, method_names):
-    #     if method_name == "CASP12_LGA_SDA":
-    #         to_convert = method_id
-    correlates = d2S(correlates, "CASP12_LGA_SDA", d0)
+    # Correlate straight from database, converting SDA distances to scores
+    (matrix, counts) = correlation_matrix_local(
+        method_ids, id2name, database,
+        transforms={"CASP12_LGA_SDA": lambda x: d2S(x, d0)},
+        rank=arguments.spearman, chunksize=chunksize)
 
     # Plot the correlations
-    (f, matrix) = plot_correlates(correlates)
+    (f, matrix) = plot_correlates(matrix, matrix=True)
 
     # Print correlation data to STDOUT
     print(matrix)
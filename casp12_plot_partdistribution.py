@@ -1,11 +1,10 @@
 #!/usr/bin/env python3
-import numpy
-import seaborn
-from scipy.stats import kendalltau
-from sqlite3 import connect
-
-# Seaborn settings
-seaborn.set(style="ticks")
+from time import perf_counter
+from casp12.database import connect_database
+from casp12.interface.render import render_figures, \
+    render_partition_hexbin, use_agg
+from casp12.internal.instrument import add_instrument_arguments, \
+    start_instrumentation
 
 '''
  Generate hexagonal distribution plot for a set of CASP partitions
@@ -60,12 +59,6 @@ def get_sorted_lists(targets, sort_index=1, top_num=2, data_index=1):
     return sorted_tuples
 
 
-def plot_seaborn_hexbin(a, b):
-    x = numpy.array(a)
-    y = numpy.array(b)
-    return seaborn.jointplot(x, y, kind="hex", stat_func=kendalltau, color="#4CB391")
-
-
 # Main; for callable scripts
 def main():
     from argparse import ArgumentParser
@@ -73,28 +66,48 @@ def main():
     from sys import argv
     parser = ArgumentParser(
         description="Generate hexagonal distribution plot for a set of CASP" +
-                    " partitions.")
+                    " partitions; every database is read once and the " +
+                    "figures of all experiments drawn in parallel.")
+    parser.add_argument(
+        "-workers", nargs=1, default=[1], metavar="INT",
+        help="Number of figures to render concurrently, default=1")
+    add_instrument_arguments(parser, profile="analysis")
     parser.add_argument('-v', '--version', action='version',
                         version=get_version_str())
     parser.add_argument(
         "files", nargs="*", metavar="FILE", help="databases to read")
     arguments = parser.parse_args(argv[1:])
+    start_instrumentation(arguments.report[0], arguments.trace[0])
     files = arguments.files
 
     # Set variables here
+    use_agg()
+    workers = int(arguments.workers[0])
 
-    # Parse STDIN or interface
+    # Parse STDIN or interface, reading each database once
+    tasks = {}
     for f in files:
-        with connect(f) as database:
+        with connect_database(f, wal=False,
+                              profile=arguments.profile[0]) as database:
             data = read_data(database)
-            prefix = ".".join(basename(f).split(".")[:-1])
-            for experiment in data:
-                plot = plot_seaborn_hexbin(*get_sorted_lists(data[experiment], data_index=1)[0:2])
-                plot.savefig(prefix + "_{}_hexbin_dlen.png".format(experiment))
-                plot = plot_seaborn_hexbin(
-                    *get_sorted_lists(data[experiment], data_index=2)[0:2])
-                plot.savefig(prefix + "_{}_hexbin_nseg.png".format(experiment))
-
+        prefix = ".".join(basename(f).split(".")[:-1])
+        for experiment in data:
+            for (index, kind) in [(1, "dlen"), (2, "nseg")]:
+                outfile = prefix + "_{}_hexbin_{}.png".format(experiment, kind)
+                tasks[(prefix, experiment, kind)] = (
+                    render_partition_hexbin, (outfile, *get_sorted_lists(
+                        data[experiment], data_index=index)[0:2]))
+
+    # Render, reporting the time spent on each figure
+    start = perf_counter()
+    total = 0.0
+    for ((prefix, experiment, kind), outfile, seconds) in render_figures(
+            tasks, workers=workers):
+        total += seconds
+        print("{:<10} {:<6} {:8.2f} s  {}".format(experiment, kind, seconds,
+                                                 outfile))
+    print("Rendered {} figures in {:.2f} s ({:.2f} s of drawing, {} workers)".format(
+        len(tasks), perf_counter() - start, total, workers))
 
 
 if __name__ == '__main__':
@@ -1,8 +1,11 @@
 #!/usr/bin/env python3
-import sqlite3
-import seaborn as sns
-from casp12.plots import convert_data, d2S, get_correlates
-from casp12.database import get_method_id_and_name_from_type
+from casp12.plots import convert_data, d2S, get_correlates, plot_density
+from casp12.database import connect_database, get_method_id_and_name_from_type
+from casp12.interface.plotting import density_methods_local
+from casp12.internal.calculations import d2S as distance_to_score
+from casp12.internal.data import get_method_id_dictionaries
+from casp12.internal.instrument import add_instrument_arguments, \
+    start_instrumentation
 
 
 '''
@@ -36,6 +39,7 @@ def get_version_str():
 
 # Library functions
 def plot_scatter(correlates):
+    import seaborn as sns
     sns.set(style="ticks", color_codes=True)
     #sns.set(style="ticks")
     #f = sns.pairplot(correlates, hue="species")
@@ -55,9 +59,28 @@ def main():
         description="Plot scatterplots from correlates in sqlite3 database")
     parser.add_argument(
         "-a", action="store_true", default=False, help="Prints nothing")
+    parser.add_argument(
+        "-bins", nargs=1, default=[100], metavar="INT",
+        help="Number of bins per method in density mode, default=100")
+    parser.add_argument(
+        "-chunk", nargs=1, default=[100000], metavar="INT",
+        help="Number of correlates to read from database at a time in " +
+             "density mode, default=100000")
     parser.add_argument(
         "-d0", nargs=1, default=["3.0"], metavar="FLOAT",
         help="TMscore cutoff, default=3.0")
+    parser.add_argument(
+        "-density", action="store_true", default=False,
+        help="Plot binned densities rather than every correlate; for large " +
+             "data sets")
+    parser.add_argument(
+        "-sample", nargs=1, default=[0], metavar="INT",
+        help="In density mode, overlay a random sample of this many " +
+             "correlates per target, default=0")
+    parser.add_argument(
+        "-seed", nargs=1, default=[None], metavar="INT",
+        help="Random seed for the overlay sample, default=None")
+    add_instrument_arguments(parser, profile="analysis")
     parser.add_argument('-v', '--version', action='version',
                         version=get_version_str())
     parser.add_argument(
@@ -65,10 +88,12 @@ def main():
     parser.add_argument(
         "plot", nargs=1, metavar="FIGURE", help="Output filename for figure.")
     arguments = parser.parse_args(argv[1:])
+    start_instrumentation(arguments.report[0], arguments.trace[0])
     databasefile = arguments.database[0]
 
     # Set variables here
-    database = sqlite3.connect(databasefile)
+    database = connect_database(databasefile, wal=False,
+                                profile=arguments.profile[0])
     outfile = arguments.plot[0]
     d0 = float(arguments.d0[0])
 
@@ -77,6 +102,21 @@ def main():
                                                                   ["qa",
                                                                    "compounder"])
 
+    if arguments.density:
+        # Stream binned correlates, converting SDA distances to scores
+        (id2name, name2id) = get_method_id_dictionaries(method_ids,
+                                                        method_names)
+        seed = arguments.seed[0]
+        (histograms, edges, names, sample) = density_methods_local(
+            method_ids, id2name, database,
+            transforms={"CASP12_LGA_SDA": lambda x: distance_to_score(x, d0)},
+            bins=int(arguments.bins[0]), sample=int(arguments.sample[0]),
+            chunksize=int(arguments.chunk[0]),
+            seed=int(seed) if seed is not None else None)
+        f = plot_density(histograms, edges, names, sample=sample)
+        f.savefig(outfile)
+        return
+
     # Select correlates from database
     correlates = get_correlates(database, method_ids)
 
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+from os import makedirs
+from time import perf_counter
+from casp12.database import connect_database, get_method_id_and_name_from_type
+from casp12.interface.plotting import load_local_correlates_by_target
+from casp12.interface.render import get_figure_file_name, render_figures, \
+    render_target_correlation, render_target_density, use_agg
+from casp12.internal.calculations import d2S, get_bin_edges, \
+    get_column_ranges
+from casp12.internal.data import get_method_id_dictionaries
+from casp12.internal.instrument import add_instrument_arguments, \
+    start_instrumentation
+
+
+'''
+ Render per target figures from a quality assessment sqlite3 database
+ Copyright (C) 2017  Robert Pilstål
+
+   This program is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+
+   This program is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with this program. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+# Version and license information
+def get_version_str():
+    return "\n".join([
+        "casp12_plot_targets  Copyright (C) 2017  Robert Pilstål;",
+        "This program comes with ABSOLUTELY NO WARRANTY.",
+        "This is free software, and you are welcome to redistribute it",
+        "under certain conditions; see supplied General Public License."
+    ])
+
+
+# Library functions
+def read_target_selection(selection):
+    return set(selection.split(','))
+
+
+# Main; for callable scripts
+def main():
+    from argparse import ArgumentParser
+    from sys import argv
+    parser = ArgumentParser(
+        description="Render correlation and density figures for every " +
+                    "target, reading the database once and drawing in " +
+                    "parallel")
+    parser.add_argument(
+        "-bins", nargs=1, default=[100], metavar="INT",
+        help="Number of bins per method of density figures, default=100")
+    parser.add_argument(
+        "-chunk", nargs=1, default=[100000], metavar="INT",
+        help="Number of correlates to read from database at a time, " +
+             "default=100000")
+    parser.add_argument(
+        "-d0", nargs=1, default=["3.0"], metavar="FLOAT",
+        help="TMscore cutoff, default=3.0")
+    parser.add_argument(
+        "-format", nargs=1, default=["png"], metavar="EXT",
+        help="Image format of figures, default=png")
+    parser.add_argument(
+        "-kinds", nargs=1, default=["correlation,density"], metavar="str",
+        help="Figures to render per target [correlation,density], " +
+             "default=correlation,density")
+    parser.add_argument(
+        "-spearman", action="store_true", default=False,
+        help="Spearman rank correlation, default=Pearson correlation")
+    parser.add_argument(
+        "-targets", nargs=1, default=[None], metavar="str",
+        help="Target selection [target1,target2,target3,etc.], default=None")
+    parser.add_argument(
+        "-workers", nargs=1, default=[1], metavar="INT",
+        help="Number of figures to render concurrently, default=1")
+    add_instrument_arguments(parser, profile="analysis")
+    parser.add_argument('-v', '--version', action='version',
+                        version=get_version_str())
+    parser.add_argument(
+        "database", nargs=1, metavar="DATABASE", help="SQLite3 database to use")
+    parser.add_argument(
+        "output", nargs=1, metavar="DIR", help="Directory where to save figures")
+    arguments = parser.parse_args(argv[1:])
+    start_instrumentation(arguments.report[0], arguments.trace[0])
+
+    # Set variables here
+    use_agg()
+    database = connect_database(arguments.database[0], wal=False,
+                                profile=arguments.profile[0])
+    output = arguments.output[0]
+    d0 = float(arguments.d0[0])
+    kinds = arguments.kinds[0].split(",")
+    extension = arguments.format[0]
+    target_list = arguments.targets[0]
+    if target_list is not None:
+        target_list = sorted(read_target_selection(target_list))
+    workers = int(arguments.workers[0])
+    makedirs(output, exist_ok=True)
+
+    # Read all correlates once, partitioned by target
+    start = perf_counter()
+    (method_ids, method_names) = get_method_id_and_name_from_type(
+        database, ["qa", "compounder"])
+    (id2name, name2id) = get_method_id_dictionaries(method_ids, method_names)
+    (names, partitions) = load_local_correlates_by_target(
+        method_ids, id2name, database, targets=target_list,
+        transforms={"CASP12_LGA_SDA": lambda x: d2S(x, d0)},
+        chunksize=int(arguments.chunk[0]))
+    database.close()
+    print("Read {} targets in {:.2f} s".format(len(partitions),
+                                                perf_counter() - start))
+
+    # Density figures share bins, to be comparable between targets; methods
+    # without scores get empty panels
+    edges = None
+    if "density" in kinds and partitions:
+        edges = get_bin_edges(
+            get_column_ranges(partitions.values(), len(names)),
+            bins=int(arguments.bins[0]))
+
+    tasks = {}
+    for target in sorted(partitions):
+        values = partitions[target]
+        for kind in kinds:
+            outfile = get_figure_file_name(output, target, kind,
+                                           extension=extension)
+            if kind == "correlation":
+                tasks[(target, kind)] = (render_target_correlation, (
+                    outfile, target, values, names, arguments.spearman))
+            elif kind == "density":
+                tasks[(target, kind)] = (render_target_density, (
+                    outfile, target, values, names, edges))
+            else:
+                parser.error("unknown figure kind: {}".format(kind))
+
+    # Render, reporting the time spent on each figure
+    start = perf_counter()
+    total = 0.0
+    for ((target, kind), outfile, seconds) in render_figures(tasks,
+                                                            workers=workers):
+        total += seconds
+        print("{:<10} {:<12} {:8.2f} s  {}".format(target, kind, seconds,
+                                                  outfile))
+    print("Rendered {} figures in {:.2f} s ({:.2f} s of drawing, {} workers)".format(
+        len(tasks), perf_counter() - start, total, workers))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,27 +1,70 @@
 #!/usr/bin/env python3
-from numpy import array, zeros
+from itertools import repeat
+from numpy import array, median, zeros
 
 
 # Library functions
 def readArrayFromFile(infile):
-    entries = []
-    for line in infile:
-        entries.append(float(line))
-    return array(entries)
-
-def average(vectors):
-    vector = zeros(vectors[0].shape)
-    for v in vectors:
-        vector = vector + v
-    vector /= float(len(vectors))
+    return array(infile.read().split(), dtype=float)
+
+def readArraysFromFiles(files):
+    """Stream QA vectors, keeping at most one file open and in memory
+
+    :param files: iterable of file paths (strings) or open file handles
+    :return: generator of numpy arrays
+    """
+    for f in files:
+        infile = f
+        # Open for reading if file path specified
+        if isinstance(f, str):
+            infile = open(f, 'r')
+        try:
+            yield readArrayFromFile(infile)
+        finally:
+            infile.close()
+
+def runningSum(vectors, weights=None):
+    """Sum a stream of vectors in place, keeping only the sum in memory
+
+    :param vectors: iterable of equally long numpy arrays
+    :param weights: iterable of float weights, one per vector, default=1.0
+    :return: tuple of summed vector and summed weight (i.e. count)
+    """
+    vector = None
+    total = 0.0
+    if weights is None:
+        weights = repeat(1.0)
+    for (v, weight) in zip(vectors, weights):
+        if vector is None:
+            vector = zeros(v.shape)
+        # Scale a copy only when weighting
+        vector += v if weight == 1.0 else v * weight
+        total += weight
+    if vector is None:
+        raise ValueError("No QA vectors to combine")
+    return vector, total
+
+def average(vectors, weights=None):
+    (vector, total) = runningSum(vectors, weights=weights)
+    vector /= float(total)
     return vector
 
+def medianVector(vectors):
+    """Element wise median; needs all vectors in memory at once
+
+    :param vectors: iterable of equally long numpy arrays
+    :return: numpy array of medians
+    """
+    return median(array(list(vectors)), axis=0)
+
 def divideBySum(vector):
     return vector / sum(vector)
 
-def printVector(vector):
-    for element in vector:
-        print(str(element))
+def printVector(vector, outfile=None):
+    from sys import stdout
+    if outfile is None:
+        outfile = stdout
+    outfile.write("".join([str(element) + "\n" for element in vector]))
 
 
 # Main; for callable scripts
@@ -30,12 +73,20 @@ def main():
     from sys import argv, stdin
     parser = ArgumentParser(
         description="Operate on quality assesment vectors.")
+    parser.add_argument(
+        "-median", action="store_true", default=False,
+        help="Combine vectors by median rather than average (keeps all " +
+             "vectors in memory)")
     parser.add_argument(
         "-sum", action="store_true", default=False,
         help="Divide scores with the sum of all scores (default)")
     parser.add_argument(
         "-t", nargs=1, default=["nothing"], metavar="TEXT",
         help="What to print")
+    parser.add_argument(
+        "-weights", nargs=1, default=[None], metavar="FILE",
+        help="File with one weight per input file, for a weighted average; " +
+             "not with -median")
     parser.add_argument(
         "files", nargs="*", metavar="FILE", help="Files for input")
     arguments = parser.parse_args(argv[1:])
@@ -45,18 +96,23 @@ def main():
         files = [stdin]
 
     # Set variables here
-    vectors = []
+    weights = arguments.weights[0]
+    if weights is not None and arguments.median:
+        parser.error("-weights can not be used with -median")
+    if weights is not None:
+        with open(weights, 'r') as infile:
+            weights = readArrayFromFile(infile)
+        if len(weights) != len(files):
+            parser.error("expected {} weights, found {}".format(len(files),
+                                                                len(weights)))
 
-    # Parse STDIN or interface
-    for f in files:
-        infile = f
-        # Open for reading if file path specified
-        if isinstance(f, str):
-            infile = open(f, 'r')
-        vectors.append(readArrayFromFile(infile))
-        infile.close()
+    # Parse STDIN or interface, one file at a time
+    vectors = readArraysFromFiles(files)
 
-    vector = average(vectors)
+    if arguments.median:
+        vector = medianVector(vectors)
+    else:
+        vector = average(vectors, weights=weights)
 
     if arguments.sum:
         vector = divideBySum(vector)
@@ -66,4 +122,4 @@ def main():
     printVector(vector)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -1,9 +1,10 @@
 #!/usr/bin/env python3
 from re import compile
 from urllib.request import urlopen
-from sqlite3 import connect
-from casp12.database import store_caspservers
+from casp12.database import connect_database, store_caspservers
 from casp12.interface.casp import parse_server_definitions
+from casp12.internal.instrument import add_instrument_arguments, \
+    start_instrumentation
 
 '''
  Read online CASP server definitions and store translation in database
@@ -70,10 +71,12 @@ def main():
         "-url", nargs=1, default=["http://predictioncenter.org/casp12/docs.cgi?view=groupsbyname"],
         metavar="URL", help="CASP server listing, " +
                             "default=http://predictioncenter.org/casp12/docs.cgi?view=groupsbyname")
+    add_instrument_arguments(parser, profile="ingest")
     parser.add_argument('-v', '--version', action='version', version=get_version_str())
     parser.add_argument(
         "database", nargs=1, metavar="file", help="Database within which to store results")
     arguments = parser.parse_args(argv[1:])
+    start_instrumentation(arguments.report[0], arguments.trace[0])
     database_file = arguments.database[0]
 
     # Set variables here
@@ -85,7 +88,7 @@ def main():
     servers = find_servers(url)
 
     # Store servers and save database
-    database = connect(database_file)
+    database = connect_database(database_file, profile=arguments.profile[0])
     stored = store_caspservers(servers, casp, database, all=all)
     database.commit()
     database.close()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+from casp12.database import connect_database, get_run_scaling, \
+    get_run_summary, has_run_table, run_columns
+from casp12.internal.instrument import add_instrument_arguments, \
+    start_instrumentation
+
+
+'''
+ Report the resources used by runs of external tools
+ Copyright (C) 2017  Robert Pilstål
+
+   This program is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+
+   This program is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with this program. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+# Version and license information
+def get_version_str():
+    return "\n".join([
+        "casp12_run_report  Copyright (C) 2017  Robert Pilstål;",
+        "This program comes with ABSOLUTELY NO WARRANTY.",
+        "This is free software, and you are welcome to redistribute it",
+        "under certain conditions; see supplied General Public License."
+    ])
+
+
+# Library functions
+def format_run_summary(summary, columns):
+    lines = ["\t".join(columns + ["runs", "wall_s", "mean_wall_s",
+                                  "max_wall_s", "user_s", "system_s",
+                                  "maxrss_kb", "failed"])]
+    for row in summary:
+        (runs, wall, mean, longest, user, system, maxrss,
+         failed) = row[len(columns):]
+        lines.append("\t".join(
+            [str(value) for value in row[:len(columns)]] + [str(runs)] +
+            ["{:.3f}".format(value)
+             for value in (wall, mean, longest, user, system)] +
+            [str(maxrss), str(failed)]))
+    return "\n".join(lines)
+
+
+def format_run_scaling(scaling):
+    lines = ["\t".join(["tool", "runs", "wall_s_per_model2_residue",
+                        "maxrss_kb_per_model_residue"])]
+    for tool in scaling:
+        (runs, wall, memory) = scaling[tool]
+        lines.append("{}\t{}\t{:.3e}\t{:.3e}".format(tool, runs, wall, memory))
+    return "\n".join(lines)
+
+
+# Main; for callable scripts
+def main():
+    from argparse import ArgumentParser
+    from sys import argv
+    parser = ArgumentParser(
+        description="Summarise the wall time, user and system CPU time and " +
+                    "peak memory (max RSS) of the PCONS, partition and draw " +
+                    "runs accounted in a result or batch state database, " +
+                    "and fit time per models squared times target length " +
+                    "(the cost the targets are scheduled by) and memory " +
+                    "per model residue (models times target length) for " +
+                    "capacity planning. Prints tab separated rows.")
+    parser.add_argument(
+        "-by", nargs=1, default=["tool"], metavar="str",
+        help="Columns to group runs by [" + ",".join(run_columns) +
+             "], default=tool")
+    add_instrument_arguments(parser, profile="readonly")
+    parser.add_argument('-v', '--version', action='version',
+                        version=get_version_str())
+    parser.add_argument(
+        "database", nargs=1, metavar="DATABASE",
+        help="SQLite3 result or batch state database")
+    arguments = parser.parse_args(argv[1:])
+    start_instrumentation(arguments.report[0], arguments.trace[0])
+
+    # Set variables here
+    columns = arguments.by[0].split(",")
+    database = connect_database(arguments.database[0], wal=False,
+                                profile=arguments.profile[0])
+
+    if not has_run_table(database):
+        print("No runs accounted in {}".format(arguments.database[0]))
+        database.close()
+        return
+    print(format_run_summary(get_run_summary(database, columns=columns),
+                             columns))
+    scaling = get_run_scaling(database)
+    if scaling:
+        print()
+        print(format_run_scaling(scaling))
+    database.close()
+
+
+if __name__ == '__main__':
+    main()
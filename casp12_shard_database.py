@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+from casp12.interface.federation import shard_result_database
+from casp12.internal.instrument import add_instrument_arguments, \
+    start_instrumentation
+
+
+'''
+ Split a quality assessment sqlite3 database into shards by target
+ Copyright (C) 2017  Robert Pilstål
+
+   This program is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+
+   This program is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with this program. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+# Version and license information
+def get_version_str():
+    return "\n".join([
+        "casp12_shard_database  Copyright (C) 2017  Robert Pilstål;",
+        "This program comes with ABSOLUTELY NO WARRANTY.",
+        "This is free software, and you are welcome to redistribute it",
+        "under certain conditions; see supplied General Public License."
+    ])
+
+
+# Library functions
+def get_shard_file_name(prefix, shard):
+    return "{}_shard{}.db".format(prefix, shard)
+
+
+# Main; for callable scripts
+def main():
+    from argparse import ArgumentParser
+    from sys import argv
+    parser = ArgumentParser(
+        description="Split a result database into shards by target, " +
+                    "balancing the number of local scores, for parallel " +
+                    "reads with casp12.interface.federation.read_shards")
+    parser.add_argument(
+        "-shards", nargs=1, default=[4], metavar="INT",
+        help="Number of shards, default=4")
+    add_instrument_arguments(parser, profile="ingest")
+    parser.add_argument('-v', '--version', action='version',
+                        version=get_version_str())
+    parser.add_argument(
+        "database", nargs=1, metavar="DATABASE", help="SQLite3 database to split")
+    parser.add_argument(
+        "prefix", nargs=1, metavar="PREFIX",
+        help="Shard filename prefix, shards are written to PREFIX_shardN.db")
+    arguments = parser.parse_args(argv[1:])
+    start_instrumentation(arguments.report[0], arguments.trace[0])
+
+    # Set variables here
+    shard_files = [get_shard_file_name(arguments.prefix[0], shard)
+                   for shard in range(int(arguments.shards[0]))]
+
+    assigned = shard_result_database(arguments.database[0], shard_files,
+                                     profile=arguments.profile[0])
+    for (shard_file, targets) in zip(shard_files, assigned):
+        print("{}\t{} targets\t{}".format(shard_file, len(targets),
+                                          ",".join(sorted(targets))))
+
+
+if __name__ == '__main__':
+    main()
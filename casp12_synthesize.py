@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+from os import path, remove
+from casp12.database import create_result_database, save_or_dump
+from casp12.interface.synthetic import store_synthetic_dataset, \
+    synthesize_dataset, synthetic_scales, write_synthetic_dataset
+from casp12.internal.instrument import add_instrument_arguments, \
+    start_instrumentation
+
+
+'''
+ Generate a synthetic CASP dataset, for reproducible benchmarks
+ Copyright (C) 2017  Robert Pilstål
+
+   This program is free software: you can redistribute it and/or modify
+   it under the terms of the GNU General Public License as published by
+   the Free Software Foundation, either version 3 of the License, or
+   (at your option) any later version.
+
+   This program is distributed in the hope that it will be useful,
+   but WITHOUT ANY WARRANTY; without even the implied warranty of
+   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+   GNU General Public License for more details.
+
+   You should have received a copy of the GNU General Public License
+   along with this program. If not, see <http://www.gnu.org/licenses/>.
+'''
+
+
+# Version and license information
+def get_version_str():
+    return "\n".join([
+        "casp12_synthesize  Copyright (C) 2017  Robert Pilstål;",
+        "This program comes with ABSOLUTELY NO WARRANTY.",
+        "This is free software, and you are welcome to redistribute it",
+        "under certain conditions; see supplied General Public License."
+    ])
+
+
+# Main; for callable scripts
+def main():
+    from argparse import ArgumentParser
+    from sys import argv
+    parser = ArgumentParser(
+        description="Generate a synthetic CASP dataset: model PDB's, LGA " +
+                    "and LDDT files with summaries, QMODE 2 QA files, " +
+                    "domain definitions and optionally a populated result " +
+                    "database. The same options give the same dataset")
+    parser.add_argument(
+        "-casp", nargs=1, default=["12"], metavar="INT",
+        help="CASP experiment, default=12")
+    parser.add_argument(
+        "-db", nargs=1, default=[None], metavar="FILE",
+        help="Result database to create and populate, overwritten, " +
+             "default=None")
+    parser.add_argument(
+        "-length", nargs=1, default=[None], metavar="INT,INT",
+        help="Shortest and longest target, default=from scale")
+    parser.add_argument(
+        "-models", nargs=1, default=[None], metavar="INT",
+        help="Models per server and target, default=from scale")
+    parser.add_argument(
+        "-nopdb", action="store_true", default=False,
+        help="Do not write model PDB's")
+    parser.add_argument(
+        "-qa", nargs=1, default=[None], metavar="INT",
+        help="Number of QA servers, default=from scale")
+    parser.add_argument(
+        "-scale", nargs=1, default=["medium"], metavar="str",
+        help="Size of dataset [" + ",".join(synthetic_scales) +
+             "], default=medium")
+    parser.add_argument(
+        "-seed", nargs=1, default=[0], metavar="INT",
+        help="Random seed, default=0")
+    parser.add_argument(
+        "-servers", nargs=1, default=[None], metavar="INT",
+        help="Number of structure prediction servers, default=from scale")
+    parser.add_argument(
+        "-targets", nargs=1, default=[None], metavar="INT",
+        help="Number of targets, default=from scale")
+    add_instrument_arguments(parser, profile="ingest")
+    parser.add_argument('-v', '--version', action='version',
+                        version=get_version_str())
+    parser.add_argument(
+        "directory", nargs=1, metavar="DIR",
+        help="Directory to write the dataset to")
+    arguments = parser.parse_args(argv[1:])
+    start_instrumentation(arguments.report[0], arguments.trace[0])
+
+    # Set variables here
+    casp = int(arguments.casp[0])
+    datafile = arguments.db[0]
+    directory = arguments.directory[0]
+    seed = int(arguments.seed[0])
+    scale = dict(synthetic_scales[arguments.scale[0]])
+    for (option, key) in ((arguments.targets, "targets"),
+                          (arguments.servers, "servers"),
+                          (arguments.models, "models"),
+                          (arguments.qa, "qa_servers")):
+        if option[0] is not None:
+            scale[key] = int(option[0])
+    if arguments.length[0] is not None:
+        scale["length"] = tuple(
+            [int(x) for x in arguments.length[0].split(",")])
+
+    dataset = synthesize_dataset(seed=seed, **scale)
+    written = write_synthetic_dataset(directory, dataset, casp=casp,
+                                      seed=seed, pdb=not arguments.nopdb)
+    for kind in written:
+        print("{:<10} {:>8} files".format(kind, written[kind]))
+
+    if datafile is not None:
+        for suffix in ("", "-wal", "-shm"):
+            if path.exists(datafile + suffix):
+                remove(datafile + suffix)
+        database = create_result_database(datafile,
+                                          profile=arguments.profile[0])
+        methods = store_synthetic_dataset(dataset, database, casp=casp)
+        print("{:<10} {:>8} methods".format("database", len(methods)))
+        save_or_dump(database, datafile)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,9 @@
 #!/usr/bin/env python3
 from urllib.request import urlopen
-from sqlite3 import connect
 from casp12.interface.casp import parse_target_information
-from casp12.database import store_target_information
+from casp12.database import connect_database, store_target_information
+from casp12.internal.instrument import add_instrument_arguments, \
+    start_instrumentation
 
 '''
  Read online CASP target information and store it in database
@@ -66,10 +67,12 @@ def main():
         "-url", nargs=1, default=["http://predictioncenter.org/casp12/targetlist.cgi?type=csv"],
         metavar="URL", help="CASP target listing, " +
                             "default=http://predictioncenter.org/casp12/targetlist.cgi?type=csv")
+    add_instrument_arguments(parser, profile="ingest")
     parser.add_argument('-v', '--version', action='version', version=get_version_str())
     parser.add_argument(
         "database", nargs=1, metavar="file", help="Database within which to store results")
     arguments = parser.parse_args(argv[1:])
+    start_instrumentation(arguments.report[0], arguments.trace[0])
     database_file = arguments.database[0]
 
     # Set variables here
@@ -81,7 +84,7 @@ def main():
     dictreader = get_target_information(url)
 
     # Store servers and save database
-    database = connect(database_file)
+    database = connect_database(database_file, profile=arguments.profile[0])
     (targets, stored) = store_target_information(dictreader, casp, database, force=force)
     database.commit()
     database.close()
@@ -1,13 +1,97 @@
-from sqlite3 import connect, IntegrityError
+from gzip import GzipFile
+from os import path
+from re import sub
+from sqlite3 import connect, Connection, IntegrityError
+from time import monotonic, time
 from .interface.pcons import write_local_scores
+from .interface.schedule import estimate_cost
 from .interface.targets import identify_models_and_servers
-from .definitions import method_type
+from .definitions import method_type, pragma_profiles
+from .internal.instrument import timed_stage
 
 
-def create_database(db=":memory:"):
+class PeriodicConnection(Connection):
+    """sqlite3 connection that commits at most once per commit_interval when
+       asked to, so that long ingests publish their results as they go
+    """
+    commit_interval = None
+    last_commit = None
+
+    @timed_stage("database commit")
+    def commit(self):
+        super().commit()
+        self.last_commit = monotonic()
+
+    def periodic_commit(self):
+        """Commit if commit_interval seconds have passed since the last commit
+
+        :return: True if committed
+        """
+        if self.commit_interval is None:
+            return False
+        if self.last_commit is None:
+            self.last_commit = monotonic()
+        if monotonic() - self.last_commit < self.commit_interval:
+            return False
+        self.commit()
+        return True
+
+
+def connect_database(db=":memory:", wal=True, timeout=60.0,
+                     commit_interval=None, profile=None):
+    """Open a database for use alongside other processes; in write ahead log
+       (WAL) mode readers see the last committed snapshot instead of waiting
+       for a writer to finish
+
+    :param db: database filename, string
+    :param wal: if True, switch the database to WAL mode (persistent); leave
+                False for read only use. Ignored with query only profiles
+                (e.g. readonly), which must not modify the database
+    :param timeout: seconds to wait for locks held by other connections
+    :param commit_interval: seconds between commits by periodic_commit, None
+                            to only commit explicitly
+    :param profile: name of PRAGMA settings to use, see
+                    definitions.pragma_profiles; None for SQLite defaults
+    :return: sqlite3 database connection, a PeriodicConnection
+    """
+    database = connect(db, timeout=timeout, factory=PeriodicConnection)
+    # Before WAL, since the page size is fixed once in WAL mode
+    if profile is not None:
+        apply_pragma_profile(database, profile)
+    if wal and (profile is None or
+                pragma_profiles[profile].get("query_only") != "ON"):
+        database.execute("PRAGMA journal_mode = WAL;")
+    database.commit_interval = commit_interval
+    return database
+
+
+def apply_pragma_profile(database, profile, schema="main"):
+    """Apply a named set of PRAGMA settings to a connection
+
+    :param database: sqlite3 database connection
+    :param profile: profile name, key of definitions.pragma_profiles
+    :param schema: schema name, for attached databases
+    :return: dictionary with PRAGMA names as keys and values in effect as
+             values, None where not applicable
+    """
+    if profile not in pragma_profiles:
+        raise ValueError("Unknown PRAGMA profile: {}".format(profile))
+    settings = {}
+    for (pragma, value) in pragma_profiles[profile].items():
+        database.execute("PRAGMA {}.{} = {};".format(schema, pragma, value))
+        # Some settings do not apply to (e.g. in memory) databases
+        setting = database.execute(
+            "PRAGMA {}.{};".format(schema, pragma)).fetchone()
+        settings[pragma] = None if setting is None else setting[0]
+    return settings
+
+
+def create_database(db=":memory:", profile=None):
     # Create in-memory
     """Creates the database, in memory, to use for analyzing domain partitions
 
+    :param db: database filename, string
+    :param profile: name of PRAGMA settings, see connect_database
     :return: the database connection handle
     """
 
@@ -15,13 +99,11 @@ def create_database(db=":memory:"):
     CREATE TABLE casp(id int PRIMARY KEY);
     CREATE TABLE target(id text, len int, casp int REFERENCES casp(id), PRIMARY KEY (id, casp));
     CREATE TABLE domain(num int, target text REFERENCES target(id), casp int REFERENCES target(casp), PRIMARY KEY (num, target, casp));
-    CREATE TABLE segment(start int, stop int, len int, domain int REFERENCES domain(num), target text REFERENCES domain(target), casp int REFERENCES domain(casp), PRIMARY KEY (start, domain, target, casp));
-    CREATE TRIGGER segment_length_insert BEFORE INSERT ON segment FOR EACH ROW BEGIN UPDATE NEW SET len = stop - start + 1; END;
-    CREATE TRIGGER segment_length_update BEFORE UPDATE ON segment FOR EACH ROW BEGIN UPDATE NEW SET len = stop - start + 1; END;
-    CREATE VIEW domain_size (casp, target, domain, dlen, nseg) AS SELECT domain.casp, domain.target, domain.num, SUM(segment.len), COUNT(*) FROM domain INNER JOIN segment ON (domain.casp = segment.casp AND domain.target = segment.target AND domain.num = segment.domain) GROUP BY domain.casp, domain.target, domain.num;
+    CREATE TABLE segment(start int, stop int, len int GENERATED ALWAYS AS (stop - start + 1) STORED, domain int REFERENCES domain(num), target text REFERENCES domain(target), casp int REFERENCES domain(casp), PRIMARY KEY (start, domain, target, casp));
+    CREATE TABLE domain_size(casp int, target text, domain int, dlen int, nseg int, PRIMARY KEY (casp, target, domain));
     '''
 
-    database = connect(db)
+    database = connect_database(db, profile=profile)
     # CASP table
     database.execute("CREATE TABLE casp(id int PRIMARY KEY);")
     # CASP targets table
@@ -36,25 +118,20 @@ def create_database(db=":memory:"):
                      "target text REFERENCES target(id), " +
                      "casp int REFERENCES target(casp), " +
                      "PRIMARY KEY (num, target, casp));")
-    # Segment definitions table
-    database.execute(
-        "CREATE TABLE segment(start int, stop int, len int, domain int REFERENCES domain(num), target text REFERENCES domain(target), casp int REFERENCES domain(casp), PRIMARY KEY (start, domain, target, casp));")
-    # Synthetic variables
-    # Triggers for segment length calculation
-    database.execute(
-        "CREATE TRIGGER segment_length_insert AFTER INSERT ON segment FOR EACH ROW BEGIN UPDATE segment SET len = NEW.stop - NEW.start + 1 WHERE casp = NEW.casp AND target = NEW.target AND domain = NEW.domain AND start = NEW.start AND stop = NEW.stop; END;")
+    # Segment definitions table, with segment length as a synthetic variable
     database.execute(
-        "CREATE TRIGGER segment_length_update AFTER UPDATE ON segment FOR EACH ROW BEGIN UPDATE segment SET len = NEW.stop - NEW.start + 1 WHERE casp = NEW.casp AND target = NEW.target AND domain = NEW.domain AND start = NEW.start AND stop = NEW.stop; END;")
-    # Domain size view, sorted by largest domain
-    database.execute(
-        "CREATE VIEW domain_size (casp, target, domain, dlen, nseg) AS SELECT domain.casp, domain.target, domain.num, SUM(segment.len), COUNT(*) FROM domain INNER JOIN segment ON (domain.casp = segment.casp AND domain.target = segment.target AND domain.num = segment.domain) GROUP BY domain.casp, domain.target, domain.num;")
+        "CREATE TABLE segment(start int, stop int, len int GENERATED ALWAYS AS (stop - start + 1) STORED, domain int REFERENCES domain(num), target text REFERENCES domain(target), casp int REFERENCES domain(casp), PRIMARY KEY (start, domain, target, casp));")
+    # Domain size summary, kept up to date by triggers
+    materialise_domain_size(database)
     return database
 
 
-def create_result_database(db=":memory:"):
+def create_result_database(db=":memory:", profile=None):
     # Create in-memory
     """Creates the database, in memory, to use for analyzing domain partitions
 
+    :param db: database filename, string
+    :param profile: name of PRAGMA settings, see connect_database
     :return: the database connection handle
     """
 
@@ -68,20 +145,19 @@ def create_result_database(db=":memory:"):
     CREATE TABLE target(id text, len int, casp int REFERENCES casp(id), path text REFERENCES path(pathway), PRIMARY KEY (id));
     CREATE TABLE domain(id INTEGER PRIMARY KEY ASC, method int REFERENCES method(id));
     CREATE TABLE component(id INTEGER PRIMARY KEY, target text REFERENCES target(id), num int, domain int REFERENCES domain(id));
-    CREATE TABLE segment(start int, stop int, len int, domain int REFERENCES domain(id), PRIMARY KEY (start, domain));
+    CREATE TABLE segment(start int, stop int, len int GENERATED ALWAYS AS (stop - start + 1) STORED, domain int REFERENCES domain(id), PRIMARY KEY (start, domain));
     CREATE TABLE model(id INTEGER PRIMARY KEY, method int REFERENCES method(id), target text REFERENCES target(id), path text UNIQUE REFERENCES path(pathway), name text, UNIQUE(method, target, name));
     CREATE TABLE qa(id INTEGER PRIMARY KEY, model int REFERENCES model(id), component int REFERENCES component(id), method int REFERENCES method(id), UNIQUE (model, component, method));
     CREATE TABLE qascore(qa int REFERENCES qa(id) PRIMARY KEY, global real);
     CREATE TABLE lscore(qa int REFERENCES qa(id), residue int, score real, PRIMARY KEY (qa, residue));
     CREATE TABLE qajoin(qa int REFERENCES qa(id), compound int REFERENCES qa(id), PRIMARY KEY (qa, compound));
-    # Segment triggers;
-    CREATE TRIGGER segment_length_insert AFTER INSERT ON segment FOR EACH ROW BEGIN UPDATE segment SET len = NEW.stop - NEW.start + 1 WHERE domain = NEW.domain AND start = NEW.start AND stop = NEW.stop; END;
-    CREATE TRIGGER segment_length_update AFTER UPDATE ON segment FOR EACH ROW BEGIN UPDATE segment SET len = NEW.stop - NEW.start + 1 WHERE domain = NEW.domain AND start = NEW.start AND stop = NEW.stop; END;
-    # Domain size view, sorted by largest domain;
-    CREATE VIEW domain_size (target, method, domain, id, dlen, nseg) AS SELECT component.target, domain.method, component.num, domain.id, SUM(segment.len), COUNT(*) FROM domain INNER JOIN segment ON (domain.id = segment.domain) INNER JOIN component on (component.domain = domain.id) GROUP BY domain.id;
+    CREATE TABLE completed(target text REFERENCES target(id), method int REFERENCES method(id), finished real, PRIMARY KEY (target, method));
+    CREATE TABLE run(id INTEGER PRIMARY KEY, tool text, target text REFERENCES target(id), method int REFERENCES method(id), component int REFERENCES component(id), models int, length int, command text, started real, wall real, user real, system real, maxrss int, returncode int);
+    # Domain size summary, see materialise_domain_size for its triggers;
+    CREATE TABLE domain_size(target text, method int, domain int, id INTEGER PRIMARY KEY, dlen int, nseg int);
     '''
 
-    database = connect(db)
+    database = connect_database(db, profile=profile)
 
     database.execute("CREATE TABLE path(pathway text PRIMARY KEY);")
     database.execute(
@@ -98,8 +174,9 @@ def create_result_database(db=":memory:"):
         "CREATE TABLE domain(id INTEGER PRIMARY KEY ASC, method int REFERENCES method(id));")
     database.execute(
         "CREATE TABLE component(id INTEGER PRIMARY KEY, target text REFERENCES target(id), num int, domain int REFERENCES domain(id))")
+    # Segment length is generated, rather than maintained by triggers
     database.execute(
-        "CREATE TABLE segment(start int, stop int, len int, domain int REFERENCES domain(id), PRIMARY KEY (start, domain));")
+        "CREATE TABLE segment(start int, stop int, len int GENERATED ALWAYS AS (stop - start + 1) STORED, domain int REFERENCES domain(id), PRIMARY KEY (start, domain));")
     database.execute(
         "CREATE TABLE model(id INTEGER PRIMARY KEY, method int REFERENCES method(id), target text REFERENCES target(id), path text UNIQUE REFERENCES path(pathway), name text, UNIQUE(method, target, name));")
         #"CREATE TABLE model(id INTEGER PRIMARY KEY, method int REFERENCES method(id), target int REFERENCES target(id), path text REFERENCES path(pathway), name text);")
@@ -112,17 +189,129 @@ def create_result_database(db=":memory:"):
         "CREATE TABLE lscore(qa int REFERENCES qa(id), residue int, score real, PRIMARY KEY (qa, residue));")
     database.execute(
         "CREATE TABLE qajoin(qa int REFERENCES qa(id), compound int REFERENCES qacompound(id), PRIMARY KEY (qa, compound));")
-    # Segment triggers;
-    database.execute(
-        "CREATE TRIGGER segment_length_insert AFTER INSERT ON segment FOR EACH ROW BEGIN UPDATE segment SET len = NEW.stop - NEW.start + 1 WHERE domain = NEW.domain AND start = NEW.start AND stop = NEW.stop; END;")
-    database.execute(
-        "CREATE TRIGGER segment_length_update AFTER UPDATE ON segment FOR EACH ROW BEGIN UPDATE segment SET len = NEW.stop - NEW.start + 1 WHERE domain = NEW.domain AND start = NEW.start AND stop = NEW.stop; END;")
-    # Domain size view, sorted by largest domain;
-    database.execute(
-        "CREATE VIEW domain_size (target, method, domain, id, dlen, nseg) AS SELECT component.target, domain.method, component.num, domain.id, SUM(segment.len), COUNT(*) FROM domain INNER JOIN segment ON (domain.id = segment.domain) INNER JOIN component on (component.domain = domain.id) GROUP BY domain.id;")
+    # Targets fully scored by a method, for resuming interrupted runs
+    create_completed_table(database)
+    # Resources used by runs of external tools
+    create_run_table(database)
+    # Domain size summary, kept up to date by triggers
+    materialise_domain_size(database)
     return database
 
 
+def migrate_segment_length(database):
+    """Migrate a database storing segment lengths by triggers to use a
+       generated segment length column, dropping the triggers
+
+    :param database: sqlite3 database connection
+    :return: True if migrated, False if already using a generated column
+    """
+    (segment_sql,) = database.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'segment';").fetchone()
+    if "GENERATED" in segment_sql.upper():
+        return False
+    columns = [column[1] for column in
+               database.execute("PRAGMA table_info(segment);")
+               if column[1] != "len"]
+    # Views on segment must be dropped while the table is rebuilt
+    views = database.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'view';").fetchall()
+    # So must other triggers (e.g. of domain_size); indexes go with the table
+    triggers = database.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name NOT IN ('segment_length_insert', 'segment_length_update');").fetchall()
+    indexes = database.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = 'segment' AND sql IS NOT NULL;").fetchall()
+    with database:
+        if not database.in_transaction:
+            database.execute("BEGIN;")
+        database.execute("DROP TRIGGER IF EXISTS segment_length_insert;")
+        database.execute("DROP TRIGGER IF EXISTS segment_length_update;")
+        for (name, sql) in views:
+            database.execute("DROP VIEW {};".format(name))
+        for (name, sql) in triggers:
+            database.execute("DROP TRIGGER {};".format(name))
+        database.execute(sub(
+            r"(?i)CREATE TABLE\s+segment\s*\(", "CREATE TABLE segment_generated(",
+            sub(r"(?i)\blen\s+int\b",
+                "len int GENERATED ALWAYS AS (stop - start + 1) STORED",
+                segment_sql, count=1)))
+        database.execute(
+            "INSERT INTO segment_generated ({0}) SELECT {0} FROM segment;".format(
+                ", ".join(columns)))
+        database.execute("DROP TABLE segment;")
+        database.execute("ALTER TABLE segment_generated RENAME TO segment;")
+        for (name, sql) in views:
+            database.execute(sql)
+        for (sql,) in indexes:
+            database.execute(sql)
+        for (name, sql) in triggers:
+            database.execute(sql)
+    return True
+
+
+def materialise_domain_size(database):
+    """Replace the domain_size view with a table summarising the length and
+       number of segments of each domain. Triggers recompute the summary of a
+       domain whenever its segments, components or the domain itself change,
+       so reading it no longer aggregates all segments. Works on both the
+       result database and the older partition analysis database.
+
+    :param database: sqlite3 database connection
+    :return: True if materialised, False if domain_size already is a table
+    """
+    if database.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'domain_size';").fetchone() is not None:
+        return False
+    # The result database joins domains to targets through components
+    result = database.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'component';").fetchone() is not None
+    if result:
+        table = "CREATE TABLE domain_size(target text, method int, domain int, id INTEGER PRIMARY KEY, dlen int, nseg int);"
+        indexes = ["CREATE INDEX IF NOT EXISTS segment_domain ON segment(domain);",
+                   "CREATE INDEX IF NOT EXISTS component_domain ON component(domain);",
+                   "CREATE INDEX domain_size_target ON domain_size(target, method);"]
+        aggregate = "INSERT INTO domain_size (target, method, domain, id, dlen, nseg) SELECT component.target, domain.method, component.num, domain.id, SUM(segment.len), COUNT(*) FROM domain INNER JOIN segment ON (domain.id = segment.domain) INNER JOIN component ON (component.domain = domain.id){} GROUP BY domain.id;"
+        refresh = "DELETE FROM domain_size WHERE id = {0}; " + aggregate.format(
+            " WHERE domain.id = {0}")
+        # Table, trigger event and the domain key(s) of affected rows
+        events = [("segment", "INSERT", ["NEW.domain"]),
+                  ("segment", "DELETE", ["OLD.domain"]),
+                  ("segment", "UPDATE", ["OLD.domain", "NEW.domain"]),
+                  ("component", "INSERT", ["NEW.domain"]),
+                  ("component", "DELETE", ["OLD.domain"]),
+                  ("component", "UPDATE", ["OLD.domain", "NEW.domain"]),
+                  ("domain", "INSERT", ["NEW.id"]),
+                  ("domain", "DELETE", ["OLD.id"]),
+                  ("domain", "UPDATE", ["OLD.id", "NEW.id"])]
+    else:
+        table = "CREATE TABLE domain_size(casp int, target text, domain int, dlen int, nseg int, PRIMARY KEY (casp, target, domain));"
+        indexes = ["CREATE INDEX IF NOT EXISTS segment_domain ON segment(casp, target, domain);"]
+        aggregate = "INSERT INTO domain_size (casp, target, domain, dlen, nseg) SELECT domain.casp, domain.target, domain.num, SUM(segment.len), COUNT(*) FROM domain INNER JOIN segment ON (domain.casp = segment.casp AND domain.target = segment.target AND domain.num = segment.domain){} GROUP BY domain.casp, domain.target, domain.num;"
+        refresh = "DELETE FROM domain_size WHERE casp = {0}.casp AND target = {0}.target AND domain = {0}.{1}; " + aggregate.format(
+            " WHERE domain.casp = {0}.casp AND domain.target = {0}.target AND domain.num = {0}.{1}")
+        events = [("segment", "INSERT", [("NEW", "domain")]),
+                  ("segment", "DELETE", [("OLD", "domain")]),
+                  ("segment", "UPDATE", [("OLD", "domain"), ("NEW", "domain")]),
+                  ("domain", "INSERT", [("NEW", "num")]),
+                  ("domain", "DELETE", [("OLD", "num")]),
+                  ("domain", "UPDATE", [("OLD", "num"), ("NEW", "num")])]
+    with database:
+        if not database.in_transaction:
+            database.execute("BEGIN;")
+        database.execute("DROP VIEW IF EXISTS domain_size;")
+        database.execute(table)
+        for index in indexes:
+            database.execute(index)
+        for (tablename, event, keys) in events:
+            refreshes = [refresh.format(*(key if type(key) is tuple else (key,)))
+                         for key in keys]
+            database.execute(
+                "CREATE TRIGGER {0}_domain_size_{1} AFTER {2} ON {0} BEGIN {3} END;".format(
+                    tablename, event.lower(), event, " ".join(refreshes)))
+        # Summarise the domains already stored
+        database.execute(aggregate.format(""))
+    return True
+
+
 def get_caspserver_name(database, server):
     query = 'SELECT name FROM caspserver WHERE id = {};'.format(server)
     result = database.execute(query).fetchone()
@@ -139,6 +328,8 @@ def get_caspserver_method(database, server):
     return result[0]
 
 
+@timed_stage("database reads", unit="rows",
+             count=lambda correlates, *args, **kwargs: len(correlates))
 def get_correlates(database, methods, target=None):
     """ Get QA local scorecorrelates for a target over a set of methods
 
@@ -191,6 +382,97 @@ def get_local_correlates_with_model_id(database, methods, target=None):
     return correlates
 
 
+@timed_stage("database reads", unit="rows",
+             count=lambda chunk, *args, **kwargs: len(chunk))
+def iterate_local_correlates(database, methods, targets=None, complete=True,
+                             chunksize=100000):
+    """Read QA local score correlates over a set of methods in chunks of
+       whole models, never holding all of them
+
+    :param database: sqlite3 database connection
+    :param methods: list with integer method ID's
+    :param targets: Stirng with target identifier, or list of them. if
+                    specified, only get correlates pertaining to targets
+    :param complete: if True, only residues scored by all methods (as in
+                     get_correlates), otherwise None for missing scores
+    :param chunksize: approximate number of correlate rows per chunk; a chunk
+                      always holds all residues of its models
+    :return: generator of lists of tuples with model, residue and one local
+             score per method, in order of methods
+    """
+    methods = list(methods)
+    scores = ", ".join(
+        ["MAX(CASE WHEN qa.method = {} THEN lscore.score END)".format(method_id)
+         for method_id in methods])
+    # Residues of one model, one column per method, None where not scored
+    pivot_query = "SELECT lscore.residue, {} FROM qa CROSS JOIN lscore ON lscore.qa = qa.id WHERE qa.model = ? AND qa.component IS NULL AND qa.method IN ({}) GROUP BY lscore.residue;".format(
+        scores, ", ".join([str(method_id) for method_id in methods]))
+
+    chunk = []
+    for model in get_models(database, target=targets):
+        if complete:
+            correlates = get_model_correlates(database, model, methods)
+        else:
+            correlates = database.execute(pivot_query, (model,)).fetchall()
+        if not correlates:
+            continue
+        chunk += [(model,) + tuple(row) for row in correlates]
+        if len(chunk) >= chunksize:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+@timed_stage("database reads", unit="rows",
+             count=lambda chunk, *args, **kwargs: len(chunk))
+def iterate_result_rows(database, targets=None, methods=None,
+                        chunksize=100000):
+    """Read the QA results denormalised, one row per local score, in chunks;
+       rows come ordered by target and QA method, so that each (target,
+       method) partition is read in one piece
+
+    :param database: sqlite3 database connection
+    :param targets: list of text target ID's, None for all targets
+    :param methods: list with integer QA method ID's, None for all methods
+    :param chunksize: number of rows per chunk
+    :return: generator of lists of tuples with target, model name, server
+             name, QA method name, component ID, residue, local score and
+             global score; residue and local score are None for QA without
+             local scores
+    """
+    if targets is None:
+        targets = [target for (target,) in database.execute(
+            "SELECT DISTINCT target FROM model ORDER BY target;")]
+    method_query = ""
+    if methods is not None:
+        method_query = " AND qa.method IN ({})".format(
+            ", ".join([str(method_id) for method_id in methods]))
+    query = "SELECT model.target, model.name, server.name, method.name, qa.component, lscore.residue, lscore.score, qascore.global FROM model LEFT JOIN method AS server ON server.id = model.method INNER JOIN qa ON qa.model = model.id INNER JOIN method ON method.id = qa.method LEFT JOIN qascore ON qascore.qa = qa.id LEFT JOIN lscore ON lscore.qa = qa.id WHERE model.target = ?{} ORDER BY method.name, model.id, qa.component, lscore.residue;".format(
+        method_query)
+
+    for target in targets:
+        cursor = database.execute(query, (target,))
+        chunk = cursor.fetchmany(chunksize)
+        while chunk:
+            yield chunk
+            chunk = cursor.fetchmany(chunksize)
+
+
+def get_local_score_ranges(database, methods):
+    """Get the lowest and highest QA local score of each method
+
+    :param database: sqlite3 database connection
+    :param methods: list with integer method ID's
+    :return: dictionary with integer method ID's as keys and tuples of lowest
+             and highest score as values
+    """
+    query = "SELECT qa.method, MIN(lscore.score), MAX(lscore.score) FROM qa INNER JOIN lscore ON lscore.qa = qa.id WHERE qa.component IS NULL AND qa.method IN ({}) GROUP BY qa.method;".format(
+        ", ".join([str(method_id) for method_id in methods]))
+    return {method_id: (low, high) for (method_id, low, high) in
+            database.execute(query)}
+
+
 def get_model_correlates(database, model, methods):
     """ Get correlates for a model, over specified methods
 
@@ -292,6 +574,17 @@ def get_models(database, target=None):
     return [entry[0] for entry in database.execute(query).fetchall()]
 
 
+def get_model_targets(database):
+    """Get the target of every model
+
+    :param database: sqlite3 database connection
+    :return: dictionary with integer model ID's as keys and text target ID's
+             as values
+    """
+    query = "SELECT id, target FROM model;"
+    return dict(database.execute(query).fetchall())
+
+
 def get_model_id_from_method_target_name(database, method, target, name):
     query = 'select id from model WHERE method = {} AND target = "{}" AND name = "{:02d}"'.format(method, target, name)
     result = database.execute(query).fetchone()
@@ -318,7 +611,6 @@ def get_or_add_method(method_name, method_desc, method_type_name, database):
 
     query = 'SELECT id FROM method WHERE name = "{}" AND description = "{}" AND type = {} LIMIT 1'.format(
         method_name, method_desc, method_type[method_type_name])
-    print(query)
     method = database.execute(query).fetchone()
 
     # Otherwise insert a new method
@@ -342,105 +634,274 @@ def get_target_id(database):
     return [target[0] for target in targets]
 
 
-    # select t1.model, t1.score, t2.score from
-    # (select qa.model as model, qascore.global as score from qa inner join qascore on qa.id = qascore.qa where qa.method = 51) as t1,
-    # (select qa.model as model, qascore.global as score from qa inner join qascore on qa.id = qascore.qa where qa.method = 52) as t2
-    # on t1.model = t2.model;
-def query_global_correlates(methods, targets=None):
-    """Format query for global correlates over QA model intersection
+def create_completed_table(database):
+    """Create the table recording which targets are fully scored by which
+       method, if missing (i.e. in databases from before it was introduced)
 
-    :param methods: iterable of model integer ID's to intersect
-    :param targets: iterable with target text string names, for selection over
-                    subset of targets
-    :return: string of sqlite3 query
+    :param database: sqlite3 database connection
     """
-    from_query = "SELECT qa.model AS model, qascore.global AS score FROM qa INNER JOIN qascore ON qa.id = qascore.qa WHERE qa.method = {} AND qa.component IS NULL"
+    database.execute(
+        "CREATE TABLE IF NOT EXISTS completed(target text REFERENCES target(id), method int REFERENCES method(id), finished real, PRIMARY KEY (target, method));")
 
-    selects = []
-    froms = []
-    ons = []
-    previous = None
-    model_column = None
 
-    for (num, method_id) in enumerate(methods):
-        tablename = "t{}".format(num)
-        froms.append("({}) AS {}".format(from_query.format(method_id), tablename))
-        # Report model as first column
-        if previous is not None:
-            ons.append(
-                    "{}.model = {}.model".format(previous, tablename))
-        else:
-            model_column = "{}.model".format(tablename)
-            selects.append(model_column)
-        selects.append("{}.score".format(tablename))
-        previous = tablename
+def get_completed_targets(database, method):
+    """Get the targets fully scored by a method
 
-    where = None
-    if targets is not None:
-        ors = " OR ".join(["target = '{}'".format(target) for target in targets])
-        model_select = "SELECT id FROM model WHERE {}".format(ors)
-        where = " WHERE {} IN ({})".format(model_column, model_select)
+    :param database: sqlite3 database connection
+    :param method: integer method ID
+    :return: set of text target ID's
+    """
+    query = "SELECT target FROM completed WHERE method = ?;"
+    return {target for (target,) in database.execute(query, (method,))}
 
-    query = "SELECT {} FROM {} ON {}".format(", ".join(selects),
-                                             ", ".join(froms),
-                                             " AND ".join(ons))
-    # Append where clause if it exists; for target selection
-    if where is not None:
-        query += where
 
-    query += ";"
+def store_completed_target(database, target, method):
+    """Record that a target is fully scored by a method; commit it along with
+       the scores, so that both or neither survive a crash
 
-    return query
+    :param database: sqlite3 database connection
+    :param target: text target ID
+    :param method: integer method ID
+    """
+    database.execute(
+        "INSERT OR REPLACE INTO completed (target, method, finished) VALUES (?, ?, ?);",
+        (target, method, time()))
 
 
-def query_global_correlates_proper(methods, targets=None):
-    """Format query for global correlates over QA model intersection
+def create_run_table(database):
+    """Create the table accounting the resources used by each run of an
+       external tool (PCONS, partitioners etc.), if missing
 
-    :param methods: iterable of model integer ID's to intersect
+    :param database: sqlite3 database connection
+    """
+    database.execute(
+        "CREATE TABLE IF NOT EXISTS run(id INTEGER PRIMARY KEY, tool text, target text REFERENCES target(id), method int REFERENCES method(id), component int REFERENCES component(id), models int, length int, command text, started real, wall real, user real, system real, maxrss int, returncode int);")
+
+
+def has_run_table(database):
+    """Whether runs are accounted in a database, see create_run_table
+
+    :param database: sqlite3 database connection
+    :return: boolean
+    """
+    return database.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'run';").fetchone() is not None
+
+
+def store_run(database, tool, usage, target=None, method=None,
+              component=None, models=None, length=None, returncode=0):
+    """Record the resources used by a run of an external tool
+
+    :param database: sqlite3 database connection
+    :param tool: tool name, string
+    :param usage: dictionary with keys started, wall, user, system, maxrss and
+                  optionally command, see internal.accounting.run_accounted
+    :param target: text target ID
+    :param method: integer ID of the method the run scores for
+    :param component: integer component ID, for runs on a single domain
+    :param models: number of models in the run, integer
+    :param length: target length, integer
+    :param returncode: exit status of the run, integer
+    :return: integer run ID
+    """
+    cursor = database.execute(
+        "INSERT INTO run (tool, target, method, component, models, length, command, started, wall, user, system, maxrss, returncode) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);",
+        (tool, target, method, component, models, length,
+         usage.get("command"), usage["started"], usage["wall"],
+         usage["user"], usage["system"], usage["maxrss"], returncode))
+    return cursor.lastrowid
+
+
+def get_target_run_times(database, tool, domains=False):
+    """Wall time of the accounted successful runs of a tool, per target; for
+       targets run more than once, the mean time of their runs
+
+    :param database: sqlite3 database connection
+    :param tool: tool name, string
+    :param domains: True for runs on single domains (summed per target), False
+                    for runs on whole targets
+    :return: dictionary with text target IDs as keys and seconds as values
+    """
+    query = "SELECT target, sum(wall) FROM (SELECT target, component, avg(wall) AS wall FROM run WHERE tool = ? AND returncode = 0 AND component IS {}NULL GROUP BY target, component) GROUP BY target;".format(
+        "NOT " if domains else "")
+    return {target: wall for (target, wall) in database.execute(query, (tool,))}
+
+
+# Columns the run accounting may be summarised by
+run_columns = ["tool", "target", "method", "component"]
+
+
+def get_run_summary(database, columns=["tool"]):
+    """Summarise the accounted runs, grouped by some of their columns
+
+    :param database: sqlite3 database connection
+    :param columns: list of run_columns to group by
+    :return: list of tuples with the values of columns, then number of runs,
+             total, mean and max wall seconds, total user and system
+             seconds, peak maxrss and number of failed runs; the most time
+             consuming groups first; empty without a run table
+    """
+    for column in columns:
+        if column not in run_columns:
+            raise ValueError("Unknown run column '{}', expected one of {}".format(
+                column, ",".join(run_columns)))
+    if not has_run_table(database):
+        return []
+    grouping = ", ".join(columns)
+    query = "SELECT {0}, count(*), sum(wall), avg(wall), max(wall), sum(user), sum(system), max(maxrss), sum(returncode != 0) FROM run GROUP BY {0} ORDER BY sum(wall) DESC;".format(grouping)
+    return database.execute(query).fetchall()
+
+
+def get_run_scaling(database):
+    """Fit the wall time of each tool as proportional to the cost estimate
+       the scheduler ranks targets by, models squared times target length
+       per run (see interface.schedule.estimate_cost), and peak memory as
+       proportional to the model residues held, models times target length;
+       both by least squares through the origin
+
+    :param database: sqlite3 database connection
+    :return: dictionary with tool names as keys and tuples as values, these
+             with the number of runs used, wall seconds per cost unit and
+             maxrss per model residue; for tools with successful runs of
+             known size, none without a run table
+    """
+    if not has_run_table(database):
+        return {}
+    query = "SELECT tool, models, length, wall, maxrss FROM run WHERE models > 0 AND length > 0 AND returncode = 0;"
+    sums = {}
+    for (tool, models, length, wall, maxrss) in database.execute(query):
+        cost = estimate_cost(models, length)
+        residues = float(models * length)
+        tool_sums = sums.setdefault(tool, [0, 0.0, 0.0, 0.0, 0.0])
+        tool_sums[0] += 1
+        tool_sums[1] += cost * wall
+        tool_sums[2] += cost * cost
+        tool_sums[3] += residues * maxrss
+        tool_sums[4] += residues * residues
+    return {tool: (runs, wall / cost_square, memory / residue_square)
+            for (tool, (runs, wall, cost_square, memory, residue_square))
+            in sums.items()}
+
+
+    # select qa.model,
+    #        max(case when qa.method = 51 then qascore.global end),
+    #        max(case when qa.method = 52 then qascore.global end)
+    # from qa inner join qascore on qa.id = qascore.qa
+    # where qa.component is null and qa.method in (51, 52)
+    # group by qa.model having count(distinct qa.method) = 2;
+def query_global_pivot(methods, targets=None, target_column=False):
+    """Format a single pass query pivoting global scores of a set of methods
+       to one row per model, keeping only models scored by all methods
+
+    :param methods: iterable of method integer ID's to intersect
     :param targets: iterable with target text string names, for selection over
                     subset of targets
+    :param target_column: if True, report model target as first column
     :return: string of sqlite3 query
     """
-    from_query = "SELECT model.target AS target, qa.model AS model, qascore.global AS score FROM qa INNER JOIN qascore ON qa.id = qascore.qa INNER JOIN model ON model.id = qa.model WHERE qa.method = {} AND qa.component IS NULL"
+    methods = list(methods)
+    selects = ["qa.model"]
+    joins = "qa INNER JOIN qascore ON qa.id = qascore.qa"
+    if target_column:
+        selects.insert(0, "model.target")
+        joins += " INNER JOIN model ON model.id = qa.model"
+    # One column per method, in order; each model has one score per method
+    selects += ["MAX(CASE WHEN qa.method = {} THEN qascore.global END)".format(
+        method_id) for method_id in methods]
+    wheres = ["qa.component IS NULL",
+              "qa.method IN ({})".format(", ".join(
+                  [str(method_id) for method_id in methods]))]
+    if targets is not None:
+        ors = " OR ".join(["target = '{}'".format(target) for target in targets])
+        wheres.append("qa.model IN (SELECT id FROM model WHERE {})".format(ors))
 
-    selects = []
-    froms = []
-    ons = []
-    previous = None
-    model_column = None
+    query = "SELECT {} FROM {} WHERE {} GROUP BY qa.model HAVING COUNT(DISTINCT qa.method) = {};".format(
+        ", ".join(selects), joins, " AND ".join(wheres), len(set(methods)))
 
-    for (num, method_id) in enumerate(methods):
-        tablename = "t{}".format(num)
-        froms.append("({}) AS {}".format(from_query.format(method_id), tablename))
-        # Report model as first column
-        if previous is not None:
-            froms[-1] += " ON {}.model = {}.model".format(previous, tablename)
-        else:
-            model_column = "{}.model".format(tablename)
-            target_column = "{}.target".format(tablename)
-            selects.append(target_column)
-            selects.append(model_column)
-        selects.append("{}.score".format(tablename))
-        previous = tablename
-
-    where = None
+    return query
+
+
+@timed_stage("database reads", unit="rows",
+             count=lambda correlates, *args, **kwargs: len(correlates))
+def get_global_correlates(database, methods, targets=None,
+                          target_column=False):
+    """Get global correlates over QA model intersection; the same rows as
+       query_global_pivot, but pivoted in a single scan ordered by model, so
+       that time grows linearly with the number of methods
+
+    :param database: sqlite3 database connection
+    :param methods: iterable of method integer ID's to intersect
+    :param targets: iterable with target text string names, for selection over
+                    subset of targets
+    :param target_column: if True, report model target as first column
+    :return: list of tuples with (target,) model and one global score per
+             method, in order of methods
+    """
+    methods = list(methods)
+    column = {}
+    for method_id in methods:
+        column.setdefault(method_id, len(column))
+    selects = "qa.model, qa.method, qascore.global"
+    joins = "qa INNER JOIN qascore ON qa.id = qascore.qa"
+    if target_column:
+        selects = "model.target, " + selects
+        joins += " INNER JOIN model ON model.id = qa.model"
+    wheres = ["qa.component IS NULL",
+              "qa.method IN ({})".format(", ".join(
+                  [str(method_id) for method_id in column]))]
     if targets is not None:
         ors = " OR ".join(["target = '{}'".format(target) for target in targets])
-        model_select = "SELECT id FROM model WHERE {}".format(ors)
-        where = " WHERE {} IN ({})".format(model_column, model_select)
+        wheres.append("qa.model IN (SELECT id FROM model WHERE {})".format(ors))
+    query = "SELECT {} FROM {} WHERE {} ORDER BY qa.model;".format(
+        selects, joins, " AND ".join(wheres))
 
-    query = "SELECT {} FROM {}".format(", ".join(selects),
-                                             " INNER JOIN ".join(froms))
+    correlates = []
+    first = 1 if target_column else 0
+    current = None
+    for row in database.execute(query):
+        (model, method_id, score) = row[first:]
+        if model != current:
+            if current is not None and len(found) == len(column):
+                correlates.append(tuple(key + [scores[column[method_id]]
+                                               for method_id in methods]))
+            current = model
+            key = list(row[:first + 1])
+            scores = [None] * len(column)
+            found = set()
+        scores[column[method_id]] = score
+        found.add(method_id)
+    if current is not None and len(found) == len(column):
+        correlates.append(tuple(key + [scores[column[method_id]]
+                                       for method_id in methods]))
+    return correlates
 
-    # Append where clause if it exists; for target selection
-    if where is not None:
-        query += where
 
-    query += ";"
+def query_global_correlates(methods, targets=None):
+    """Format query for global correlates over QA model intersection
 
-    return query
+    :param methods: iterable of model integer ID's to intersect
+    :param targets: iterable with target text string names, for selection over
+                    subset of targets
+    :return: string of sqlite3 query
+    """
+    return query_global_pivot(methods, targets=targets)
+
+
+def query_global_correlates_proper(methods, targets=None):
+    """Format query for global correlates over QA model intersection, with
+       target and model as first columns
+
+    :param methods: iterable of model integer ID's to intersect
+    :param targets: iterable with target text string names, for selection over
+                    subset of targets
+    :return: string of sqlite3 query
+    """
+    return query_global_pivot(methods, targets=targets, target_column=True)
 
 
+@timed_stage("database writes", unit="rows",
+             count=lambda qa, model, global_score, local_score, *args,
+             **kwargs: sum(score is not None for score in local_score))
 def store_qa(model, global_score, local_score, qa_method, database, component=None):
     """Store quality assessment scores, either full model or partitioned domain
 
@@ -457,8 +918,6 @@ def store_qa(model, global_score, local_score, qa_method, database, component=No
     # check if there is already a unique qa entry
     query = 'SELECT id FROM qa WHERE model = {} AND component {} AND method = {};'.format(model, "IS NULL" if component is None else "= {}".format(component), qa_method)
     qa_id = database.execute(query).fetchone()
-    print(query)
-    print(qa_id)
     if qa_id is None:
         query = 'INSERT INTO qa (model, component, method) VALUES ({}, {}, {})'.format(model, "NULL" if component is None else component, qa_method)
         database.execute(query)
@@ -560,6 +1019,10 @@ def store_caspservers(servers, casp, database, all=False):
         "CREATE TABLE IF NOT EXISTS caspserver(id int, method int REFERENCES method(id), name text, type text, PRIMARY KEY (id, method));")
     database.execute(
         "CREATE TABLE IF NOT EXISTS competesin(caspserver int REFERENCES caspserver(id), casp int REFERENCES casp(id), PRIMARY KEY (caspserver, casp));")
+    # Result databases create the table without server names
+    if "name" not in [row[1] for row in
+                      database.execute("PRAGMA table_info(caspserver);")]:
+        database.execute("ALTER TABLE caspserver ADD COLUMN name text;")
 
     added = {}
     for server in servers:
@@ -580,49 +1043,66 @@ def store_caspservers(servers, casp, database, all=False):
 
 
 def store_domains(domains, database, method, casp=12):
+    """Store domain partitions of a set of targets, inserting all targets,
+       domains, components and segments in bulk within one transaction
+
+    :param domains: dictionary with target ID's as keys and lists of domains as
+                    values, each domain a list of (start, stop) segment tuples
+    :param database: sqlite3 database connection
+    :param method: integer partition method ID, if None a new unknown
+                   partitioner method is created
+    :param casp: integer CASP experiment ID
+    :return: integer partition method ID
+    """
+    # Keep everything in one write transaction, also reserving the domain IDs
+    if not database.in_transaction:
+        database.execute("BEGIN IMMEDIATE;")
     # Check if CASP is present, or create it
-    if database.execute(
-            "SELECT EXISTS (SELECT * FROM casp WHERE id = {} LIMIT 1);".format(
-                casp)).fetchone()[0] == 0:
-        database.execute("INSERT INTO casp (id) VALUES ({});".format(casp))
+    database.execute("INSERT OR IGNORE INTO casp (id) VALUES (?);", (casp,))
     # Create new method if not specified
     if method is None:
-        database.execute('INSERT INTO method (name, description, type) VALUES ("{}", "{}", {});'.format("Unkonwn Partitioner", "Automatically inserted unknown partition method", method_type["partitioner"]))
+        database.execute('INSERT INTO method (name, description, type) VALUES (?, ?, ?);', ("Unkonwn Partitioner", "Automatically inserted unknown partition method", method_type["partitioner"]))
         method = database.execute("SELECT last_insert_rowid();").fetchone()[0]
     # Or insert new if specified but does not exist
-    elif database.execute(
-            "SELECT EXISTS (SELECT * FROM method WHERE id = {} LIMIT 1);".format(
-                method)).fetchone()[0] == 0:
-        database.execute('INSERT INTO method (id, name, description, type) VALUES ({}, "{}", "{}", {});'.format(method, "Unkonwn Partitioner", "Automatically inserted unknown partition method", method_type["partitioner"]))
+    else:
+        database.execute('INSERT OR IGNORE INTO method (id, name, description, type) VALUES (?, ?, ?, ?);', (method, "Unkonwn Partitioner", "Automatically inserted unknown partition method", method_type["partitioner"]))
+    # Check if targets are present, or create them
+    database.executemany('INSERT OR IGNORE INTO target (id, casp) VALUES (?, ?);',
+                         [(target, casp) for target in domains])
+
+    # Domains already stored for this method
+    query = 'SELECT component.target, component.num, domain.id FROM component INNER JOIN domain ON (component.domain = domain.id) WHERE domain.method = ?;'
+    stored = {(target, num): domain_id for (target, num, domain_id) in
+              database.execute(query, (method,))}
+    # Number new domains following the last stored one
+    next_id = database.execute(
+        "SELECT COALESCE(MAX(id), 0) + 1 FROM domain;").fetchone()[0]
+
+    new_domains = []
+    new_components = []
+    segments = []
     for target in domains:
-        # check if target is present, or create it
-        if database.execute(
-                'SELECT EXISTS (SELECT * FROM target WHERE id = "{}" LIMIT 1);'.format(
-                 target)).fetchone()[0] == 0:
-            database.execute(
-                'INSERT INTO target (id, casp) VALUES ("{}", {});'.format(target, casp))
         for (num, domain) in enumerate(domains[target]):
-            # check if domain is present, or create it
-            domain_id = database.execute(
-                'SELECT domain.id FROM component INNER JOIN domain ON (component.domain = domain.id) WHERE component.target = "{}" AND component.num = {} AND domain.method = {} LIMIT 1;'.format(
-                    target, num, method)).fetchone()
-            print(domain_id)
+            domain_id = stored.get((target, num))
             if domain_id is None:
-                # Insert new domain
-                database.execute(
-                    'INSERT INTO domain (method) VALUES ({});'.format(method))
-                # Get last inserted domains rowid (domain id)
-                domain_id = database.execute("SELECT last_insert_rowid();").fetchone()
-                # Create component connector
-                database.execute(
-                    'INSERT INTO component (target, num, domain) VALUES ("{}", {}, {});'.format(
-                        target, num, domain_id[0]))
-                print("Inserted domain {}".format(domain_id[0]))
-            domain_id = domain_id[0]
-            print("And again {}".format(domain_id))
+                domain_id = next_id
+                next_id += 1
+                new_domains.append((domain_id, method))
+                new_components.append((target, num, domain_id))
             for segment in domain:
-                # print(segment, type(segment))
-                database.execute('INSERT INTO segment (domain, start, stop) VALUES ({}, {}, {});'.format(domain_id, segment[0], segment[1]))
+                segments.append((domain_id, segment[0], segment[1]))
+
+    database.executemany('INSERT INTO domain (id, method) VALUES (?, ?);',
+                         new_domains)
+    database.executemany(
+        'INSERT INTO component (target, num, domain) VALUES (?, ?, ?);',
+        new_components)
+    # Segment lengths are generated by the database (or by triggers in
+    # databases not yet migrated, see migrate_segment_length)
+    database.executemany(
+        'INSERT INTO segment (domain, start, stop) VALUES (?, ?, ?);',
+        segments)
+    return method
 
 
 def store_or_get_model(target, method, model, database):
@@ -700,6 +1180,7 @@ def store_models(target, servers, servermethods, database):
     return model_id
 
 
+@timed_stage("database writes")
 def store_models_and_servers(target, results, database):
     """Stores new servers and models; wrapper for store_servers and store_models
 
@@ -765,16 +1246,80 @@ def store_target_information(targets, casp, database, target_key="Target", lengt
     return (found, saved)
 
 
-def save_or_dump(database, datafile):
-    """Commit and close database, or dump to STDOUT
+def backup_database(database, datafile, pages=-1, progress=None):
+    """Write a snapshot of a database, e.g. one built in memory, to a file
+       with the SQLite backup API; page by page, so far more compact and
+       faster to load than an SQL text dump
+
+    :param database: sqlite3 database connection to copy
+    :param datafile: filename of snapshot, overwritten
+    :param pages: number of pages to copy per step, -1 for all at once; other
+                  connections may use the source database between steps
+    :param progress: function called after each step with the status, the
+                     number of remaining and the total number of pages
+    :return: filename of snapshot
+    """
+    snapshot = connect(datafile)
+    database.backup(snapshot, pages=pages, progress=progress)
+    snapshot.close()
+    return datafile
+
+
+def load_database(datafile, db=":memory:"):
+    """Load a database snapshot, by default into memory, with the SQLite
+       backup API
+
+    :param datafile: filename of snapshot
+    :param db: filename of database to load into, default in memory
+    :return: sqlite3 database connection to loaded database
+    """
+    # Connecting would create an empty database in place of a missing one
+    if not path.isfile(datafile):
+        raise FileNotFoundError("No database snapshot {}".format(datafile))
+    snapshot = connect(datafile)
+    database = connect_database(db, wal=False)
+    snapshot.backup(database)
+    snapshot.close()
+    return database
+
+
+def dump_database(database, outfile, compress=False):
+    """Write an SQL text dump of a database
+
+    :param database: sqlite3 database connection
+    :param outfile: binary file object to write to
+    :param compress: if True, gzip the dump
+    """
+    if compress:
+        outfile = GzipFile(fileobj=outfile, mode="wb", compresslevel=6)
+    for line in database.iterdump():
+        outfile.write((line + "\n").encode())
+    if compress:
+        outfile.close()
+
+
+def save_or_dump(database, datafile, snapshot=None, compress=False,
+                 pages=-1, progress=None):
+    """Commit and close database, or write a snapshot of it, or dump to STDOUT
 
     :param database: database connection
     :param datafile: string with database filename, if None; blurt out to STDOUT
+    :param snapshot: filename to write a snapshot of a database without
+                     datafile (i.e. in memory) to, instead of dumping it
+    :param compress: if True, gzip the dump to STDOUT
+    :param pages: pages per step of snapshot, see backup_database
+    :param progress: progress callback of snapshot, see backup_database
     """
+    from sys import stdout
     if datafile is not None:
         database.commit()
         database.close()
+    elif snapshot is not None:
+        database.commit()
+        backup_database(database, snapshot, pages=pages, progress=progress)
+        database.close()
     else:
         # or blurt sql-dump to stdout, if no database specified
-        for line in database.iterdump():
-            print(line)
\ No newline at end of file
+        stdout.flush()
+        dump_database(database, stdout.buffer, compress=compress)
+        stdout.buffer.flush()
@@ -1 +1,14 @@
-method_type = {"server" : 0, "partitioner" : 1, "qa" : 2, "compounder" : 3 }
\ No newline at end of file
+method_type = {"server" : 0, "partitioner" : 1, "qa" : 2, "compounder" : 3 }
+
+# SQLite PRAGMA settings per workload, applied in order on connecting, see
+# database.connect_database. Negative cache_size is in KiB; page_size only
+# takes effect on databases not yet written to
+pragma_profiles = {
+    "ingest": {"page_size": 4096, "cache_size": -262144,
+               "synchronous": "NORMAL", "temp_store": "MEMORY",
+               "mmap_size": 0},
+    "analysis": {"cache_size": -1048576, "synchronous": "NORMAL",
+                 "temp_store": "MEMORY", "mmap_size": 4294967296},
+    "readonly": {"cache_size": -1048576, "temp_store": "MEMORY",
+                 "mmap_size": 4294967296, "query_only": "ON"}
+}
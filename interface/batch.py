@@ -0,0 +1,388 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from os import environ, makedirs, path, remove
+from subprocess import STDOUT
+from time import sleep, time
+from .targets import find_targets
+from ..database import connect_database, create_run_table, store_run
+from ..internal.accounting import run_accounted
+from .schedule import order_longest_first
+from .workqueue import complete_item, fail_item, get_worker_id, is_done, \
+    is_failed, keep_leases, release_item, retry_item, try_lease
+
+
+# Order in which the stages of a target are run, each depending on the former
+batch_stages = ["partition", "draw"]
+
+
+def create_state_database(db):
+    """Open, or create, a batch job state database
+
+    :param db: path to state database file, string
+    :return: sqlite3 database connection
+    """
+    database = connect_database(db)
+    database.execute(
+        "CREATE TABLE IF NOT EXISTS job(target text, stage text, state text, directory text, started real, finished real, returncode int, log text, PRIMARY KEY (target, stage));")
+    # Resources used by each job, with the stage as tool
+    create_run_table(database)
+    database.commit()
+    return database
+
+
+def set_job_state(database, target, stage, state, directory=None,
+                  started=None, finished=None, returncode=None, log=None):
+    """Record the state of a job, committing it at once so that the state file
+       is consistent should the scheduler die at any point
+
+    :param database: sqlite3 connection to state database
+    :param target: target identifier, string
+    :param stage: stage name, see batch_stages
+    :param state: one of "pending", "running", "done" or "failed"
+    :param directory: output directory of target, string
+    :param started: epoch time of job start, float
+    :param finished: epoch time of job end, float
+    :param returncode: exit status of job, integer
+    :param log: path to job log file, string
+    """
+    with database:
+        database.execute(
+            "INSERT OR REPLACE INTO job (target, stage, state, directory, started, finished, returncode, log) VALUES (?, ?, ?, ?, ?, ?, ?, ?);",
+            (target, stage, state, directory, started, finished, returncode,
+             log))
+
+
+def get_job_states(database):
+    """Get the recorded state of all jobs
+
+    :param database: sqlite3 connection to state database
+    :return: dictionary with target identifiers as keys and dictionaries as
+             values, these with stage names as keys and state strings as values
+    """
+    states = {}
+    for (target, stage, state) in database.execute(
+            "SELECT target, stage, state FROM job;"):
+        if target not in states:
+            states[target] = {}
+        states[target][stage] = state
+    return states
+
+
+def reset_interrupted_jobs(database):
+    """Mark jobs left running by a crashed scheduler as pending again
+
+    :param database: sqlite3 connection to state database
+    :return: number of jobs reset, integer
+    """
+    with database:
+        cursor = database.execute(
+            "UPDATE job SET state = 'pending', started = NULL, finished = NULL, returncode = NULL WHERE state = 'running';")
+    return cursor.rowcount
+
+
+def is_partition_complete(outputdir):
+    """Check if a target directory holds the output of a finished partition,
+       domains.def being written last, from partition.dat
+
+    :param outputdir: output directory of target, string
+    :return: boolean
+    """
+    domainfile = path.join(outputdir, "domains.def")
+    partitionfile = path.join(outputdir, "partition.dat")
+    return path.isfile(domainfile) and path.getsize(domainfile) > 0 and \
+        path.isfile(partitionfile) and \
+        path.getmtime(domainfile) >= path.getmtime(partitionfile)
+
+
+def adopt_finished_jobs(jobs, database):
+    """Record partitions (and drawings) made before the state database, e.g.
+       by running casp12_partition.sh directly, as done; so that they are not
+       removed and run again
+
+    :param jobs: dictionary with target ID's as keys and tuples of output
+                 directory and partition command (list) as values
+    :param database: sqlite3 connection to state database
+    :return: list of targets adopted
+    """
+    states = get_job_states(database)
+    adopted = []
+    for target in sorted(jobs):
+        outputdir = jobs[target][0]
+        if target in states or not is_partition_complete(outputdir):
+            continue
+        finished = path.getmtime(path.join(outputdir, "domains.def"))
+        set_job_state(database, target, "partition", "done",
+                      directory=outputdir, finished=finished)
+        drawing = path.join(outputdir, "partition.png")
+        if path.isfile(drawing):
+            set_job_state(database, target, "draw", "done",
+                          directory=outputdir,
+                          finished=path.getmtime(drawing))
+        adopted.append(target)
+    return adopted
+
+
+def find_eligible_targets(directories, required=[], regex="T\d+"):
+    """Find target directories holding all files needed for partitioning
+
+    :param directories: iterable of directories with targets as subdirs
+    :param required: list of file suffixes, relative to the target directory,
+                     that must exist
+    :param regex: target directory regex, string
+    :return: tuple with two dictionaries, both with target ID's as keys and
+             target directory paths as values
+             1) targets eligible for partitioning
+             2) targets lacking required files
+    """
+    eligible = {}
+    skipped = {}
+    for directory in directories:
+        for (target, targetdir) in find_targets(directory, regex=regex).items():
+            if all([path.exists(path.join(targetdir, suffix))
+                    for suffix in required]):
+                eligible[target] = targetdir
+            else:
+                skipped[target] = targetdir
+    return eligible, skipped
+
+
+def read_model_list(modelfile):
+    """Read a whitespace separated list of model pathnames
+
+    :param modelfile: path to model listing, string
+    :return: list of model paths
+    """
+    with open(modelfile, 'r') as infile:
+        return infile.read().split()
+
+
+def partition_command(partitioner, outputdir, qa, models, norm="sum",
+                      bindir=path.dirname(path.abspath(__file__))):
+    """Form the casp12_partition.sh command line for a target
+
+    :param partitioner: MATLAB partitioner function, string
+    :param outputdir: output directory of target, string
+    :param qa: quality assessment file to weight the partition with, string
+    :param models: list of model paths
+    :param norm: QA normalization, string
+    :param bindir: directory of the casp12 scripts
+    :return: list of command arguments
+    """
+    return [path.join(bindir, "casp12_partition.sh"), partitioner, outputdir,
+            qa, norm] + models
+
+
+def draw_command(outputdir, bindir=path.dirname(path.abspath(__file__))):
+    """Form the casp12_matlab_exec.sh command line drawing a partition
+
+    :param outputdir: output directory of target, string
+    :param bindir: directory of the casp12 scripts
+    :return: list of command arguments
+    """
+    return [path.join(bindir, "casp12_matlab_exec.sh"), "draw_partition",
+            path.join(outputdir, "partition.dat"),
+            path.join(outputdir, "partition.png")]
+
+
+def run_job(cmd, log):
+    """Run a command, capturing both stdout and stderr in a log file
+
+    :param cmd: list of command arguments
+    :param log: path to log file, string
+    :return: tuple with start time, end time, exit status and resource usage,
+             see run_accounted (None if the command could not be started)
+    """
+    env = dict(environ)
+    # Never let MATLAB try to open a display
+    env["DISPLAY"] = ""
+    started = time()
+    usage = None
+    with open(log, 'w') as logfile:
+        try:
+            (returncode, output, usage) = run_accounted(
+                cmd, stdout=logfile, stderr=STDOUT, env=env)
+            usage["command"] = " ".join(cmd)
+        except OSError as error:
+            logfile.write("{}\n".format(error))
+            returncode = -1
+    return started, time(), returncode, usage
+
+
+def run_batch(jobs, database, workers=1, draw=True, retry=False,
+              verbose=True, queue=None, expiry=3600, poll=60, costs=None,
+              adopt=True):
+    """Run partition and draw jobs over a worker pool, recording job states
+
+    :param jobs: dictionary with target ID's as keys and tuples of output
+                 directory and partition command (list) as values
+    :param database: sqlite3 connection to state database
+    :param workers: number of concurrent jobs, integer
+    :param draw: also draw partitions when done, boolean
+    :param retry: rerun jobs that failed in an earlier run, boolean
+    :param verbose: print job transitions, boolean
+    :param queue: shared work queue directory; only run targets leased from
+                  it, so that several nodes may split the targets, string
+    :param expiry: seconds until an unrenewed queue lease may be reclaimed
+    :param poll: seconds between checks of targets leased by other nodes
+    :param costs: dictionary with target ID's as keys and predicted costs as
+                  values; the most costly targets are started first, the rest
+                  in name order
+    :param adopt: keep finished partitions of targets without a recorded
+                  state, see adopt_finished_jobs; otherwise partition them
+                  again
+    :return: dictionary with targets as keys and dictionaries as values, these
+             with stage names as keys and final state strings as values
+    """
+    if adopt:
+        for target in adopt_finished_jobs(jobs, database):
+            if verbose:
+                print("{:<12} {} (partitioned before)".format("ADOPTED",
+                                                             target))
+    states = get_job_states(database)
+    worker = get_worker_id()
+    held = set()
+
+    def submit(pool, target, stage, cmd):
+        outputdir = jobs[target][0]
+        makedirs(outputdir, exist_ok=True)
+        log = path.join(outputdir, "batch_{}.log".format(stage))
+        set_job_state(database, target, stage, "running", directory=outputdir,
+                      started=time(), log=log)
+        if verbose:
+            print("{:<12} {} -> {}".format(stage.upper(), target, outputdir))
+        return pool.submit(run_job, cmd, log)
+
+    def start(pool, target):
+        (outputdir, cmd) = jobs[target]
+        if states.get(target, {}).get("partition") != "done":
+            # Never trust partial output of an earlier attempt
+            domainfile = path.join(outputdir, "domains.def")
+            if path.exists(domainfile):
+                remove(domainfile)
+            return submit(pool, target, "partition", cmd), "partition"
+        return submit(pool, target, "draw", draw_command(outputdir)), "draw"
+
+    def finish(target, state):
+        if queue is not None:
+            # Failed targets are left for a -retry run, on any node
+            if state == "done":
+                complete_item(queue, target)
+            else:
+                fail_item(queue, target)
+            held.discard(target)
+
+    # Select targets with stages left to run
+    pending = []
+    if costs is None:
+        costs = {}
+    for target in order_longest_first({target: costs.get(target)
+                                       for target in jobs}):
+        done = states.get(target, {})
+        if not retry and "failed" in done.values():
+            if verbose:
+                print("{:<12} {}".format("FAILED", target))
+        elif done.get("partition") != "done" or \
+                (draw and done.get("draw") != "done"):
+            pending.append(target)
+
+    if queue is not None:
+        makedirs(queue, exist_ok=True)
+        if retry:
+            for target in pending:
+                retry_item(queue, target)
+        stop = keep_leases(queue, held, interval=expiry / 3)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            running = {}
+            while pending or running:
+                # Fill up free worker slots
+                waiting = []
+                for target in pending:
+                    if len(running) >= workers:
+                        waiting.append(target)
+                        continue
+                    if queue is not None:
+                        if is_done(queue, target) or is_failed(queue, target):
+                            continue
+                        if not try_lease(queue, target, worker, expiry=expiry):
+                            waiting.append(target)
+                            continue
+                        held.add(target)
+                    (future, stage) = start(pool, target)
+                    running[future] = (target, stage)
+                pending = waiting
+                if not running:
+                    # Only targets leased by other nodes are left
+                    sleep(poll)
+                    continue
+
+                (finished, _) = wait(running, timeout=poll,
+                                     return_when=FIRST_COMPLETED)
+                for future in finished:
+                    (target, stage) = running.pop(future)
+                    outputdir = jobs[target][0]
+                    (started, stopped, returncode, usage) = future.result()
+                    if usage is not None:
+                        with database:
+                            store_run(database, stage, usage, target=target,
+                                      returncode=returncode)
+                    state = "done" if returncode == 0 else "failed"
+                    if stage == "partition" and not path.exists(
+                            path.join(outputdir, "domains.def")):
+                        state = "failed"
+                    set_job_state(database, target, stage, state,
+                                  directory=outputdir, started=started,
+                                  finished=stopped, returncode=returncode,
+                                  log=path.join(outputdir,
+                                                "batch_{}.log".format(stage)))
+                    if verbose:
+                        print("{:<12} {} ({:.1f} s)".format(
+                            state.upper(), target, stopped - started))
+                    if stage == "partition" and state == "done" and draw:
+                        running[submit(pool, target, "draw",
+                                       draw_command(outputdir))] = \
+                            (target, "draw")
+                    else:
+                        finish(target, state)
+    finally:
+        if queue is not None:
+            stop.set()
+            for target in list(held):
+                release_item(queue, target)
+
+    return get_job_states(database)
+
+
+def print_batch_summary(database, outfile=None):
+    """Print a per-target summary of job states and timings
+
+    :param database: sqlite3 connection to state database
+    :param outfile: writeable filehandle, default STDOUT
+    :return: tuple with number of succeeded and failed targets
+    """
+    from sys import stdout
+    if outfile is None:
+        outfile = stdout
+    query = "SELECT target, stage, state, finished - started, returncode, log FROM job ORDER BY target, stage DESC;"
+    summary = {}
+    for (target, stage, state, elapsed, returncode, log) in database.execute(query):
+        if target not in summary:
+            summary[target] = []
+        summary[target].append((stage, state, elapsed, returncode, log))
+
+    succeeded = 0
+    failed = 0
+    for target in summary:
+        states = [entry[1] for entry in summary[target]]
+        if "failed" in states:
+            failed += 1
+        elif all([state == "done" for state in states]):
+            succeeded += 1
+        for (stage, state, elapsed, returncode, log) in summary[target]:
+            outfile.write("{:<8} {:<10} {:<8} {:>10} {:>4} {}\n".format(
+                target, stage, state,
+                "" if elapsed is None else "{:.1f}s".format(elapsed),
+                "" if returncode is None else returncode,
+                log if state == "failed" else ""))
+    outfile.write("{} targets done, {} failed\n".format(succeeded, failed))
+    return succeeded, failed
@@ -0,0 +1,458 @@
+from contextlib import redirect_stdout
+from importlib.util import find_spec
+from io import StringIO
+from os import environ, path, pathsep, remove
+from platform import platform, python_version
+from random import Random
+from sqlite3 import sqlite_version
+from subprocess import DEVNULL, run
+from sys import executable
+from time import perf_counter, time
+from ..database import connect_database, create_result_database, \
+    get_correlates, get_global_correlates, get_local_score_ranges, \
+    iterate_local_correlates, iterate_result_rows, store_local_score, store_qa
+from ..definitions import pragma_profiles
+from .pcons import d2S, global_score, join_models, \
+    pcons_domain_specifications, read_pcons
+from .synthetic import format_lga_sda, format_pcons_output, \
+    get_casp_model_name, get_pcons_model_name, store_synthetic_dataset, \
+    synthesize_dataset, synthesize_trace, synthetic_scales
+
+
+def get_profile_names(profiles):
+    """Profile names to benchmark, where "default" stands for no PRAGMA
+       settings at all
+
+    :param profiles: list of profile names, None for all and the default
+    :return: list of profile names, None for the default
+    """
+    if profiles is None:
+        profiles = ["default"] + list(pragma_profiles)
+    return [None if profile == "default" else profile for profile in profiles]
+
+
+def is_read_only(profile):
+    """Whether connections of a profile refuse to write
+
+    :param profile: profile name, None for default
+    :return: True if the profile sets query_only
+    """
+    if profile is None:
+        return False
+    return str(pragma_profiles[profile].get("query_only", "OFF")).upper() in \
+        ("ON", "1", "TRUE", "YES")
+
+
+def read_ingest_sample(database, models=200):
+    """Read the QA of some models, to replay as an ingest workload
+
+    :param database: sqlite3 database connection
+    :param models: number of models to read
+    :return: list of tuples with target, model ID, method ID, global score and
+             list of local scores (None where not scored) starting from the
+             first residue
+    """
+    query = "SELECT model.target, qa.model, qa.method, qascore.global, lscore.residue, lscore.score FROM (SELECT id, target FROM model ORDER BY id LIMIT ?) AS model INNER JOIN qa ON qa.model = model.id LEFT JOIN qascore ON qascore.qa = qa.id LEFT JOIN lscore ON lscore.qa = qa.id WHERE qa.component IS NULL ORDER BY model.target, qa.model, qa.method, lscore.residue;"
+    sample = []
+    for (target, model, method, global_score, residue, score) in \
+            database.execute(query, (models,)):
+        if not sample or sample[-1][1:3] != (model, method):
+            sample.append((target, model, method, global_score, []))
+        if residue is not None:
+            local_score = sample[-1][4]
+            local_score += [None] * (residue - len(local_score))
+            local_score[residue - 1] = score
+    return sample
+
+
+def ingest_workload(database, sample):
+    """Store QA the way the parsers do, row by row, committing per target
+
+    :param database: sqlite3 database connection
+    :param sample: QA to store, see read_ingest_sample
+    """
+    target = None
+    for (qa_target, model, method, global_score, local_score) in sample:
+        if target is not None and qa_target != target:
+            database.commit()
+        target = qa_target
+        qa = database.execute(
+            "INSERT INTO qa (model, component, method) VALUES (?, NULL, ?);",
+            (model, method)).lastrowid
+        database.execute(
+            "INSERT OR REPLACE INTO qascore (qa, global) VALUES (?, ?);",
+            (qa, global_score))
+        store_local_score(qa, local_score, database)
+    database.commit()
+
+
+def global_correlates_workload(database, methods):
+    """Pivot the global scores of all methods, as casp12_plot_correlation
+
+    :param database: sqlite3 database connection
+    :param methods: list of integer method ID's
+    """
+    get_global_correlates(database, methods)
+
+
+def local_correlates_workload(database, methods):
+    """Read the local score correlates of all models, model by model
+
+    :param database: sqlite3 database connection
+    :param methods: list of integer method ID's
+    """
+    for chunk in iterate_local_correlates(database, methods):
+        pass
+
+
+def score_ranges_workload(database, methods):
+    """Aggregate local scores per method, a full scan of lscore
+
+    :param database: sqlite3 database connection
+    :param methods: list of integer method ID's
+    """
+    get_local_score_ranges(database, methods)
+
+
+def export_workload(database, methods):
+    """Read all results denormalised, as casp12_export_parquet
+
+    :param database: sqlite3 database connection
+    :param methods: list of integer method ID's
+    """
+    for chunk in iterate_result_rows(database, methods=methods):
+        pass
+
+
+# Query workloads, run against the benchmarked database
+query_workloads = {"global correlates": global_correlates_workload,
+                   "local correlates": local_correlates_workload,
+                   "score ranges": score_ranges_workload,
+                   "export rows": export_workload}
+
+
+def time_ingest(sample, datafile, profile, repeat=1):
+    """Best time of storing a sample in a new database
+
+    :param sample: QA to store, see read_ingest_sample
+    :param datafile: scratch database filename, removed between repeats
+    :param profile: profile name, None for default
+    :param repeat: number of times to run
+    :return: seconds, float
+    """
+    best = None
+    for i in range(repeat):
+        for suffix in ("", "-wal", "-shm"):
+            if path.exists(datafile + suffix):
+                remove(datafile + suffix)
+        database = create_result_database(datafile, profile=profile)
+        database.commit()
+        start = perf_counter()
+        ingest_workload(database, sample)
+        seconds = perf_counter() - start
+        database.close()
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+def time_query(workload, datafile, methods, profile, repeat=1):
+    """Best time of a query workload, on a new connection each time
+
+    :param workload: function of a database connection and method ID's
+    :param datafile: database filename
+    :param methods: list of integer method ID's
+    :param profile: profile name, None for default
+    :param repeat: number of times to run
+    :return: seconds, float
+    """
+    best = None
+    for i in range(repeat):
+        database = connect_database(datafile, wal=False, profile=profile)
+        start = perf_counter()
+        workload(database, methods)
+        seconds = perf_counter() - start
+        database.close()
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+def benchmark_profiles(datafile, methods, scratch, profiles=None, models=200,
+                       repeat=3):
+    """Time the ingest and query workloads under each PRAGMA profile
+
+    :param datafile: result database to query, and sample ingest data from
+    :param methods: list of integer method ID's to query
+    :param scratch: filename of scratch database for ingest
+    :param profiles: list of profile names, see get_profile_names
+    :param models: number of models to ingest
+    :param repeat: number of runs of each workload, the best is kept
+    :return: dictionary with workload names as keys and dictionaries as
+             values, these with profile names as keys and seconds as values;
+             None for workloads a profile cannot run
+    """
+    database = connect_database(datafile, wal=False)
+    sample = read_ingest_sample(database, models=models)
+    database.close()
+    timings = {"ingest": {}}
+    timings.update({name: {} for name in query_workloads})
+    for profile in get_profile_names(profiles):
+        name = "default" if profile is None else profile
+        timings["ingest"][name] = None if is_read_only(profile) else \
+            time_ingest(sample, scratch, profile, repeat=repeat)
+        for workload in query_workloads:
+            timings[workload][name] = time_query(
+                query_workloads[workload], datafile, methods, profile,
+                repeat=repeat)
+    for suffix in ("", "-wal", "-shm"):
+        if path.exists(scratch + suffix):
+            remove(scratch + suffix)
+    return timings
+
+
+def prepare_hotpath_data(dataset, casp=12, seed=0):
+    """Inputs of the hot path workloads, from a synthetic dataset
+
+    :param dataset: dictionary of target datasets, see
+                    synthetic.synthesize_dataset
+    :param casp: integer CASP experiment
+    :param seed: random seed for model coordinates
+    :return: dictionary of inputs; the database is an in memory result
+             database holding the dataset
+    """
+    random = Random(seed)
+    data = {"casp": casp, "pcons": {}, "lga": [], "domains": {}, "qa": [],
+            "lengths": {}, "chains": None}
+    database = create_result_database()
+    methods = store_synthetic_dataset(dataset, database, casp=casp)
+    database.commit()
+    data["database"] = database
+    data["partitioner"] = methods["Synthetic"]
+    data["methods"] = [method for (name, method) in methods.items()
+                       if name != "Synthetic" and not name.startswith("server")]
+    for (target, target_data) in dataset.items():
+        length = target_data["length"]
+        data["lengths"][target] = length
+        scores = {get_pcons_model_name(*key): d2S(distances)
+                  for (key, distances) in target_data["models"].items()}
+        data["pcons"][target] = format_pcons_output(scores)
+        for (key, distances) in target_data["models"].items():
+            data["lga"].append(format_lga_sda(
+                target, get_casp_model_name(target, *key), distances))
+            data["qa"].append((global_score(d2S(distances)) or 0.0,
+                               d2S(distances)))
+        # PCONS scores of each domain, residues outside of it unscored
+        data["domains"][target] = {}
+        for (num, domain) in enumerate(target_data["domains"]):
+            inside = set()
+            for (start, stop) in domain:
+                inside.update(range(start - 1, stop))
+            local = {name: [score if i in inside else None
+                            for (i, score) in enumerate(values)]
+                     for (name, values) in scores.items()}
+            data["domains"][target][num] = (
+                {name: global_score(values) for (name, values)
+                 in local.items()}, local)
+        if data["chains"] is None:
+            data["chains"] = {"A": [[position] for position in
+                                    synthesize_trace(random, length)]}
+    return data
+
+
+def read_pcons_workload(data):
+    """Parse the PCONS output of every target
+
+    :param data: inputs, see prepare_hotpath_data
+    """
+    for lines in data["pcons"].values():
+        read_pcons(lines)
+
+
+def parse_lga_sda_workload(data):
+    """Parse the LGA_SDA file of every model
+
+    :param data: inputs, see prepare_hotpath_data
+    """
+    # Not at module level, the CASP parsers need lxml
+    from .casp import parse_lga_sda
+    for lines in data["lga"]:
+        parse_lga_sda(lines)
+
+
+def store_qa_workload(data):
+    """Store the QA of every model in a new in memory database
+
+    :param data: inputs, see prepare_hotpath_data
+    """
+    database = create_result_database()
+    for (model, (global_value, local)) in enumerate(data["qa"], start=1):
+        store_qa(model, global_value, local, 1, database)
+    database.commit()
+    database.close()
+
+
+def get_correlates_workload(data):
+    """Read the local correlates of the QA methods, target by target
+
+    :param data: inputs, see prepare_hotpath_data
+    """
+    for target in data["lengths"]:
+        get_correlates(data["database"], data["methods"], target=target)
+
+
+def join_models_workload(data):
+    """Join the PCONS domain scores of every target
+
+    :param data: inputs, see prepare_hotpath_data
+    """
+    for (target, domains) in data["domains"].items():
+        join_models(domains, data["lengths"][target])
+
+
+def pcons_domain_specifications_workload(data):
+    """Format the PCONS ignore files of every target, target by target
+
+    :param data: inputs, see prepare_hotpath_data
+    """
+    for target in data["lengths"]:
+        pcons_domain_specifications(data["casp"], target, data["database"],
+                                    data["partitioner"])
+
+
+def print_distance_matrix_workload(data):
+    """Print the distance matrix of one model, output discarded
+
+    :param data: inputs, see prepare_hotpath_data
+    """
+    from ..casp12_pdb_tensor import printDistanceMatrix
+    chains = data["chains"]
+    with redirect_stdout(StringIO()):
+        printDistanceMatrix(chains, sorted(chains),
+                            {chain: len(chains[chain]) for chain in chains})
+
+
+# Hot path workloads of the pipeline, run on synthetic data
+hotpath_workloads = {"read_pcons": read_pcons_workload,
+                     "parse_lga_sda": parse_lga_sda_workload,
+                     "store_qa": store_qa_workload,
+                     "get_correlates": get_correlates_workload,
+                     "join_models": join_models_workload,
+                     "pcons_domain_specifications":
+                         pcons_domain_specifications_workload,
+                     "printDistanceMatrix": print_distance_matrix_workload}
+
+# Optional modules a hot path needs, those missing are not timed
+hotpath_requirements = {"printDistanceMatrix": "pdbparse"}
+
+
+def time_hotpath(workload, data, repeat=1):
+    """Best time of a hot path workload
+
+    :param workload: function of the inputs
+    :param data: inputs, see prepare_hotpath_data
+    :param repeat: number of times to run
+    :return: seconds, float
+    """
+    best = None
+    for i in range(repeat):
+        start = perf_counter()
+        workload(data)
+        seconds = perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+def benchmark_hotpaths(scales=None, hotpaths=None, repeat=3, seed=0):
+    """Time the hot path workloads on synthetic datasets of several scales
+
+    :param scales: list of scale names, see synthetic.synthetic_scales; None
+                   for all
+    :param hotpaths: list of hot path names, see hotpath_workloads; None for
+                     all
+    :param repeat: number of runs of each workload, the best is kept
+    :param seed: random seed of the datasets
+    :return: dictionary with the environment, the scales and the timings; the
+             latter with scale names as keys and dictionaries as values,
+             these with hot path names as keys and seconds as values, None for
+             hot paths missing their optional module
+    """
+    if scales is None:
+        scales = list(synthetic_scales)
+    if hotpaths is None:
+        hotpaths = list(hotpath_workloads)
+    results = {"environment": {"python": python_version(),
+                               "sqlite": sqlite_version,
+                               "platform": platform(), "time": time(),
+                               "repeat": repeat, "seed": seed},
+               "scales": {scale: synthetic_scales[scale] for scale in scales},
+               "timings": {}}
+    for scale in scales:
+        data = prepare_hotpath_data(
+            synthesize_dataset(seed=seed, **synthetic_scales[scale]),
+            seed=seed)
+        results["timings"][scale] = {}
+        for hotpath in hotpaths:
+            requirement = hotpath_requirements.get(hotpath)
+            if requirement is not None and find_spec(requirement) is None:
+                results["timings"][scale][hotpath] = None
+                continue
+            results["timings"][scale][hotpath] = time_hotpath(
+                hotpath_workloads[hotpath], data, repeat=repeat)
+        data["database"].close()
+    return results
+
+
+def compare_hotpaths(baseline, results, tolerance=0.25):
+    """Compare hot path timings with those of an earlier run
+
+    :param baseline: results of an earlier run, see benchmark_hotpaths
+    :param results: results of this run
+    :param tolerance: relative slowdown tolerated, float
+    :return: list of tuples of scale, hot path, baseline and current
+             seconds, their ratio and whether the ratio is above
+             1 + tolerance; for hot paths timed in both runs
+    """
+    comparison = []
+    for scale in results["timings"]:
+        for (hotpath, seconds) in results["timings"][scale].items():
+            before = baseline.get("timings", {}).get(scale, {}).get(hotpath)
+            if before is None or seconds is None or before <= 0:
+                continue
+            ratio = seconds / before
+            comparison.append((scale, hotpath, before, seconds, ratio,
+                               ratio > 1.0 + tolerance))
+    return comparison
+
+
+def time_startup(subcommands=None, repeat=3):
+    """Best wall time of starting casp12 subcommands in a new interpreter,
+       to print their help only; that is mostly the time of imports
+
+    :param subcommands: list of subcommand names, see casp12_cli.subcommands;
+                        None for all
+    :param repeat: number of starts of each subcommand
+    :return: dictionary with subcommand names as keys and seconds as values,
+             None for subcommands failing to start (e.g. missing modules)
+    """
+    from ..casp12_cli import subcommands as casp12_subcommands
+    if subcommands is None:
+        subcommands = list(casp12_subcommands)
+    # The new interpreter has to find the casp12 package
+    package = path.dirname(path.dirname(path.dirname(path.abspath(__file__))))
+    environment = dict(environ)
+    environment["PYTHONPATH"] = pathsep.join(
+        [package] + [directory for directory in
+                     environ.get("PYTHONPATH", "").split(pathsep) if directory])
+    timings = {}
+    for subcommand in subcommands:
+        best = None
+        for i in range(repeat):
+            start = perf_counter()
+            process = run([executable, "-m", "casp12", subcommand, "-h"],
+                          stdout=DEVNULL, stderr=DEVNULL, env=environment)
+            seconds = perf_counter() - start
+            if process.returncode != 0:
+                best = None
+                break
+            best = seconds if best is None else min(best, seconds)
+        timings[subcommand] = best
+    return timings
@@ -1,9 +1,9 @@
-from lxml.etree import HTML
 from csv import unix_dialect, DictReader, register_dialect
 from collections import OrderedDict
 from ..database import get_or_add_method, store_qa, store_model_caspmethod
 from .pcons import d2S, read_pcons
 from re import compile
+from ..internal.instrument import timed_stage
 
 
 class LGA_SDAError(Exception):
@@ -48,6 +48,7 @@ def parse_server_definitions(page):
     :return: dictionary with CASP server ID integer as keys and tuples of server
              textual name and type
     """
+    from lxml.etree import HTML
     xml = HTML(page)
 
     path_groupname = "//table[@id='table_results']//td[@title='Group Name']/b"
@@ -86,6 +87,7 @@ def parse_target_information(webpage):
 
     # NAME                            N1   N2   DIST      N    RMSD    GDT_TS    LGA_S3     LGA_Q
     # T0899TS001_1-D1.lga:SUMMARY(GDT)  259  259    4.0     29    2.83    13.031    10.371     0.990
+@timed_stage("parsing", unit="files", count=lambda *args, **kwargs: 1)
 def parse_lga_sda_summary(infile, summaryregex="^([^\.]+)\.lga:SUMMARY\(GDT\)\s+(.*)"):
     """Parse a CASP SDA summary file
 
@@ -112,6 +114,7 @@ def parse_lga_sda_summary(infile, summaryregex="^([^\.]+)\.lga:SUMMARY\(GDT\)\s+
     return summary
 
 
+@timed_stage("parsing", unit="files", count=lambda *args, **kwargs: 1)
 def parse_global_summary(infile):
     """Read target information specified in CASP csv file
 
@@ -125,6 +128,7 @@ def parse_global_summary(infile):
 
 
 
+@timed_stage("parsing", unit="files", count=lambda *args, **kwargs: 1)
 def parse_lga_sda(infile, lgaregex="^LGA\s+", modelregex = "^# Molecule1:.* selected\s+(\d+) .* name\s+(\S+)", evidenceregex = "^# Molecule2:.* selected\s+(\d+) .* name\s+(\S+)", errorregex="^# ERROR!"):
     """ Parse an LGA file in CASP style
 
@@ -178,6 +182,7 @@ def parse_lga_sda(infile, lgaregex="^LGA\s+", modelregex = "^# Molecule1:.* sele
     return distances, model, evidence, selection
 
 
+@timed_stage("parsing", unit="files", count=lambda *args, **kwargs: 1)
 def parse_lga_lddt(infile, lddtregex="^.\s+(\S+)\s+(\d+)\s+(\S+)\s(\S+)\s+(\S+)\s+(\S+)\s*\Z", modelregex = "^File: (\S+)", globalregex="^Global LDDT score: (\d+\.\d+)"):
     """Parse a LDDT file
 
@@ -0,0 +1,230 @@
+from concurrent.futures import ProcessPoolExecutor
+from os import path, remove
+from sqlite3 import SQLITE_LIMIT_ATTACHED
+from ..database import apply_pragma_profile, connect_database, \
+    create_result_database
+
+
+# Tables exposed by union views over attached result databases
+federated_tables = ["method", "target", "model", "qa", "qascore", "lscore"]
+
+# Per target row selection when sharding a result database; {0} is the shard
+# schema, tables not listed are copied whole
+shard_selections = {
+    "target": "id IN (SELECT id FROM temp.shard_target)",
+    "component": "target IN (SELECT id FROM temp.shard_target)",
+    "model": "target IN (SELECT id FROM temp.shard_target)",
+    "completed": "target IN (SELECT id FROM temp.shard_target)",
+    "run": "target IN (SELECT id FROM temp.shard_target)",
+    "qa": "model IN (SELECT id FROM {0}.model)",
+    "qascore": "qa IN (SELECT id FROM {0}.qa)",
+    "lscore": "qa IN (SELECT id FROM {0}.qa)",
+    "qajoin": "compound IN (SELECT id FROM {0}.qa)"}
+
+
+def get_table_columns(database, table, schema="main"):
+    """Get the stored (not generated) columns of a table
+
+    :param database: sqlite3 database connection
+    :param table: table name, string
+    :param schema: schema name of attached database, string
+    :return: list of column names, empty if there is no such table
+    """
+    return [row[1] for row in database.execute(
+        "PRAGMA {}.table_info({});".format(schema, table))]
+
+
+def attach_databases(database, files):
+    """Attach result databases to a connection, as schemas source0, source1,
+       etc.
+
+    :param database: sqlite3 database connection
+    :param files: list of database filenames
+    :return: dictionary with schema names as keys and filenames as values
+    """
+    limit = database.getlimit(SQLITE_LIMIT_ATTACHED)
+    if len(files) > limit:
+        raise ValueError("Cannot attach {} databases, SQLite allows {}".format(
+            len(files), limit))
+    # Attaching would create an empty database in place of a missing one
+    for datafile in files:
+        if not path.isfile(datafile):
+            raise FileNotFoundError("No result database {}".format(datafile))
+    schemas = {}
+    for (number, datafile) in enumerate(files):
+        schema = "source{}".format(number)
+        database.execute("ATTACH DATABASE ? AS {};".format(schema),
+                         (datafile,))
+        schemas[schema] = datafile
+    return schemas
+
+
+def create_union_views(database, schemas, tables=None):
+    """Create temporary views concatenating a table over all attached
+       databases, with a source column naming the schema of each row. Row ID's
+       are only unique within a source, so join on source as well as ID
+
+    :param database: sqlite3 database connection
+    :param schemas: iterable of attached schema names
+    :param tables: list of table names, default=federated_tables
+    :return: dictionary with view names as keys and lists of columns,
+             those present in all sources, as values
+    """
+    if tables is None:
+        tables = federated_tables
+    views = {}
+    for table in tables:
+        columns = None
+        for schema in schemas:
+            present = get_table_columns(database, table, schema=schema)
+            columns = present if columns is None else \
+                [column for column in columns if column in present]
+        if not columns:
+            continue
+        database.execute("DROP VIEW IF EXISTS temp.{};".format(table))
+        database.execute("CREATE TEMP VIEW {} AS {};".format(
+            table, " UNION ALL ".join(
+                ["SELECT '{0}' AS source, {1} FROM {0}.{2}".format(
+                    schema, ", ".join(columns), table) for schema in schemas])))
+        views[table] = columns
+    return views
+
+
+def open_federation(files, profile="readonly"):
+    """Open a set of result databases (e.g. one per CASP round) as one, with
+       union views over the tables in federated_tables
+
+    :param files: list of database filenames
+    :param profile: name of PRAGMA settings, see database.connect_database
+    :return: tuple of sqlite3 database connection and dictionary with schema
+             names as keys and filenames as values
+    """
+    database = connect_database(":memory:", wal=False)
+    schemas = attach_databases(database, files)
+    # Profile first, since setting temp_store drops temporary views; though
+    # views can not be created while query_only
+    if profile is not None:
+        for schema in schemas:
+            apply_pragma_profile(database, profile, schema=schema)
+    query_only = database.execute("PRAGMA query_only;").fetchone()[0]
+    database.execute("PRAGMA query_only = OFF;")
+    create_union_views(database, schemas)
+    database.execute("PRAGMA query_only = {};".format(query_only))
+    return database, schemas
+
+
+def federate_query(query, schemas):
+    """Run a query on each attached database and concatenate the results in
+       one statement; joins stay within each database and use its indexes,
+       unlike joins over union views
+
+    :param query: SELECT statement without trailing semicolon, with {schema}
+                  in place of the schema name of tables (e.g.
+                  {schema}.lscore) and optionally {source} for its name as a
+                  string literal
+    :param schemas: iterable of attached schema names
+    :return: string of sqlite3 query
+    """
+    return " UNION ALL ".join(
+        ["SELECT * FROM ({})".format(
+            query.format(schema=schema, source="'{}'".format(schema)))
+         for schema in schemas]) + ";"
+
+
+def assign_shards(database, shards):
+    """Assign targets to shards, balancing the number of local scores; the
+       largest targets are placed first, each in the lightest shard
+
+    :param database: sqlite3 database connection to result database
+    :param shards: number of shards
+    :return: list with a list of text target ID's per shard
+    """
+    query = "SELECT target.id, COUNT(lscore.qa) FROM (SELECT id FROM target UNION SELECT target FROM model) AS target LEFT JOIN model ON model.target = target.id LEFT JOIN qa ON qa.model = model.id LEFT JOIN lscore ON lscore.qa = qa.id GROUP BY target.id ORDER BY COUNT(lscore.qa) DESC, target.id;"
+    assigned = [[] for shard in range(shards)]
+    load = [0] * shards
+    for (target, size) in database.execute(query):
+        lightest = load.index(min(load))
+        assigned[lightest].append(target)
+        load[lightest] += size
+    return assigned
+
+
+def shard_result_database(datafile, shard_files, profile="ingest"):
+    """Split a result database into shards by target; rows keep their ID's,
+       so results from shards can be merged, and tables not pertaining to
+       targets (methods, domains, etc.) are copied to every shard
+
+    :param datafile: result database filename
+    :param shard_files: list of shard database filenames, overwritten
+    :param profile: name of PRAGMA settings, see database.connect_database
+    :return: list with a list of text target ID's per shard
+    """
+    database = connect_database(datafile, wal=False, profile=profile)
+    assigned = assign_shards(database, len(shard_files))
+    tables = [table for (table,) in database.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%';")]
+    database.execute(
+        "CREATE TEMP TABLE IF NOT EXISTS shard_target(id text PRIMARY KEY);")
+    for (shard_file, targets) in zip(shard_files, assigned):
+        for suffix in ("", "-wal", "-shm"):
+            if path.exists(shard_file + suffix):
+                remove(shard_file + suffix)
+        create_result_database(shard_file, profile=profile).close()
+        database.execute("ATTACH DATABASE ? AS shard;", (shard_file,))
+        database.execute("DELETE FROM temp.shard_target;")
+        database.executemany("INSERT INTO temp.shard_target (id) VALUES (?);",
+                             [(target,) for target in targets])
+        # Tables in order of shard_selections, as later ones select on former
+        ordered = [table for table in tables if table not in shard_selections] \
+            + [table for table in shard_selections if table in tables]
+        for table in ordered:
+            # Maintained by triggers, as components and segments are copied
+            if table == "domain_size":
+                continue
+            columns = [column for column in
+                       get_table_columns(database, table)
+                       if column in get_table_columns(database, table,
+                                                      schema="shard")]
+            if not columns:
+                continue
+            selection = shard_selections.get(table)
+            database.execute("INSERT INTO shard.{0} ({1}) SELECT {1} FROM main.{0}{2};".format(
+                table, ", ".join(columns),
+                "" if selection is None else
+                " WHERE " + selection.format("shard")))
+        database.commit()
+        database.execute("DETACH DATABASE shard;")
+    database.close()
+    return assigned
+
+
+def read_shard(datafile, function, arguments):
+    """Open a shard read only and apply a reading function to it
+
+    :param datafile: shard database filename
+    :param function: module level function taking a database connection
+                     followed by arguments
+    :param arguments: tuple of further arguments to function
+    :return: return value of function
+    """
+    database = connect_database(datafile, wal=False, profile="readonly")
+    result = function(database, *arguments)
+    database.close()
+    return result
+
+
+def read_shards(function, shard_files, arguments=(), workers=None):
+    """Apply a reading function to every shard in parallel processes; merge
+       the results in Python, e.g. by concatenation for per model results
+
+    :param function: module level function taking a database connection
+                     followed by arguments, returning something picklable
+    :param shard_files: list of shard database filenames
+    :param arguments: tuple of further arguments to function
+    :param workers: number of processes, default=one per processor
+    :return: list of function return values, in order of shard_files
+    """
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(read_shard, shard_files,
+                                 [function] * len(shard_files),
+                                 [arguments] * len(shard_files)))
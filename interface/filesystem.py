@@ -2,8 +2,11 @@ from os import listdir, walk
 from os.path import isfile, join
 from re import compile
 from subprocess import run
+from ..internal.instrument import timed_stage
 
 
+@timed_stage("discovery", unit="paths",
+             count=lambda found, *args, **kwargs: len(found))
 def find_all_files(directory):
     """Returns all filenames found in a directory structure
 
@@ -1,4 +1,3 @@
-from lxml.etree import HTML
 from os.path import join
 from re import compile
 from urllib.request import urlopen, urlretrieve
@@ -12,6 +11,7 @@ def get_xml_page(url):
     :param url: Text server url to open
     :return: lxml.etree xml object of HTML-page
     """
+    from lxml.etree import HTML
     servers = {}
 
     # Get and read the text from the webpage
@@ -1,5 +1,4 @@
-from pandas import concat, DataFrame, MultiIndex, Series
-from numpy import arctanh
+from numpy import arctanh, asarray, tile, triu_indices
 from ..internal.calculations import d2S
 
 
@@ -14,15 +13,42 @@ def get_dataframe(data, column_names):
     :param column_names: iterable of column identifiers
     :return: Pandas Dataframe object
     """
+    from pandas import DataFrame
     return DataFrame(data, columns=column_names)
 
 
+def get_tidy_correlations(groups, matrices, counts, names, group_type="model"):
+    """Format stacked per group correlation matrices into a tidy frame, with
+       one row per group and method pair
+
+    :param groups: iterable of group identifiers, one per matrix
+    :param matrices: 3D numpy array of correlation matrices (group, i, j)
+    :param counts: 3D numpy array with the number of correlates behind each
+                   coefficient, same shape as matrices
+    :param names: list of method names, for rows and columns of matrices
+    :param group_type: name of the group column
+    :return: Pandas DataFrame with group, two method columns, correlation and
+             count
+    """
+    from pandas import DataFrame
+    (first, second) = triu_indices(len(names), k=1)
+    names = asarray(names, dtype=object)
+    groups = asarray(groups)
+    return DataFrame({
+        group_type: groups.repeat(len(first)),
+        "method1": tile(names[first], len(groups)),
+        "method2": tile(names[second], len(groups)),
+        "correlation": matrices[:, first, second].reshape(-1),
+        "n": counts[:, first, second].reshape(-1)})
+
+
 def join_dict_of_tables(tables):
     """Join a dictionary of Pandas DataFrames into a single DataFrame
 
     :param tables: dictionary with table names as keys and DataFrames as values
     :return: Pandas DataFrame with the joined tables
     """
+    from pandas import concat
     keys = list(tables.keys())
     return concat([tables[key] for key in keys], keys=keys)
 
@@ -41,6 +67,7 @@ def join_dict_of_tables_on_column(tables, column, source_type="table",
     :return: Pandas DataFrame with selected column as rows from old dictionary
              and a list of skipped tables
     """
+    from pandas import DataFrame
     # Split off this
     table_rows, skipped = select_column_from_tables_in_dictionary(tables,
                                                                   column,
@@ -60,6 +87,7 @@ def overwrite_column_with_value(dataframe, column, value):
     :param value: value to overwrite each column entry with
     :return: Pandas DataFrame of altered table
     """
+    from pandas import Series
     dataframe[column] = Series([value for x in range(len(dataframe.index))],
                                index=dataframe.index)
     return dataframe
@@ -73,6 +101,7 @@ def rename_index(dataframe, index_name, level=0):
     :param level: index level to reset, default is 0
     :return: new Pandas DataFrame
     """
+    from pandas import MultiIndex
     convert_name = level
     if type(convert_name) is int:
         if 'index' in dataframe or type(dataframe.index)  is MultiIndex:
@@ -141,3 +170,122 @@ def fischer_transform_dataframe(dataframe):
     :return: Pandas DataFrame of transform
     """
     return dataframe.apply(arctanh)
+
+
+def get_result_schema():
+    """Arrow schema of the denormalised QA results, see
+       database.iterate_result_rows
+
+    :return: pyarrow Schema
+    """
+    import pyarrow
+    return pyarrow.schema([("target", pyarrow.string()),
+                           ("model", pyarrow.string()),
+                           ("server", pyarrow.string()),
+                           ("method", pyarrow.string()),
+                           ("component", pyarrow.int64()),
+                           ("residue", pyarrow.int64()),
+                           ("score", pyarrow.float64()),
+                           ("global", pyarrow.float64())])
+
+
+def get_result_partitioning():
+    """Directory partitioning of exported QA results; target=.../method=...
+
+    :return: pyarrow.dataset Partitioning
+    """
+    import pyarrow
+    from pyarrow.dataset import partitioning
+    return partitioning(pyarrow.schema([("target", pyarrow.string()),
+                                        ("method", pyarrow.string())]),
+                        flavor="hive")
+
+
+def get_partition_directory(directory, target, method):
+    """Directory of a (target, method) partition of exported QA results, with
+       names encoded as pyarrow expects of hive partitions
+
+    :param directory: directory of dataset
+    :param target: text target ID
+    :param method: method name
+    :return: directory path, string
+    """
+    from os import path
+    from urllib.parse import quote
+    return path.join(directory, "target=" + quote(target, safe=""),
+                     "method=" + quote(method, safe=""))
+
+
+def write_parquet_dataset(chunks, directory, rows_per_group=1000000):
+    """Write QA results to Parquet files partitioned by target and method,
+       one chunk at a time; only the partition being read is held open
+
+    :param chunks: iterable of lists of row tuples ordered by target and
+                   method, as generated by database.iterate_result_rows
+    :param directory: output directory of the dataset, existing partitions
+                      written again are replaced
+    :param rows_per_group: maximum number of rows per Parquet row group
+    :return: number of rows written
+    """
+    import pyarrow
+    from os import makedirs, path
+    from pyarrow.parquet import ParquetWriter
+    from shutil import rmtree
+    schema = get_result_schema()
+    # Target and method are stored in the directory names only
+    stored = [(index, field) for (index, field) in enumerate(schema)
+              if field.name not in ("target", "method")]
+    file_schema = pyarrow.schema([field for (index, field) in stored])
+    written = 0
+    partition = None
+    writer = None
+    for chunk in chunks:
+        written += len(chunk)
+        columns = list(zip(*chunk))
+        start = 0
+        for stop in range(1, len(chunk) + 1):
+            if stop < len(chunk) and chunk[stop][0] == chunk[start][0] and \
+                    chunk[stop][3] == chunk[start][3]:
+                continue
+            if (chunk[start][0], chunk[start][3]) != partition:
+                if writer is not None:
+                    writer.close()
+                partition = (chunk[start][0], chunk[start][3])
+                partition_directory = get_partition_directory(directory,
+                                                              *partition)
+                if path.isdir(partition_directory):
+                    rmtree(partition_directory)
+                makedirs(partition_directory)
+                writer = ParquetWriter(
+                    path.join(partition_directory, "part-0.parquet"),
+                    file_schema)
+            writer.write_table(pyarrow.table(
+                [pyarrow.array(columns[index][start:stop], type=field.type)
+                 for (index, field) in stored], schema=file_schema),
+                row_group_size=rows_per_group)
+            start = stop
+    if writer is not None:
+        writer.close()
+    return written
+
+
+def read_parquet_dataset(directory, columns=None, targets=None, methods=None):
+    """Load exported QA results, reading only the requested columns and the
+       partitions of the requested targets and methods
+
+    :param directory: directory of dataset, see write_parquet_dataset
+    :param columns: list of column names, None for all columns
+    :param targets: list of text target ID's, None for all targets
+    :param methods: list of method names, None for all methods
+    :return: Pandas DataFrame
+    """
+    from pyarrow.dataset import dataset, field
+    selection = None
+    for (column, values) in (("target", targets), ("method", methods)):
+        if values is not None:
+            condition = field(column).isin(list(values))
+            selection = condition if selection is None else \
+                selection & condition
+    return dataset(directory, format="parquet",
+                   partitioning=get_result_partitioning()).to_table(
+        columns=columns, filter=selection).to_pandas()
@@ -3,8 +3,10 @@ from re import compile, search
 from operator import itemgetter
 from os import path
 from statistics import mean, StatisticsError
-from subprocess import check_output
-from .targets import get_length
+from subprocess import CalledProcessError, PIPE
+from .targets import load_target_domains
+from ..internal.accounting import run_accounted
+from ..internal.instrument import timed_stage
 import resource
 
 
@@ -18,32 +20,74 @@ def pcons_domain_specifications(casp, target, database, method):
     :return: dictionary with domain ID's as keys containing a full text PCONS
              ignore-file definition
     """
+    return pcons_domain_specifications_all(database, method,
+                                           targets=[target]).get(target, {})
 
-    # Get the length of the target
-    target_length = get_length(target, database, method)
-    ignore_residues = {}
 
-    # For every domain
-    query = "SELECT domain.id, component.num FROM component INNER JOIN domain ON (domain.id = component.domain) WHERE domain.method={} AND component.target='{}';".format(method, target)
-    for (domain,num,) in database.execute(query):
-        # Make an ignore-all template
-        ignore_residues[num] = set([i for i in range(1, target_length + 1)])
-        # Collect all domain residues from all segments
-        domain_residues = set()
-        query = "SELECT start, stop FROM segment WHERE domain={};".format(domain)
-        for (start, stop) in database.execute(query):
-            domain_residues = domain_residues.union(range(start, stop + 1))
-        # Only ignore non-domain residues
-        ignore_residues[num] = ignore_residues[num] - domain_residues
-        # Convert to a writable string
-        ignore_residues[num] = list(ignore_residues[num])
-        ignore_residues[num].sort()
-        ignore_residues[num] = "\n".join(
-            [str(i) for i in ignore_residues[num]])
+def pcons_domain_specifications_all(database, method, targets=None,
+                                    preloaded=None):
+    """Get domain ignore specifications for PCONS of all targets partitioned
+       by a method, reading all domains and segments in a single query
+
+    :param database: sqlite3 connector object to domain definition database
+    :param method: domain partitioning method, integer
+    :param targets: iterable of string target identifiers, default=all targets
+    :param preloaded: target domains and lengths as returned by
+                      load_target_domains, loaded if not given
+    :return: dictionary with target ID's as keys and dictionaries as values,
+             these with domain ID's as keys containing a full text PCONS
+             ignore-file definition
+    """
+    if targets is not None:
+        targets = set(targets)
+
+    # Collect the segments of every domain
+    query = "SELECT component.target, component.num, segment.start, segment.stop FROM component INNER JOIN domain ON (domain.id = component.domain) LEFT JOIN segment ON (segment.domain = domain.id) WHERE domain.method = {} ORDER BY component.target, component.num, segment.start;".format(method)
+    segments = {}
+    for (target, num, start, stop) in database.execute(query):
+        if targets is not None and target not in targets:
+            continue
+        if target not in segments:
+            segments[target] = {}
+        if num not in segments[target]:
+            segments[target][num] = []
+        if start is not None:
+            segments[target][num].append((start, stop))
+
+    # Get the length of the targets
+    if preloaded is None:
+        preloaded = load_target_domains(targets, database, method=method)
+    ignore_residues = {}
+    for target in segments:
+        target_length = preloaded[target]["length"]
+        ignore_residues[target] = {}
+        for num in segments[target]:
+            # Only ignore non-domain residues
+            ignore_residues[target][num] = "\n".join(
+                [str(i) for i in complement_residues(segments[target][num],
+                                                     target_length)])
 
     return ignore_residues
 
 
+def complement_residues(segments, length):
+    """Residues not covered by any segment, using interval arithmetic
+
+    :param segments: list of (start, stop) residue integer tuples, inclusive
+                     and sorted by start
+    :param length: number of residues in target, integer
+    :return: generator of integer residue numbers, in increasing order
+    """
+    residue = 1
+    for (start, stop) in segments:
+        # Yield the gap before this segment
+        for i in range(residue, min(start, length + 1)):
+            yield i
+        residue = max(residue, stop + 1)
+    for i in range(residue, length + 1):
+        yield i
+
+
 def pcons_get_domain_file_name(directory, domain, method=None):
     """Standard naming convention for PCONS domain ignore files
 
@@ -69,7 +113,8 @@ def pcons_get_model_file_name(directory):
     return path.join(directory, "pcons_models.lst")
 
 
-def pcons_write_domain_files(directory, ignore_residues, method=None):
+def pcons_write_domain_files(directory, ignore_residues, method=None,
+                             only_changed=False):
     """Write a pcons domain ignore file
 
     :param directory: target model directory
@@ -77,13 +122,47 @@ def pcons_write_domain_files(directory, ignore_residues, method=None):
                             string lists as values
     :param method: partition method type to append to filename,
                    default=no extension
+    :param only_changed: leave files already holding the same content
+                         untouched, default=always write
+    :return: list of filenames written
     """
 
+    written = []
     for domain in ignore_residues:
-        with open(pcons_get_domain_file_name(directory, domain, method),
-                  'w') as ignore_file:
+        filename = pcons_get_domain_file_name(directory, domain, method)
+        if only_changed and path.isfile(filename):
+            with open(filename, 'r') as ignore_file:
+                if ignore_file.read() == ignore_residues[domain]:
+                    continue
+        with open(filename, 'w') as ignore_file:
             ignore_file.write(ignore_residues[domain])
-            ignore_file.close()
+        written.append(filename)
+    return written
+
+
+def pcons_write_all_domain_files(directories, ignore_residues, method=None,
+                                 only_changed=True):
+    """Write pcons domain ignore files of several targets in one pass
+
+    :param directories: dictionary with target ID's as keys and target model
+                        directories as values
+    :param ignore_residues: dictionary with target ID's as keys and
+                            dictionaries as values, as returned by
+                            pcons_domain_specifications_all
+    :param method: partition method type to append to filename,
+                   default=no extension
+    :param only_changed: leave files already holding the same content
+                         untouched, default=True
+    :return: dictionary with target ID's as keys and lists of filenames
+             written as values
+    """
+    written = {}
+    for target in ignore_residues:
+        if target in directories:
+            written[target] = pcons_write_domain_files(
+                directories[target], ignore_residues[target], method=method,
+                only_changed=only_changed)
+    return written
 
 
 def pcons_write_model_file(directory, models, local=False):
@@ -155,6 +234,7 @@ def read_local_scores(scores):
     return [None if x == "X" else float(x) for x in scores]
 
 
+@timed_stage("parsing", unit="files", count=lambda *args, **kwargs: 1)
 def read_pcons(output, transform_distance=False, d0=3, regex="^\S+_TS\d+"):
     """Reads PCONS output
 
@@ -187,8 +267,9 @@ def read_pcons(output, transform_distance=False, d0=3, regex="^\S+_TS\d+"):
     return (score_global, score_local)
 
 
+@timed_stage("pcons")
 def run_pcons(model_listing_file, total_len=None, d0=3, ignore_file=None,
-              pcons_binary="pcons"):
+              pcons_binary="pcons", usage=None):
     """Run PCONS using subprocess on target model interface w/wo partition
 
     :param model_listing_file: file with paths to model interface, str
@@ -196,6 +277,8 @@ def run_pcons(model_listing_file, total_len=None, d0=3, ignore_file=None,
     :param d0: TM-score parameter, float
     :param ignore_file: PCONS ignore file for domain partitions, str
     :param pcons_binary: PCONS binary path, str
+    :param usage: dictionary to update with the resources used by PCONS and
+                  its command line, see run_accounted; None to not keep them
     :return: PCONs output as a list of strings (one string per line)
     """
 
@@ -209,7 +292,12 @@ def run_pcons(model_listing_file, total_len=None, d0=3, ignore_file=None,
     if ignore_file is not None:
         cmd += ["-ignore_res", ignore_file]
     print("Running: " + " ".join(cmd))
-    output = check_output(cmd)
+    (returncode, output, resources) = run_accounted(cmd, stdout=PIPE)
+    if usage is not None:
+        usage.update(resources)
+        usage["command"] = " ".join(cmd)
+    if returncode != 0:
+        raise CalledProcessError(returncode, cmd, output=output)
     return str(output).split('\\n')
 
 
@@ -1,5 +1,7 @@
-from ..database import get_correlates, get_local_correlates_with_model_id, query_global_correlates, query_global_correlates_proper
-from .pandas import get_dataframe
+from numpy import array, concatenate, zeros
+from ..database import get_correlates, get_global_correlates, get_local_correlates_with_model_id, get_local_score_ranges, get_model_targets, iterate_local_correlates
+from .pandas import get_dataframe, get_tidy_correlations
+from ..internal.calculations import accumulate_histograms, get_bin_edges, grouped_correlation, sample_strata, stream_correlation
 from ..internal.data import remove_residue_column, remove_model_column, collapse_dictionary_to_list_of_tuples
 
 
@@ -49,6 +51,49 @@ def correlate_methods_local_on_models(methods_ids, methods_id2name, database, ta
     return correlates_dict
 
 
+def correlate_methods_local_grouped(methods_ids, methods_id2name, database,
+                                    targets=None, transforms=None, rank=False,
+                                    chunksize=100000):
+    """Correlate method local scores per model and per target, from one long
+       array of all correlates rather than a DataFrame per model
+
+    :param methods_ids: list of method integer identifiers
+    :param methods_id2name: dictionary with method ID as keys and name as values
+    :param database: sqlite3 database connection
+    :param targets: iterable with target text string names, for selection over
+                    subset of targets
+    :param transforms: dictionary with method names as keys and vectorised
+                       functions as values, applied to the scores before
+                       correlating
+    :param rank: if True, Spearman correlation within each model and target,
+                 otherwise Pearson correlation
+    :param chunksize: approximate number of correlates read at a time
+    :return: tuple of tidy pandas dataframes with the correlations of each
+             method pair per model and per target
+    """
+    methods = sorted(list(methods_ids))
+    names = [methods_id2name[method] for method in methods]
+    model_target = get_model_targets(database)
+    models = []
+    values = []
+    for chunk in iterate_local_correlates(database, methods, targets=targets,
+                                          chunksize=chunksize):
+        models += [row[0] for row in chunk]
+        values.append(array([row[2:] for row in chunk], dtype=float))
+    values = concatenate(values) if values else zeros((0, len(names)))
+    if transforms is not None:
+        for (column, transform) in get_column_transforms(names,
+                                                         transforms).items():
+            values[:, column] = transform(values[:, column])
+    per_model = get_tidy_correlations(
+        *grouped_correlation(values, models, rank=rank), names,
+        group_type="model")
+    per_target = get_tidy_correlations(
+        *grouped_correlation(values, [model_target[model] for model in models],
+                             rank=rank), names, group_type="target")
+    return per_model, per_target
+
+
 def correlate_methods_global(methods_ids, methods_id2name, database, targets=None):
     """Get plotting ready Pandas dataframe with method global correlates
 
@@ -61,8 +106,8 @@ def correlate_methods_global(methods_ids, methods_id2name, database, targets=Non
     """
     methods = sorted(list(methods_ids))
     names = [methods_id2name[method] for method in methods]
-    query = query_global_correlates(methods, targets=targets)
-    correlates = remove_model_column(database.execute(query).fetchall())
+    correlates = remove_model_column(
+        get_global_correlates(database, methods, targets=targets))
     return get_dataframe(correlates, names)
 
 
@@ -78,6 +123,170 @@ def correlate_methods_global_proper(methods_ids, methods_id2name, database, targ
     """
     methods = sorted(list(methods_ids))
     names = [methods_id2name[method] for method in methods]
-    query = query_global_correlates_proper(methods, targets=targets)
-    correlates = database.execute(query).fetchall()
-    return get_dataframe(correlates, ["Target", "Model"] + names)
\ No newline at end of file
+    correlates = get_global_correlates(database, methods, targets=targets,
+                                       target_column=True)
+    return get_dataframe(correlates, ["Target", "Model"] + names)
+
+
+def correlation_matrix_local(methods_ids, methods_id2name, database,
+                             targets=None, transforms=None, rank=False,
+                             chunksize=100000):
+    """Correlate method local scores straight from the database, chunk by
+       chunk, without holding all correlates in memory
+
+    :param methods_ids: list of method integer identifiers
+    :param methods_id2name: dictionary with method ID as keys and name as values
+    :param database: sqlite3 database connection
+    :param targets: iterable with target text string names, for selection over
+                    subset of targets
+    :param transforms: dictionary with method names as keys and vectorised
+                       functions as values, applied to the scores before
+                       correlating
+    :param rank: if True, Spearman correlation of the residue ranks within each
+                 model, otherwise Pearson correlation
+    :param chunksize: approximate number of correlates read at a time
+    :return: tuple of pandas dataframes with correlation matrix and number of
+             correlates behind each coefficient
+    """
+    methods = sorted(list(methods_ids))
+    names = [methods_id2name[method] for method in methods]
+    chunks = iterate_local_correlates(database, methods, targets=targets,
+                                      chunksize=chunksize)
+    (matrix, counts) = stream_correlation(
+        chunks, keys=2, group=0,
+        transforms=get_column_transforms(names, transforms), rank=rank)
+    return (get_dataframe(matrix, names).set_axis(names),
+            get_dataframe(counts, names).set_axis(names))
+
+
+def correlation_matrix_global(methods_ids, methods_id2name, database,
+                              targets=None, transforms=None, rank=False):
+    """Correlate method global scores over QA model intersection
+
+    :param methods_ids: list of method integer identifiers
+    :param methods_id2name: dictionary with method ID as keys and name as values
+    :param database: sqlite3 database connection
+    :param targets: iterable with target text string names, for selection over
+                    subset of targets
+    :param transforms: dictionary with method names as keys and vectorised
+                       functions as values, applied to the scores before
+                       correlating
+    :param rank: if True, Spearman correlation, otherwise Pearson correlation
+    :return: tuple of pandas dataframes with correlation matrix and number of
+             models behind each coefficient
+    """
+    methods = sorted(list(methods_ids))
+    names = [methods_id2name[method] for method in methods]
+    correlates = get_global_correlates(database, methods, targets=targets)
+    (matrix, counts) = stream_correlation(
+        [correlates], keys=1,
+        transforms=get_column_transforms(names, transforms), rank=rank)
+    return (get_dataframe(matrix, names).set_axis(names),
+            get_dataframe(counts, names).set_axis(names))
+
+
+def density_methods_local(methods_ids, methods_id2name, database,
+                          targets=None, transforms=None, bins=100, sample=0,
+                          chunksize=100000, seed=None):
+    """Bin method local scores of all method pairs into 2D histograms, chunk by
+       chunk from the database, optionally keeping a subsample for overlay
+
+    :param methods_ids: list of method integer identifiers
+    :param methods_id2name: dictionary with method ID as keys and name as values
+    :param database: sqlite3 database connection
+    :param targets: iterable with target text string names, for selection over
+                    subset of targets
+    :param transforms: dictionary with method names as keys and vectorised
+                       monotonic functions as values, applied to the scores
+    :param bins: number of bins per method
+    :param sample: correlates to sample per target for overlay, 0 for none
+    :param chunksize: approximate number of correlates read at a time
+    :param seed: seed for the subsample, for reproducible figures
+    :return: tuple of histograms (see accumulate_histograms), bin edges, method
+             names and a 2D numpy array with the sampled correlates (or None)
+    """
+    methods = sorted(list(methods_ids))
+    names = [methods_id2name[method] for method in methods]
+    column_transforms = get_column_transforms(names, transforms) or {}
+    # Histogram ranges from the extreme scores, through any transform
+    ranges = get_local_score_ranges(database, methods)
+    limits = []
+    for (column, method) in enumerate(methods):
+        (low, high) = ranges.get(method, (0.0, 1.0))
+        if column in column_transforms:
+            (low, high) = sorted(column_transforms[column](
+                array([low, high], dtype=float)))
+        limits.append((low, high))
+    edges = get_bin_edges(limits, bins=bins)
+
+    model_target = get_model_targets(database) if sample > 0 else None
+    histograms = None
+    sampled = None
+    for chunk in iterate_local_correlates(database, methods, targets=targets,
+                                          chunksize=chunksize):
+        values = array([row[2:] for row in chunk], dtype=float)
+        for column in column_transforms:
+            values[:, column] = column_transforms[column](values[:, column])
+        histograms = accumulate_histograms(values, edges,
+                                           histograms=histograms)
+        if sample > 0:
+            sampled = sample_strata(
+                values, [model_target[row[0]] for row in chunk], sample,
+                sample=sampled, seed=seed)
+    if histograms is None:
+        raise ValueError("No correlates to plot")
+    return histograms, edges, names, \
+        sampled[0] if sampled is not None else None
+
+
+def load_local_correlates_by_target(methods_ids, methods_id2name, database,
+                                    targets=None, transforms=None,
+                                    chunksize=100000):
+    """Read method local scores once and partition them by target
+
+    :param methods_ids: list of method integer identifiers
+    :param methods_id2name: dictionary with method ID as keys and name as values
+    :param database: sqlite3 database connection
+    :param targets: iterable with target text string names, for selection over
+                    subset of targets
+    :param transforms: dictionary with method names as keys and vectorised
+                       functions as values, applied to the scores
+    :param chunksize: approximate number of correlates read at a time
+    :return: tuple of list of method names and dictionary with target
+             identifiers as keys and 2D numpy arrays of local scores, one
+             column per method, as values
+    """
+    methods = sorted(list(methods_ids))
+    names = [methods_id2name[method] for method in methods]
+    model_target = get_model_targets(database)
+    column_transforms = get_column_transforms(names, transforms) or {}
+    partitions = {}
+    for chunk in iterate_local_correlates(database, methods, targets=targets,
+                                          chunksize=chunksize):
+        values = array([row[2:] for row in chunk], dtype=float)
+        for column in column_transforms:
+            values[:, column] = column_transforms[column](values[:, column])
+        # Chunks hold whole models, so split at every change of model
+        models = [row[0] for row in chunk]
+        start = 0
+        for stop in range(1, len(models) + 1):
+            if stop == len(models) or models[stop] != models[start]:
+                target = model_target[models[start]]
+                partitions.setdefault(target, []).append(values[start:stop])
+                start = stop
+    return names, {target: concatenate(partitions[target])
+                   for target in partitions}
+
+
+def get_column_transforms(names, transforms):
+    """Translate transforms by method name into transforms by column index
+
+    :param names: list of method names, in column order
+    :param transforms: dictionary with method names as keys and functions as
+                       values, or None
+    :return: dictionary with column indices as keys and functions as values
+    """
+    if transforms is None:
+        return None
+    return {names.index(name): transforms[name] for name in transforms
+            if name in names}
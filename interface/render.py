@@ -0,0 +1,122 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from os import path
+from time import perf_counter, process_time
+from ..internal.instrument import record_stage
+
+
+def use_agg():
+    """Select the non-interactive Agg backend of matplotlib; run in every
+       rendering process before pyplot draws anything
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+
+
+def get_figure_file_name(directory, target, kind, extension="png"):
+    """Standard naming convention for per target figures
+
+    :param directory: output directory, string
+    :param target: target identifier, string
+    :param kind: kind of figure, e.g. correlation or density, string
+    :param extension: image format extension, string
+    :return: filename and path, string
+    """
+    return path.join(directory, "{}_{}.{}".format(target, kind, extension))
+
+
+def timed_render(function, arguments):
+    """Render and save a figure, timing it
+
+    :param function: module level function drawing and saving one figure
+    :param arguments: tuple of arguments to function
+    :return: tuple of function return value, wall and CPU seconds spent,
+             floats
+    """
+    start = perf_counter()
+    cpu = process_time()
+    result = function(*arguments)
+    return result, perf_counter() - start, process_time() - cpu
+
+
+def render_figures(tasks, workers=1):
+    """Render figures in parallel over a pool of processes, using the Agg
+       backend; each task is pickled to its process, so pass data and not
+       database connections. The time of each figure is recorded as the
+       plotting stage of this process
+
+    :param tasks: dictionary with task labels as keys and tuples of a module
+                  level function and a tuple of its arguments as values
+    :param workers: number of processes to render in
+    :return: generator of tuples of label, function return value and seconds
+             spent on the figure, in order of completion
+    """
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=use_agg) as executor:
+        futures = {executor.submit(timed_render, function, arguments): label
+                   for (label, (function, arguments)) in tasks.items()}
+        for future in as_completed(futures):
+            (result, seconds, cpu) = future.result()
+            record_stage("plotting", seconds, cpu, items=1, unit="figures")
+            yield futures[future], result, seconds
+
+
+def render_target_correlation(outfile, target, values, names, rank=False):
+    """Draw and save the correlation heatmap of one target
+
+    :param outfile: figure filename, string
+    :param target: target identifier, used as title, string
+    :param values: 2D numpy array of local scores, one column per method
+    :param names: list of method names
+    :param rank: if True, Spearman correlation over all residues of the
+                 target, otherwise Pearson correlation
+    :return: figure filename
+    """
+    import matplotlib.pyplot as plt
+    from ..plots import plot_correlates
+    from .pandas import get_dataframe
+    from ..internal.calculations import stream_correlation
+    (matrix, counts) = stream_correlation([values], rank=rank)
+    (f, matrix) = plot_correlates(get_dataframe(matrix, names).set_axis(names),
+                                  matrix=True)
+    f.suptitle(target)
+    f.savefig(outfile)
+    plt.close(f)
+    return outfile
+
+
+def render_target_density(outfile, target, values, names, edges):
+    """Draw and save the method pair densities of one target
+
+    :param outfile: figure filename, string
+    :param target: target identifier, used as title, string
+    :param values: 2D numpy array of local scores, one column per method
+    :param names: list of method names
+    :param edges: list of numpy arrays with bin edges, one per method; share
+                  them between targets to make figures comparable
+    :return: figure filename
+    """
+    import matplotlib.pyplot as plt
+    from ..plots import plot_density
+    from ..internal.calculations import accumulate_histograms
+    f = plot_density(accumulate_histograms(values, edges), edges, names)
+    f.suptitle(target)
+    f.savefig(outfile)
+    plt.close(f)
+    return outfile
+
+
+def render_partition_hexbin(outfile, a, b):
+    """Draw and save the hexagonal distribution of a pair of domain
+       properties over the targets of an experiment
+
+    :param outfile: figure filename, string
+    :param a: list of values of the largest domain, one per target
+    :param b: list of values of the second largest domain, one per target
+    :return: figure filename
+    """
+    import matplotlib.pyplot as plt
+    from ..plots import plot_seaborn_hexbin
+    plot = plot_seaborn_hexbin(a, b)
+    plot.savefig(outfile)
+    plt.close(plot.fig)
+    return outfile
@@ -0,0 +1,122 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from heapq import heapify, heapreplace
+from time import perf_counter
+
+
+def estimate_cost(models, length, domains=1):
+    """Estimate the cost of scoring a target by consensus; every model is
+       compared with every other, over the whole target, once per domain.
+       The wall time of runs is fitted in this form, see
+       database.get_run_scaling
+
+    :param models: number of models, integer
+    :param length: target length, integer (None if unknown)
+    :param domains: number of domains run separately, integer
+    :return: cost in arbitrary units, float
+    """
+    if length is None:
+        length = 1
+    return float(max(domains, 1) * models * models * length)
+
+
+def fit_cost_scale(estimates, history):
+    """Seconds per cost unit, from targets with both an estimate and a
+       measured time (a ratio estimate, weighing large targets the most)
+
+    :param estimates: dictionary with targets as keys and estimated costs
+    :param history: dictionary with targets as keys and measured seconds, see
+                    database.get_target_run_times
+    :return: float, None if no target has both
+    """
+    common = [target for target in estimates
+              if target in history and estimates[target] > 0]
+    if not common:
+        return None
+    return sum([history[target] for target in common]) / \
+        sum([estimates[target] for target in common])
+
+
+def predict_costs(estimates, history, scale=None):
+    """Predict the seconds each target takes, using its measured time if it
+       has been run before and the scaled estimate otherwise
+
+    :param estimates: dictionary with targets as keys and estimated costs
+    :param history: dictionary with targets as keys and measured seconds
+    :param scale: seconds per cost unit, float, e.g. fitted over all runs of
+                  the tool by database.get_run_scaling; None to fit it to the
+                  targets in history, see fit_cost_scale
+    :return: tuple with dictionary of targets and predicted seconds (None if
+             there is no history to scale the estimates with), and the scale
+    """
+    if scale is None:
+        scale = fit_cost_scale(estimates, history)
+    predicted = {}
+    for target in estimates:
+        if target in history:
+            predicted[target] = history[target]
+        elif scale is not None:
+            predicted[target] = estimates[target] * scale
+        else:
+            predicted[target] = None
+    return predicted, scale
+
+
+def order_longest_first(costs):
+    """Order targets by decreasing cost, for longest processing time first
+       scheduling; targets without a cost last, ties in name order
+
+    :param costs: dictionary with targets as keys and costs as values
+    :return: list of targets
+    """
+    return sorted(costs, key=lambda target: (
+        costs[target] is None, -(costs[target] or 0.0), target))
+
+
+def simulate_makespan(order, costs, workers=1):
+    """Time until the last of the targets is done, when each is dispatched in
+       order to the first free worker
+
+    :param order: list of targets
+    :param costs: dictionary with targets as keys and seconds as values
+    :param workers: number of concurrent workers, integer
+    :return: makespan, float
+    """
+    finish = [0.0] * max(workers, 1)
+    heapify(finish)
+    for target in order:
+        heapreplace(finish, finish[0] + costs[target])
+    return max(finish)
+
+
+def run_longest_first(order, function, workers=1):
+    """Run a function on each target over a pool of threads, dispatching the
+       targets in order as workers become free; the function should spend its
+       time outside of Python (e.g. in subprocesses) to gain from threads
+
+    :param order: list of targets, e.g. from order_longest_first
+    :param function: function of one target
+    :param workers: number of concurrent workers, integer
+    :return: generator of tuples with target, return value of function and
+             seconds it took, in order of completion
+    """
+    def timed(target):
+        start = perf_counter()
+        value = function(target)
+        return value, perf_counter() - start
+
+    remaining = list(reversed(order))
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        running = {}
+        try:
+            while remaining or running:
+                while remaining and len(running) < max(workers, 1):
+                    target = remaining.pop()
+                    running[pool.submit(timed, target)] = target
+                (finished, _) = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    target = running.pop(future)
+                    (value, seconds) = future.result()
+                    yield target, value, seconds
+        finally:
+            # Abandoned, e.g. on an exception; do not start any more targets
+            remaining.clear()
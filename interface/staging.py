@@ -0,0 +1,208 @@
+from contextlib import contextmanager
+from glob import glob
+from os import getpid, kill, listdir, path
+from socket import gethostname
+from shutil import copyfile, disk_usage, rmtree
+from tempfile import mkdtemp
+from threading import Lock
+
+
+# Prefix of staging directories in scratch; followed by the process ID, so
+# that directories left by crashed processes can be told apart
+staging_prefix = "casp12_stage_"
+
+# File in each staging directory naming the host, boot and process (ID and
+# start time) owning it; a process ID alone may be reused after a reboot or
+# be that of a process on another node sharing scratch
+staging_owner = ".casp12_stage_owner"
+
+# Bytes reserved by the staging directories of this process, by directory;
+# guarded by staging_lock, as targets may be staged by several threads
+staging_reserved = {}
+staging_lock = Lock()
+
+
+def get_boot_id():
+    """Identifier of the current boot of this host, from Linux /proc
+
+    :return: string, None if unknown
+    """
+    try:
+        with open("/proc/sys/kernel/random/boot_id", 'r') as infile:
+            return infile.read().strip()
+    except OSError:
+        return None
+
+
+def get_process_start(pid):
+    """Start time of a process, in clock ticks after boot, from Linux /proc
+
+    :param pid: process ID, integer
+    :return: string, None if unknown or not running
+    """
+    try:
+        with open("/proc/{}/stat".format(pid), 'r') as infile:
+            # The command name may hold spaces, so count fields after it
+            return infile.read().rsplit(")", 1)[1].split()[19]
+    except (OSError, IndexError):
+        return None
+
+
+def is_process_running(pid):
+    """Whether a process ID is in use on this host
+
+    :param pid: process ID, integer
+    :return: boolean
+    """
+    try:
+        kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Running, as another user
+        pass
+    return True
+
+
+def write_stage_owner(directory):
+    """Record this host, boot and process as the owner of a staging directory
+
+    :param directory: staging directory, string
+    """
+    pid = getpid()
+    with open(path.join(directory, staging_owner), 'w') as outfile:
+        outfile.write("{}\t{}\t{}\t{}\n".format(
+            gethostname(), get_boot_id() or "-", pid,
+            get_process_start(pid) or "-"))
+
+
+def is_stale_stage(directory):
+    """Whether a staging directory was left by a process no longer running,
+       e.g. after a crash or reboot; directories of other hosts are not, as
+       their processes can not be checked from here
+
+    :param directory: staging directory, string
+    :return: boolean
+    """
+    try:
+        with open(path.join(directory, staging_owner), 'r') as infile:
+            (host, boot, pid, start) = infile.read().split()
+    except (OSError, ValueError):
+        # Not recorded yet, or by an older version; by the name only
+        (host, boot, start) = (gethostname(), "-", "-")
+        pid = path.basename(directory)[len(staging_prefix):].split("_")[0]
+    try:
+        pid = int(pid)
+    except ValueError:
+        return False
+    if host != gethostname():
+        return False
+    if boot != "-" and boot != (get_boot_id() or boot):
+        return True
+    if not is_process_running(pid):
+        return True
+    # A process ID reused by another process since
+    return start != "-" and start != (get_process_start(pid) or start)
+
+
+def get_directory_size(directory):
+    """Total size of the files in a directory, not recursing
+
+    :param directory: directory path, string
+    :return: bytes, integer
+    """
+    size = 0
+    for filename in listdir(directory):
+        filename = path.join(directory, filename)
+        if path.isfile(filename):
+            size += path.getsize(filename)
+    return size
+
+
+def get_staged_size(scratch):
+    """Space used by staging directories in scratch, by any process
+
+    :param scratch: scratch directory, string
+    :return: bytes, integer
+    """
+    size = 0
+    for directory in glob(path.join(scratch, staging_prefix + "*")):
+        if directory in staging_reserved:
+            size += staging_reserved[directory]
+        elif path.isdir(directory):
+            size += get_directory_size(directory)
+    return size
+
+
+def remove_stale_stages(scratch):
+    """Remove the staging directories of processes no longer running on this
+       node, e.g. after a crash, see is_stale_stage
+
+    :param scratch: scratch directory, string
+    :return: list of directories removed
+    """
+    removed = []
+    for directory in glob(path.join(scratch, staging_prefix + "*")):
+        if not path.isdir(directory) or not is_stale_stage(directory):
+            continue
+        rmtree(directory, ignore_errors=True)
+        removed.append(directory)
+    return removed
+
+
+def stage_models(models, directory):
+    """Copy model files into a directory, keeping their file names
+
+    :param models: dictionary with model ID's as keys and model pathways as
+                   values
+    :param directory: destination directory, string
+    :return: dictionary with the same keys and pathways of the copies
+    """
+    staged = {}
+    for model in models:
+        staged[model] = path.join(directory, path.basename(models[model]))
+        copyfile(models[model], staged[model])
+    return staged
+
+
+@contextmanager
+def staged_models(directory, models, scratch=None, limit=None):
+    """Stage model files in scratch (node-local disk or tmpfs) for the
+       duration of a with block, so that every run on them reads local copies;
+       the copies are removed after the block. Models that would not fit in
+       the free space of scratch, or within limit, are used where they are
+
+    :param directory: target directory, string
+    :param models: dictionary with model ID's as keys and model pathways as
+                   values
+    :param scratch: scratch directory, string; None to not stage
+    :param limit: bytes all staging directories in scratch may use together,
+                  integer; None for no limit but the free space
+    :return: context manager, yielding a tuple with the directory to write
+             model lists etc. to (the staging directory, or the target
+             directory if not staged) and the models dictionary to use
+    """
+    if scratch is None:
+        yield directory, models
+        return
+    size = sum([path.getsize(models[model]) for model in models])
+    with staging_lock:
+        free = disk_usage(scratch).free
+        fits = size < free and \
+            (limit is None or get_staged_size(scratch) + size <= limit)
+        if fits:
+            staging = mkdtemp(prefix="{}{}_".format(staging_prefix, getpid()),
+                              dir=scratch)
+            write_stage_owner(staging)
+            staging_reserved[staging] = size
+    if not fits:
+        print("Not staging {} : {:.1f} MB of models do not fit in {}".format(
+            directory, size / 1e6, scratch))
+        yield directory, models
+        return
+    try:
+        yield staging, stage_models(models, staging)
+    finally:
+        rmtree(staging, ignore_errors=True)
+        with staging_lock:
+            del staging_reserved[staging]
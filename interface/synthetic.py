@@ -0,0 +1,438 @@
+from math import cos, exp, sin, sqrt
+from os import makedirs, path
+from random import Random
+from ..database import get_or_add_method, store_caspservers, store_domains, \
+    store_models, store_qa
+from .pcons import d2S, global_score
+
+
+# Scale of a synthetic dataset, per preset; length is the (shortest, longest)
+# target sequence
+synthetic_scales = {
+    "small": {"targets": 2, "servers": 5, "models": 2, "qa_servers": 2,
+              "length": (60, 120)},
+    "medium": {"targets": 5, "servers": 20, "models": 5, "qa_servers": 3,
+               "length": (100, 300)},
+    "large": {"targets": 10, "servers": 40, "models": 5, "qa_servers": 5,
+              "length": (200, 600)}}
+
+# CASP server ID's of QA servers start here, after the structure servers
+qa_server_offset = 400
+
+
+def get_server_name(server):
+    """Name of a synthetic structure prediction server
+
+    :param server: integer CASP server ID
+    :return: text server name
+    """
+    return "server{:03d}".format(server)
+
+
+def get_qa_server_name(server):
+    """Name of a synthetic QA server
+
+    :param server: integer CASP server ID
+    :return: text server name
+    """
+    return "qaserver{:03d}".format(server)
+
+
+def get_casp_model_name(target, server, model):
+    """CASP style model identifier, e.g. T0859TS001_1
+
+    :param target: text target ID
+    :param server: integer CASP server ID
+    :param model: integer model serial
+    :return: text model identifier
+    """
+    return "{}TS{:03d}_{}".format(target, server, model)
+
+
+def get_pcons_model_name(server, model):
+    """PCONS style model filename, e.g. server001_TS1.pdb
+
+    :param server: integer CASP server ID
+    :param model: integer model serial
+    :return: text model filename
+    """
+    return "{}_TS{}.pdb".format(get_server_name(server), model)
+
+
+def synthesize_domains(random, length):
+    """Partition a target into one to three domains of similar size; with
+       three, the first domain is discontinuous around the second
+
+    :param random: random.Random object
+    :param length: number of residues in target
+    :return: list of domains, each a list of (start, stop) segment tuples
+    """
+    count = random.choice([1, 1, 2, 2, 3]) if length >= 60 else 1
+    share = length // count
+    cuts = [i * share + random.randint(-share // 4, share // 4)
+            for i in range(1, count)]
+    bounds = [1] + [cut + 1 for cut in cuts] + [length + 1]
+    segments = [(bounds[i], bounds[i + 1] - 1) for i in range(count)]
+    if count == 3:
+        return [[segments[0], segments[2]], [segments[1]]]
+    return [[segment] for segment in segments]
+
+
+def synthesize_distances(random, length, quality, missing=0.05):
+    """Local distances of a model to the native structure; better models are
+       closer, and errors come in stretches, as misplaced loops do
+
+    :param random: random.Random object
+    :param length: number of residues in target
+    :param quality: model quality between 0 (poor) and 1 (native like)
+    :param missing: fraction of residues not modelled
+    :return: list of float distances (Å), None for residues not modelled
+    """
+    distances = []
+    error = 0.0
+    for residue in range(length):
+        # Smoothed error, so that neighbouring residues are alike
+        error = 0.8 * error + 0.2 * random.gauss(0.0, 1.0)
+        if random.random() < missing:
+            distances.append(None)
+            continue
+        distances.append(round(min(30.0, exp(
+            random.gauss(2.5 * (1.0 - quality), 0.4) + 2.0 * error)), 3))
+    return distances
+
+
+def synthesize_prediction(random, distances, accuracy):
+    """A QA server prediction of local distances, the true distances with
+       noise
+
+    :param random: random.Random object
+    :param distances: list of float distances, None where not modelled
+    :param accuracy: between 0 (noise) and 1 (exact)
+    :return: list of float distances, None where not predicted
+    """
+    return [None if distance is None else
+            round(max(0.1, distance * exp(random.gauss(0.0, 1.5 * (1.0 - accuracy)))), 3)
+            for distance in distances]
+
+
+def synthesize_target(random, servers=20, models=5, qa_servers=3,
+                      length=(100, 300)):
+    """Generate the models and assessments of one target
+
+    :param random: random.Random object
+    :param servers: number of structure prediction servers
+    :param models: number of models per server
+    :param qa_servers: number of QA servers
+    :param length: tuple of shortest and longest target length
+    :return: dictionary with target length, domains (see synthesize_domains),
+             models (dictionary with (server, model) tuples as keys and lists
+             of true distances as values) and qa (dictionary with QA server
+             ID's as keys and dictionaries as values, these with (server,
+             model) keys and predicted distances as values)
+    """
+    residues = random.randint(*length)
+    dataset = {"length": residues,
+               "domains": synthesize_domains(random, residues),
+               "models": {}, "qa": {}}
+    for server in range(1, servers + 1):
+        skill = random.betavariate(4, 2)
+        for model in range(1, models + 1):
+            quality = min(1.0, max(0.0, skill + random.gauss(0.0, 0.1)))
+            dataset["models"][(server, model)] = synthesize_distances(
+                random, residues, quality)
+    for qa_server in range(qa_server_offset + 1,
+                           qa_server_offset + qa_servers + 1):
+        accuracy = random.uniform(0.3, 0.9)
+        dataset["qa"][qa_server] = {
+            key: synthesize_prediction(random, distances, accuracy)
+            for (key, distances) in dataset["models"].items()}
+    return dataset
+
+
+def synthesize_dataset(targets=5, servers=20, models=5, qa_servers=3,
+                       length=(100, 300), seed=0, first=850):
+    """Generate a synthetic CASP dataset; the same arguments always give the
+       same dataset
+
+    :param targets: number of targets
+    :param servers: number of structure prediction servers
+    :param models: number of models per server and target
+    :param qa_servers: number of QA servers
+    :param length: tuple of shortest and longest target length
+    :param seed: random seed
+    :param first: number of first target, T0850 by default
+    :return: dictionary with text target ID's as keys and target datasets
+             as values, see synthesize_target
+    """
+    random = Random(seed)
+    return {"T{:04d}".format(number): synthesize_target(
+                random, servers=servers, models=models, qa_servers=qa_servers,
+                length=length)
+            for number in range(first, first + targets)}
+
+
+def synthesize_trace(random, length):
+    """CA trace of a model, a random walk with 3.8 Å steps
+
+    :param random: random.Random object
+    :param length: number of residues
+    :return: list of (x, y, z) coordinate tuples, one per residue
+    """
+    trace = []
+    (x, y, z) = (0.0, 0.0, 0.0)
+    for residue in range(length):
+        (theta, phi) = (random.uniform(0, 3.1416), random.uniform(0, 6.2832))
+        x += 3.8 * sin(theta) * cos(phi)
+        y += 3.8 * sin(theta) * sin(phi)
+        z += 3.8 * cos(theta)
+        trace.append((x, y, z))
+    return trace
+
+
+def format_model_pdb(trace):
+    """CA trace of a model as PDB ATOM records
+
+    :param trace: list of (x, y, z) coordinate tuples, one per residue
+    :return: list of text lines
+    """
+    lines = ["ATOM  {:5d}  CA  ALA A{:4d}    {:8.3f}{:8.3f}{:8.3f}  1.00  0.00           C".format(
+                 residue, residue, x, y, z)
+             for (residue, (x, y, z)) in enumerate(trace, start=1)]
+    lines += ["TER", "END"]
+    return lines
+
+
+def format_pcons_output(distances):
+    """PCONS style output lines, as read by pcons.read_pcons
+
+    :param distances: dictionary with model names as keys and lists of local
+                      distances (None where missing) as values
+    :return: list of text lines
+    """
+    lines = []
+    for (name, local) in distances.items():
+        scored = global_score(local)
+        lines.append("{} {} {}".format(
+            name, "X" if scored is None else "{:.3f}".format(scored),
+            " ".join(["X" if value is None else "{:.3f}".format(value)
+                      for value in local])))
+    return lines
+
+
+def format_lga_sda(target, name, distances):
+    """LGA sequence dependent analysis of one model, as read by
+       casp.parse_lga_sda
+
+    :param target: text target ID
+    :param name: text CASP model identifier
+    :param distances: list of float distances, None where not aligned
+    :return: list of text lines
+    """
+    aligned = len([distance for distance in distances if distance is not None])
+    lines = ["# Molecule1: number of CA atoms {:5d} ( {:5d}),  selected {:5d} , name {}".format(
+                 len(distances), len(distances) * 8, aligned, name),
+             "# Molecule2: number of CA atoms {:5d} ( {:5d}),  selected {:5d} , name {}_D0.pdb".format(
+                 len(distances), len(distances) * 8, aligned, target),
+             "#      Molecule1      Molecule2  DISTANCE    Mis    MC     All    Dist_max   GDC_mc  GDC_all  Dist_at"]
+    for (residue, distance) in enumerate(distances, start=1):
+        if distance is None:
+            continue
+        lines.append("LGA    A     {0:4d}      A     {0:4d}     {1:6.3f}     0    {2:d}    {2:d}    {3:6.3f}    {4:5.2f}   {4:5.2f}    {3:6.3f}".format(
+            residue, distance, int(distance < 4.0), distance,
+            100.0 * d2S([distance])[0]))
+    return lines
+
+
+def format_lga_sda_summary(target, models):
+    """LGA summary of all models of a target, as read by
+       casp.parse_lga_sda_summary
+
+    :param target: text target ID
+    :param models: dictionary with text CASP model identifiers as keys and
+                   lists of float distances as values
+    :return: list of text lines
+    """
+    lines = []
+    for (name, distances) in models.items():
+        aligned = [distance for distance in distances if distance is not None]
+        rmsd = sqrt(sum([distance ** 2 for distance in aligned]) /
+                    len(aligned)) if aligned else 0.0
+        close = len([distance for distance in aligned if distance < 4.0])
+        gdt = 100.0 * sum(d2S(aligned)) / len(distances)
+        lines.append("{}.lga:SUMMARY(GDT) {:4d} {:4d}    4.0   {:4d}  {:6.2f}  {:8.3f}  {:8.3f}  {:7.3f}".format(
+            name, len(distances), len(distances), close, rmsd, gdt, gdt,
+            close / len(distances)))
+    return lines
+
+
+def format_lga_lddt(name, distances):
+    """Local LDDT of one model, as read by casp.parse_lga_lddt
+
+    :param name: text CASP model identifier
+    :param distances: list of float distances, None where not modelled
+    :return: list of text lines
+    """
+    scores = d2S(distances, d0=2)
+    scored = [score for score in scores if score is not None]
+    lines = ["File: models/{}".format(name),
+             "Global LDDT score: {:.4f}".format(
+                 sum(scored) / len(scored) if scored else 0.0),
+             "Local LDDT Score:",
+             "Chain ResName ResNum Asses.Flag Quality Score (Conserved/Total)"]
+    for (residue, score) in enumerate(scores, start=1):
+        lines.append("A ALA {} Yes {} {} {}".format(
+            residue, "-" if score is None else "+",
+            "-" if score is None else "{:.4f}".format(score),
+            "(0/0)" if score is None else "({0}/{0})".format(
+                int(20 * score))))
+    return lines
+
+
+def format_qa_qmode2(target, qa_server, predictions):
+    """QA server prediction in QMODE 2 format (global and local distances),
+       as read by casp.process_casp_qa
+
+    :param target: text target ID
+    :param qa_server: integer CASP QA server ID
+    :param predictions: dictionary with text CASP model identifiers as keys
+                        and lists of float distances as values
+    :return: list of text lines
+    """
+    lines = ["PFRMAT QA", "TARGET {}".format(target),
+             "AUTHOR {}".format(get_qa_server_name(qa_server)),
+             "METHOD Synthetic", "MODEL 1", "QMODE 2"]
+    lines += format_pcons_output(
+        {name: d2S(distances) for (name, distances) in predictions.items()})
+    lines.append("END")
+    return lines
+
+
+def write_lines(filename, lines):
+    """Write text lines to a file
+
+    :param filename: file to write, overwritten
+    :param lines: iterable of text lines
+    :return: filename
+    """
+    with open(filename, 'w') as outfile:
+        for line in lines:
+            outfile.write(line + "\n")
+    return filename
+
+
+def write_synthetic_dataset(directory, dataset, casp=12, seed=0, pdb=True):
+    """Write a synthetic dataset in the layouts the parsers expect:
+       CASP<casp>/<target>/<server>_TS<model>.pdb for the PCONS drivers,
+       domains/<target>/part.txt for casp12_analyze_partition_distrib,
+       lga_sda/, lga_lddt/ and qa/ for the casp12_parse_* scripts
+
+    :param directory: output directory, created if missing
+    :param dataset: dictionary of target datasets, see synthesize_dataset
+    :param casp: integer CASP experiment
+    :param seed: random seed for the model coordinates
+    :param pdb: if False, skip writing model coordinates
+    :return: dictionary with kind of file as keys and number written as values
+    """
+    random = Random(seed)
+    written = {"pdb": 0, "domains": 0, "lga": 0, "summary": 0, "lddt": 0,
+               "qa": 0}
+    directories = {kind: path.join(directory, kind)
+                   for kind in ("domains", "lga_sda", "lga_lddt", "qa")}
+    for kind in directories:
+        makedirs(directories[kind], exist_ok=True)
+    for (target, data) in dataset.items():
+        targetdir = path.join(directory, "CASP{}".format(casp), target)
+        makedirs(targetdir, exist_ok=True)
+        makedirs(path.join(directories["domains"], target), exist_ok=True)
+        write_lines(path.join(directories["domains"], target, "part.txt"),
+                    [" ".join(["{} {}".format(*segment) for segment in domain])
+                     for domain in data["domains"]])
+        written["domains"] += 1
+        names = {key: get_casp_model_name(target, *key)
+                 for key in data["models"]}
+        for (key, distances) in data["models"].items():
+            if pdb:
+                write_lines(path.join(targetdir, get_pcons_model_name(*key)),
+                            format_model_pdb(synthesize_trace(
+                                random, data["length"])))
+                written["pdb"] += 1
+            write_lines(path.join(directories["lga_sda"], names[key] + ".lga"),
+                        format_lga_sda(target, names[key], distances))
+            write_lines(path.join(directories["lga_lddt"],
+                                  names[key] + ".lddt"),
+                        format_lga_lddt(names[key], distances))
+            written["lga"] += 1
+            written["lddt"] += 1
+        write_lines(path.join(directories["lga_sda"],
+                              target + ".SUMMARY.lga_sda.txt"),
+                    format_lga_sda_summary(target, {
+                        names[key]: distances
+                        for (key, distances) in data["models"].items()}))
+        written["summary"] += 1
+        for (qa_server, predictions) in data["qa"].items():
+            write_lines(path.join(directories["qa"], "{}QA{:03d}_1".format(
+                target, qa_server)), format_qa_qmode2(target, qa_server, {
+                    names[key]: distances
+                    for (key, distances) in predictions.items()}))
+            written["qa"] += 1
+    return written
+
+
+def get_casp_servers(dataset):
+    """CASP server definitions of a synthetic dataset, as parsed from the
+       CASP server listing
+
+    :param dataset: dictionary of target datasets, see synthesize_dataset
+    :return: dictionary with integer CASP server ID's as keys and tuples of
+             server name and type as values
+    """
+    servers = {}
+    for data in dataset.values():
+        for (server, model) in data["models"]:
+            servers[server] = (get_server_name(server), "server")
+        for qa_server in data["qa"]:
+            servers[qa_server] = (get_qa_server_name(qa_server), "qa")
+    return servers
+
+
+def store_synthetic_dataset(dataset, database, casp=12):
+    """Populate a result database with a synthetic dataset, as the parsers
+       would: targets, domains, servers, models, the LGA_SDA distances and the
+       predictions of each QA server as QA methods
+
+    :param dataset: dictionary of target datasets, see synthesize_dataset
+    :param database: sqlite3 connection to a result database
+    :param casp: integer CASP experiment
+    :return: dictionary with method names as keys and integer method ID's as
+             values
+    """
+    partitioner = get_or_add_method("Synthetic", "Synthetic domain partitions",
+                                    "partitioner", database)
+    store_domains({target: data["domains"] for (target, data)
+                   in dataset.items()}, database, partitioner, casp=casp)
+    database.executemany("UPDATE target SET len = ? WHERE id = ?;",
+                         [(data["length"], target)
+                          for (target, data) in dataset.items()])
+    methods = {"Synthetic": partitioner}
+    methods["CASP{}_LGA_SDA".format(casp)] = get_or_add_method(
+        "CASP{}_LGA_SDA".format(casp),
+        "CASP{} LGA_SDA measure added by casp12_parse_lga_sda.py".format(casp),
+        "qa", database)
+    casp_servers = get_casp_servers(dataset)
+    for (server, (name, kind)) in casp_servers.items():
+        methods[name] = get_or_add_method(name, "", kind, database)
+    store_caspservers(casp_servers, casp, database)
+    for (target, data) in dataset.items():
+        servers = {}
+        for (server, model) in data["models"]:
+            servers.setdefault(get_server_name(server), []).append(model)
+        model_id = store_models(target, servers, methods, database)
+        for ((server, model), distances) in data["models"].items():
+            thisid = model_id[(get_server_name(server), model)]
+            store_qa(thisid, global_score(d2S(distances)) or 0.0, distances,
+                     methods["CASP{}_LGA_SDA".format(casp)], database)
+            for (qa_server, predictions) in data["qa"].items():
+                local = d2S(predictions[(server, model)])
+                store_qa(thisid, global_score(local) or 0.0, local,
+                         methods[get_qa_server_name(qa_server)], database)
+    return methods
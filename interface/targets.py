@@ -2,8 +2,11 @@ from os import listdir, path
 from re import compile
 from sqlite3 import connect
 from ..definitions import method_type
+from ..internal.instrument import timed_stage
 
 
+@timed_stage("discovery", unit="paths",
+             count=lambda found, *args, **kwargs: len(found))
 def find_targets(directory, regex="T\d{4}"):
     """Search for CASP targets in specified directory
 
@@ -21,6 +24,8 @@ def find_targets(directory, regex="T\d{4}"):
     return targets
 
 
+@timed_stage("discovery", unit="paths",
+             count=lambda found, *args, **kwargs: len(found))
 def find_models(directory, regexes=["\S+_TS\d+\.pdb\Z", "\S+_TS\d+\Z"]):
     """ Find models in target directory using a list of regexes
 
@@ -100,12 +105,9 @@ def get_domains(targets, method, database):
     :return: dictionary with target ID's as keys and a tuple of lists of domain
              ID's and values
     """
-    domains = {}
-
-    for target in targets:
-        domains[target] = get_domain(target, method, database)
-
-    return domains
+    preloaded = load_target_domains(targets, database, method=method)
+    return {target: (preloaded[target]["components"],
+                     preloaded[target]["domains"]) for target in targets}
 
 
 def get_domain(target, method, database):
@@ -120,11 +122,74 @@ def get_domain(target, method, database):
 
     # For every domain
     query = "SELECT component.num, component.domain FROM component INNER JOIN domain ON component.domain = domain.id WHERE component.target = '{}' AND domain.method = {} ORDER BY component.num;".format(target, method)
-    print(query)
     components, domains = zip(*database.execute(query))
     return (list(components), list(domains))
 
 
+def load_target_domains(targets, database, method=None):
+    """Preload domains, components and lengths of a set of targets, using one
+       query for all targets' lengths and one for all of their domains
+
+    :param targets: iterable of target identifiers (strings), None for all
+                    targets in database
+    :param database: sqlite3 connector object to domain definition database
+    :param method: domain partitioning method, integer; if None the first
+                   partitioner stored in database is used (as get_length)
+    :return: dictionary with target ID's as keys and dictionaries as values,
+             holding
+             "length": target length, integer (summed domain lengths if the
+                       target length is missing; None if neither is known)
+             "components": list of component numberings, integers
+             "domains": list of domain identifiers, integers
+             "component_ids": list of component row identifiers, integers
+    """
+    # Get first listed partitioner method stored in database, if not specified
+    # by user
+    if method is None:
+        query = 'SELECT id FROM method WHERE type = {} LIMIT 1'.format(method_type["partitioner"])
+        found = database.execute(query).fetchone()
+        if found is not None:
+            method = found[0]
+
+    preloaded = {}
+    if targets is not None:
+        for target in targets:
+            preloaded[target] = {"length": None, "components": [],
+                                 "domains": [], "component_ids": []}
+
+    def get_entry(target):
+        if target not in preloaded:
+            if targets is not None:
+                return None
+            preloaded[target] = {"length": None, "components": [],
+                                 "domains": [], "component_ids": []}
+        return preloaded[target]
+
+    for (target, length) in database.execute("SELECT id, len FROM target;"):
+        entry = get_entry(target)
+        if entry is not None:
+            entry["length"] = length
+
+    if method is not None:
+        query = "SELECT component.target, component.num, component.domain, component.id, SUM(segment.len) FROM component INNER JOIN domain ON (component.domain = domain.id) LEFT JOIN segment ON (segment.domain = domain.id) WHERE domain.method = {} GROUP BY component.id ORDER BY component.target, component.num;".format(method)
+        domain_lengths = {}
+        for (target, num, domain, component, dlen) in database.execute(query):
+            entry = get_entry(target)
+            if entry is None:
+                continue
+            entry["components"].append(num)
+            entry["domains"].append(domain)
+            entry["component_ids"].append(component)
+            if dlen is not None:
+                domain_lengths[target] = domain_lengths.get(target, 0) + dlen
+        # Sum domain lengths if target length not specified
+        for target in domain_lengths:
+            if preloaded[target]["length"] is None:
+                preloaded[target]["length"] = domain_lengths[target]
+
+    return preloaded
+
+
 def get_domain_number(target, domain, database):
     """Get domain numberings for a domain if it is present in target
 
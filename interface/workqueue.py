@@ -0,0 +1,258 @@
+from os import close, getpid, link, open as os_open, path, remove, rename, \
+    utime, write, O_CREAT, O_EXCL, O_WRONLY, makedirs, stat
+from socket import gethostname
+from threading import Event, Thread
+from time import sleep
+
+
+def get_worker_id():
+    """Identify this worker uniquely across all nodes sharing a queue
+
+    :return: string with hostname and process ID
+    """
+    return "{}.{}".format(gethostname(), getpid())
+
+
+def get_lease_file_name(queuedir, item):
+    """Standard naming convention for work queue lease files
+
+    :param queuedir: shared queue directory, string
+    :param item: queue item, i.e. target identifier, string
+    :return: filename and path, string
+    """
+    return path.join(queuedir, "{}.lease".format(item))
+
+
+def get_done_file_name(queuedir, item):
+    """Standard naming convention for work queue completion markers
+
+    :param queuedir: shared queue directory, string
+    :param item: queue item, i.e. target identifier, string
+    :return: filename and path, string
+    """
+    return path.join(queuedir, "{}.done".format(item))
+
+
+def get_failed_file_name(queuedir, item):
+    """Standard naming convention for work queue failure markers
+
+    :param queuedir: shared queue directory, string
+    :param item: queue item, i.e. target identifier, string
+    :return: filename and path, string
+    """
+    return path.join(queuedir, "{}.failed".format(item))
+
+
+def queue_time(queuedir, worker):
+    """Current time as seen by the file server holding the queue, so that
+       lease expiry is unaffected by clock skew between nodes
+
+    :param queuedir: shared queue directory, string
+    :param worker: worker identifier, string
+    :return: epoch time, float
+    """
+    clock = path.join(queuedir, ".clock.{}".format(worker))
+    with open(clock, 'w'):
+        pass
+    now = stat(clock).st_mtime
+    remove(clock)
+    return now
+
+
+def is_done(queuedir, item):
+    """Check if a queue item has been completed by any worker
+
+    :param queuedir: shared queue directory, string
+    :param item: queue item, string
+    :return: boolean
+    """
+    return path.exists(get_done_file_name(queuedir, item))
+
+
+def is_failed(queuedir, item):
+    """Check if a queue item has failed for any worker
+
+    :param queuedir: shared queue directory, string
+    :param item: queue item, string
+    :return: boolean
+    """
+    return path.exists(get_failed_file_name(queuedir, item))
+
+
+def try_lease(queuedir, item, worker, expiry=3600):
+    """Try to lease an item, reclaiming leases that have not been renewed
+       within the expiry time (i.e. from crashed workers)
+
+    :param queuedir: shared queue directory, string
+    :param item: queue item, string
+    :param worker: worker identifier, string
+    :param expiry: seconds until an unrenewed lease may be reclaimed, float
+    :return: True if leased, otherwise False
+    """
+    if is_done(queuedir, item) or is_failed(queuedir, item):
+        return False
+    leasefile = get_lease_file_name(queuedir, item)
+    for attempt in range(2):
+        try:
+            # Exclusive creation is atomic, also over NFS (v3 and later)
+            descriptor = os_open(leasefile, O_CREAT | O_EXCL | O_WRONLY)
+        except FileExistsError:
+            try:
+                observed = stat(leasefile)
+                age = queue_time(queuedir, worker) - observed.st_mtime
+            except FileNotFoundError:
+                # Released or completed while we were looking; try again
+                continue
+            if age < expiry:
+                return False
+            # Only one of the workers racing for the expired lease will
+            # succeed in moving it out of the way
+            stale = "{}.{}.stale".format(leasefile, worker)
+            try:
+                rename(leasefile, stale)
+            except FileNotFoundError:
+                return False
+            # Another worker may have reclaimed the expired lease and taken a
+            # fresh one between our stat and rename, or the owner renewed it;
+            # then we moved the wrong lease, and must put it back
+            moved = stat(stale)
+            if (moved.st_ino, moved.st_mtime) != \
+                    (observed.st_ino, observed.st_mtime):
+                try:
+                    # Unlike rename, link never replaces an existing lease
+                    link(stale, leasefile)
+                except FileExistsError:
+                    pass
+                remove(stale)
+                return False
+            remove(stale)
+            continue
+        write(descriptor, "{}\n".format(worker).encode())
+        close(descriptor)
+        # The item may have been completed right before we got the lease
+        if is_done(queuedir, item):
+            release_item(queuedir, item)
+            return False
+        return True
+    return False
+
+
+def renew_leases(queuedir, items):
+    """Renew leases held by this worker, touching the lease files
+
+    :param queuedir: shared queue directory, string
+    :param items: iterable of leased items
+    """
+    for item in items:
+        try:
+            utime(get_lease_file_name(queuedir, item))
+        except FileNotFoundError:
+            pass
+
+
+def keep_leases(queuedir, held, interval=600):
+    """Start a background thread periodically renewing leased items
+
+    :param queuedir: shared queue directory, string
+    :param held: set of leased items; may be altered while thread is running
+    :param interval: seconds between renewals, should be well below the lease
+                     expiry time, float
+    :return: threading.Event, set it to stop the renewals
+    """
+    stop = Event()
+
+    def renew():
+        while not stop.wait(interval):
+            renew_leases(queuedir, list(held))
+
+    Thread(target=renew, daemon=True).start()
+    return stop
+
+
+def complete_item(queuedir, item):
+    """Mark a leased item as done and drop the lease
+
+    :param queuedir: shared queue directory, string
+    :param item: queue item, string
+    """
+    with open(get_done_file_name(queuedir, item), 'w'):
+        pass
+    release_item(queuedir, item)
+
+
+def fail_item(queuedir, item):
+    """Mark a leased item as failed and drop the lease, so that no worker
+       takes it again until it is retried, see retry_item
+
+    :param queuedir: shared queue directory, string
+    :param item: queue item, string
+    """
+    with open(get_failed_file_name(queuedir, item), 'w'):
+        pass
+    release_item(queuedir, item)
+
+
+def retry_item(queuedir, item):
+    """Let workers take a failed item again
+
+    :param queuedir: shared queue directory, string
+    :param item: queue item, string
+    """
+    try:
+        remove(get_failed_file_name(queuedir, item))
+    except FileNotFoundError:
+        pass
+
+
+def release_item(queuedir, item):
+    """Drop the lease of an item, without completing it
+
+    :param queuedir: shared queue directory, string
+    :param item: queue item, string
+    """
+    try:
+        remove(get_lease_file_name(queuedir, item))
+    except FileNotFoundError:
+        pass
+
+
+def work_queue(queuedir, items, worker=None, expiry=3600, poll=60):
+    """Iterate over the items this worker manages to lease from a shared queue.
+       An item is marked done when the next item is requested, and released
+       if iteration is abandoned (e.g. on an exception). Items leased by other
+       workers are polled until done, or until their lease expires and they
+       can be reclaimed.
+
+    :param queuedir: shared queue directory, string
+    :param items: iterable of items (target identifiers) to process
+    :param worker: worker identifier, default=get_worker_id()
+    :param expiry: seconds until an unrenewed lease may be reclaimed, float
+    :param poll: seconds between checks of items leased by others, float
+    :return: generator of leased items
+    """
+    if worker is None:
+        worker = get_worker_id()
+    makedirs(queuedir, exist_ok=True)
+    remaining = [item for item in items if not is_done(queuedir, item)]
+    held = set()
+    stop = keep_leases(queuedir, held, interval=expiry / 3)
+    try:
+        while remaining:
+            waiting = []
+            for item in remaining:
+                if not try_lease(queuedir, item, worker, expiry=expiry):
+                    if not is_done(queuedir, item) and \
+                            not is_failed(queuedir, item):
+                        waiting.append(item)
+                    continue
+                held.add(item)
+                yield item
+                complete_item(queuedir, item)
+                held.discard(item)
+            remaining = waiting
+            if remaining:
+                sleep(poll)
+    finally:
+        stop.set()
+        for item in held:
+            release_item(queuedir, item)
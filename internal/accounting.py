@@ -0,0 +1,37 @@
+from os import wait4, waitstatus_to_exitcode
+from subprocess import PIPE, Popen
+from time import perf_counter, time
+
+
+def run_accounted(cmd, stdout=None, stderr=None, env=None):
+    """Run a command, measuring the resources used by its process alone (by
+       os.wait4, so that concurrent runs in other threads do not mix in)
+
+    :param cmd: list of command arguments
+    :param stdout: as for subprocess.Popen; with subprocess.PIPE the output is
+                   read and returned
+    :param stderr: as for subprocess.Popen, except subprocess.PIPE
+    :param env: environment of the process, dictionary; None to inherit
+    :return: tuple with
+             1. exit status, integer (negative signal number if killed)
+             2. bytes of output, None unless stdout is subprocess.PIPE
+             3. dictionary with keys started (epoch time), wall, user and
+                system seconds and maxrss, the peak resident set size in
+                kilobytes (on Linux, bytes on macOS)
+    """
+    if stderr == PIPE:
+        raise ValueError("stderr can not be a pipe, use a file or STDOUT")
+    started = time()
+    wall = perf_counter()
+    process = Popen(cmd, stdout=stdout, stderr=stderr, env=env)
+    output = None
+    if process.stdout is not None:
+        with process.stdout:
+            output = process.stdout.read()
+    # Reap the process here rather than through Popen, for its rusage
+    (pid, status, usage) = wait4(process.pid, 0)
+    wall = perf_counter() - wall
+    process.returncode = waitstatus_to_exitcode(status)
+    return process.returncode, output, {
+        "started": started, "wall": wall, "user": usage.ru_utime,
+        "system": usage.ru_stime, "maxrss": usage.ru_maxrss}
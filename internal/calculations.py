@@ -1,2 +1,336 @@
+from numpy import add, arange, argsort, array, asarray, bincount, concatenate, \
+    cumsum, diff, empty, errstate, flatnonzero, isnan, lexsort, linspace, \
+    maximum, nan, nanmean, searchsorted, sqrt, swapaxes, unique, where, zeros
+from numpy.random import default_rng
+from .instrument import timed_stage
+
+
 def d2S(x, d0):
     return 1.0 / (1.0 + (x / d0)**2)
+
+
+def rank_columns(values):
+    """Rank each column of a table separately, averaging ties and keeping
+       missing values (NaN) missing
+
+    :param values: 2D numpy array of floats, NaN for missing values
+    :return: 2D numpy array of float ranks, starting at 1
+    """
+    return rank_groups(values, zeros(len(values)))
+
+
+def rank_groups(values, groups):
+    """Rank each column within each group of rows, averaging ties and keeping
+       missing values (NaN) missing; all groups at once
+
+    :param values: 2D numpy array of floats, NaN for missing values
+    :param groups: 1D array with a group identifier per row
+    :return: 2D numpy array of float ranks, starting at 1 in each group
+    """
+    values = asarray(values, dtype=float)
+    ranks = empty(values.shape)
+    ranks.fill(nan)
+    rows = len(values)
+    if rows == 0:
+        return ranks
+    number = unique(asarray(groups), return_inverse=True)[1].reshape(-1)
+    index = arange(rows)
+    for column in range(values.shape[1]):
+        # Sort by group, then value; missing values last in each group
+        order = lexsort((values[:, column], number))
+        x = values[order, column]
+        g = number[order]
+        new_group = concatenate(([True], g[1:] != g[:-1]))
+        position = index - maximum.accumulate(where(new_group, index, 0)) + 1
+        # Average the ranks over each run of tied values
+        new_run = new_group | concatenate(([True], x[1:] != x[:-1]))
+        starts = flatnonzero(new_run)
+        counts = diff(concatenate((starts, [rows])))
+        average = position[starts] + (counts - 1) / 2.0
+        ranked = average[cumsum(new_run) - 1]
+        ranked[isnan(x)] = nan
+        ranks[order, column] = ranked
+    return ranks
+
+
+def accumulate_correlation(values, sums=None):
+    """Add a chunk of rows to the pairwise complete sums needed for Pearson
+       correlation between all columns; rows missing (NaN) one column of a pair
+       are skipped for that pair only, like pandas.DataFrame.corr()
+
+    :param values: 2D numpy array of floats, NaN for missing values
+    :param sums: dictionary of sums from earlier chunks, None for first chunk
+    :return: dictionary of numpy arrays with the sums; n, shift and for all
+             column pairs (i, j) the sums of x_i, x_i * x_j and x_i ** 2 over
+             rows where both are present
+    """
+    values = asarray(values, dtype=float)
+    columns = values.shape[1]
+    if sums is None:
+        # Shift by a rough column mean, for numerical stability of the sums
+        with errstate(all="ignore"):
+            shift = nanmean(values, axis=0) if len(values) else zeros(columns)
+        shift = where(isnan(shift), 0.0, shift)
+        sums = {"shift": shift, "n": zeros((columns, columns)),
+                "x": zeros((columns, columns)),
+                "xy": zeros((columns, columns)),
+                "xx": zeros((columns, columns))}
+    present = ~isnan(values)
+    mask = present.astype(float)
+    x = where(present, values - sums["shift"], 0.0)
+    sums["n"] += mask.T @ mask
+    sums["x"] += x.T @ mask
+    sums["xy"] += x.T @ x
+    sums["xx"] += (x * x).T @ mask
+    return sums
+
+
+def correlation_from_sums(sums):
+    """Pearson correlation matrix from accumulated pairwise complete sums
+
+    :param sums: dictionary of sums, see accumulate_correlation
+    :return: 2D numpy array of correlation coefficients, NaN where undefined
+    """
+    n = sums["n"]
+    x = sums["x"]
+    # Sums of the second column in each pair; also for stacked matrices
+    y = swapaxes(x, -1, -2)
+    xx = sums["xx"]
+    yy = swapaxes(xx, -1, -2)
+    with errstate(all="ignore"):
+        covariance = n * sums["xy"] - x * y
+        correlation = covariance / sqrt((n * xx - x * x) * (n * yy - y * y))
+    # Pairs with too few rows or no variance have no correlation
+    correlation[n < 2] = nan
+    return correlation
+
+
+@timed_stage("correlation", unit="rows",
+             count=lambda result, *args, **kwargs: int(result[1].max()))
+def stream_correlation(chunks, keys=0, group=None, transforms=None,
+                       rank=False):
+    """Correlate all value columns of a table read chunk by chunk, keeping only
+       the sums in memory
+
+    :param chunks: iterable of chunks, each a list of rows (tuples) with
+                   leading key columns followed by value columns; None for
+                   missing values
+    :param keys: number of leading key columns in each row
+    :param group: index of the key column identifying groups of rows for
+                  ranking; None to rank each chunk as a whole. A group must not
+                  be split over chunks
+    :param transforms: dictionary with value column indices as keys and
+                       vectorised functions as values, applied before
+                       correlating (e.g. distance to score conversion)
+    :param rank: if True, correlate ranks within each group (Spearman) rather
+                 than the values (Pearson)
+    :return: tuple of correlation matrix and matrix with number of pairwise
+             complete rows, both 2D numpy arrays
+    """
+    sums = None
+    for chunk in chunks:
+        if len(chunk) == 0:
+            continue
+        table = array([row[keys:] for row in chunk], dtype=float)
+        if transforms is not None:
+            for column in transforms:
+                table[:, column] = transforms[column](table[:, column])
+        if rank:
+            if group is None:
+                table = rank_columns(table)
+            else:
+                table = rank_groups(table, [row[group] for row in chunk])
+        sums = accumulate_correlation(table, sums=sums)
+    if sums is None:
+        raise ValueError("No rows to correlate")
+    return correlation_from_sums(sums), sums["n"]
+
+
+@timed_stage("correlation", unit="rows",
+             count=lambda result, values, *args, **kwargs: len(values))
+def grouped_correlation(values, groups, rank=False, blocksize=None):
+    """Correlate all columns within each group of rows, for all groups at
+       once, using group reductions rather than a table per group
+
+    :param values: 2D numpy array of floats, NaN for missing values
+    :param groups: 1D array with a group identifier per row (e.g. model or
+                   target), rows need not be sorted
+    :param rank: if True, correlate ranks within each group (Spearman) rather
+                 than the values (Pearson)
+    :param blocksize: rows reduced at a time, default keeps the temporary
+                      pairwise products at about 512 kB, i.e. in cache
+    :return: tuple of sorted group identifiers, stacked correlation matrices
+             and stacked matrices with the number of pairwise complete rows,
+             the latter two 3D numpy arrays indexed (group, column, column)
+    """
+    values = asarray(values, dtype=float)
+    (keys, number) = unique(asarray(groups), return_inverse=True)
+    number = number.reshape(-1)
+    if rank:
+        values = rank_groups(values, number)
+    # Rows of each group consecutive, as needed by reduceat
+    order = argsort(number, kind="stable")
+    values = values[order]
+    number = number[order]
+    (rows, columns) = values.shape
+    present = ~isnan(values)
+    mask = present.astype(float)
+    x = where(present, values, 0.0)
+
+    sums = {name: zeros((len(keys), columns, columns))
+            for name in ("n", "x", "xy", "xx")}
+    if rows == 0:
+        return keys, correlation_from_sums(sums), sums["n"]
+
+    # Shift each group by its column means, for numerical stability
+    starts = concatenate(([0], flatnonzero(number[1:] != number[:-1]) + 1))
+    with errstate(all="ignore"):
+        shift = add.reduceat(x, starts) / add.reduceat(mask, starts)
+    shift = where(isnan(shift), 0.0, shift)
+    x = where(present, x - shift[number], 0.0)
+
+    if blocksize is None:
+        blocksize = max(1, 2 ** 16 // (columns * columns))
+    for start in range(0, rows, blocksize):
+        m = mask[start:start + blocksize]
+        v = x[start:start + blocksize]
+        g = number[start:start + blocksize]
+        segments = concatenate(([0], flatnonzero(g[1:] != g[:-1]) + 1))
+        group = g[segments]
+        sums["n"][group] += add.reduceat(m[:, :, None] * m[:, None, :],
+                                         segments)
+        sums["x"][group] += add.reduceat(v[:, :, None] * m[:, None, :],
+                                         segments)
+        sums["xy"][group] += add.reduceat(v[:, :, None] * v[:, None, :],
+                                          segments)
+        sums["xx"][group] += add.reduceat((v * v)[:, :, None] * m[:, None, :],
+                                          segments)
+    return keys, correlation_from_sums(sums), sums["n"]
+
+
+def get_column_ranges(arrays, columns, default=(0.0, 1.0)):
+    """Lowest and highest value of each column over a set of arrays, ignoring
+       missing values
+
+    :param arrays: iterable of 2D numpy arrays of floats, NaN for missing
+                   values, all with the same columns
+    :param columns: number of columns, integer
+    :param default: (low, high) tuple for columns without any value
+    :return: list of (low, high) tuples, one per column
+    """
+    lows = [None] * columns
+    highs = [None] * columns
+    for values in arrays:
+        for column in range(columns):
+            x = values[:, column]
+            x = x[~isnan(x)]
+            if len(x) == 0:
+                continue
+            lows[column] = x.min() if lows[column] is None else \
+                min(lows[column], x.min())
+            highs[column] = x.max() if highs[column] is None else \
+                max(highs[column], x.max())
+    return [(low, high) if low is not None else default
+            for (low, high) in zip(lows, highs)]
+
+
+def get_bin_edges(ranges, bins=100):
+    """Equally wide histogram bins for each column
+
+    :param ranges: list of (low, high) tuples, one per column
+    :param bins: number of bins per column
+    :return: list of numpy arrays with bins + 1 edges, one per column
+    """
+    edges = []
+    for (low, high) in ranges:
+        if low == high:
+            (low, high) = (low - 0.5, high + 0.5)
+        edges.append(linspace(low, high, bins + 1))
+    return edges
+
+
+def bin_columns(values, edges):
+    """Bin number of each value, per column; the last bin includes its upper
+       edge
+
+    :param values: 2D numpy array of floats, NaN for missing values
+    :param edges: list of numpy arrays with bin edges, one per column, all
+                  with the same number of bins
+    :return: 2D numpy array of integer bins, -1 for missing or out of range
+    """
+    binned = empty(values.shape, dtype=int)
+    for column in range(values.shape[1]):
+        x = values[:, column]
+        bins = len(edges[column]) - 1
+        index = searchsorted(edges[column], x, side="right") - 1
+        index[x == edges[column][-1]] = bins - 1
+        index[(index < 0) | (index >= bins) | isnan(x)] = -1
+        binned[:, column] = index
+    return binned
+
+
+def accumulate_histograms(values, edges, histograms=None):
+    """Add a chunk of rows to the histograms of each column and the 2D
+       histograms of each column pair, counting the rows where both are
+       present
+
+    :param values: 2D numpy array of floats, NaN for missing values
+    :param edges: list of numpy arrays with bin edges, one per column, all
+                  with the same number of bins
+    :param histograms: dictionary of histograms from earlier chunks, None for
+                       first chunk
+    :return: dictionary with column index tuples (i, j), i <= j, as keys and
+             numpy arrays of integer counts as values; 1D for i == j, else 2D
+             indexed by the bins of column i and j
+    """
+    columns = values.shape[1]
+    bins = len(edges[0]) - 1
+    if histograms is None:
+        histograms = {}
+        for i in range(columns):
+            histograms[(i, i)] = zeros(bins, dtype=int)
+            for j in range(i + 1, columns):
+                histograms[(i, j)] = zeros((bins, bins), dtype=int)
+    binned = bin_columns(values, edges)
+    present = binned >= 0
+    for i in range(columns):
+        histograms[(i, i)] += bincount(binned[present[:, i], i],
+                                       minlength=bins)
+        for j in range(i + 1, columns):
+            both = present[:, i] & present[:, j]
+            histograms[(i, j)] += bincount(
+                binned[both, i] * bins + binned[both, j],
+                minlength=bins * bins).reshape(bins, bins)
+    return histograms
+
+
+def sample_strata(values, strata, size, sample=None, seed=None):
+    """Keep a uniform random sample of at most size rows per stratum (e.g. per
+       target) over a stream of chunks, so that small strata are represented
+       as well as large ones
+
+    :param values: 2D numpy array with the rows of this chunk
+    :param strata: 1D array with a stratum identifier per row
+    :param size: maximum number of rows to keep per stratum
+    :param sample: tuple of sample from earlier chunks, None for first chunk
+    :param seed: seed for the random generator, used on first chunk
+    :return: tuple of sampled rows, their strata, random sort keys and the
+             random generator; pass it on as sample with the next chunk
+    """
+    if sample is None:
+        sample = (values[:0], asarray(strata)[:0], zeros(0), default_rng(seed))
+    (kept, kept_strata, kept_keys, generator) = sample
+    # Keeping the rows with the smallest random keys is a uniform sample
+    rows = concatenate((kept, values))
+    strata = concatenate((kept_strata, asarray(strata)))
+    keys = concatenate((kept_keys, generator.random(len(values))))
+    if len(rows) == 0:
+        return rows, strata, keys, generator
+    number = unique(strata, return_inverse=True)[1].reshape(-1)
+    order = lexsort((keys, number))
+    number = number[order]
+    index = arange(len(order))
+    new_group = concatenate(([True], number[1:] != number[:-1]))
+    position = index - maximum.accumulate(where(new_group, index, 0))
+    keep = order[position < size]
+    return rows[keep], strata[keep], keys[keep], generator
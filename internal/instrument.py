@@ -0,0 +1,292 @@
+from atexit import register
+from contextlib import contextmanager
+from functools import wraps
+from inspect import isgeneratorfunction
+from json import dump
+from sys import argv, stderr
+from threading import Lock
+from time import perf_counter, process_time
+import tracemalloc
+from ..definitions import pragma_profiles
+
+
+# Measurements accumulated per stage name, in this process; stages nest, and
+# the time of an inner stage is included in the outer
+stage_records = {}
+
+# Traced memory at the start of, and peak seen in, each open stage of any
+# thread, see stage; resetting the peak for a stage loses the overall peak,
+# so that is kept as well
+memory_frames = []
+memory_peak_overall = {"bytes": 0}
+
+# Guards the above, as stages may run in several threads at once
+instrument_lock = Lock()
+
+# Optional captures on top of the stage timings, see start_instrumentation
+trace_options = ["cprofile", "tracemalloc"]
+
+# Start of instrumentation, wall and CPU seconds
+instrumentation_start = {"wall": perf_counter(), "cpu": process_time()}
+
+
+def record_stage(name, wall, cpu, calls=1, items=0, unit=None, memory=None):
+    """Add measurements to the record of a stage
+
+    :param name: stage name, string
+    :param wall: wall time spent, seconds
+    :param cpu: CPU time spent by this process, seconds
+    :param calls: number of calls to add
+    :param items: number of items (files, rows, etc.) processed
+    :param unit: name of items, string
+    :param memory: peak traced memory above the start of the stage, bytes
+    """
+    with instrument_lock:
+        record = stage_records.setdefault(name, {
+            "calls": 0, "wall": 0.0, "cpu": 0.0, "items": 0, "unit": None,
+            "memory": None})
+        record["calls"] += calls
+        record["wall"] += wall
+        record["cpu"] += cpu
+        record["items"] += items
+        if unit is not None:
+            record["unit"] = unit
+        if memory is not None:
+            record["memory"] = memory if record["memory"] is None else \
+                max(record["memory"], memory)
+
+
+def fold_memory_peak():
+    """Add the traced memory peak since the last reset to every open stage,
+       and reset it; call holding instrument_lock
+
+    :return: currently traced memory, bytes
+    """
+    (current, peak) = tracemalloc.get_traced_memory()
+    memory_peak_overall["bytes"] = max(memory_peak_overall["bytes"], peak)
+    for frame in memory_frames:
+        frame["peak"] = max(frame["peak"], peak)
+    tracemalloc.reset_peak()
+    return current
+
+
+@contextmanager
+def stage(name, unit=None, calls=1):
+    """Time a block of code as a stage; count processed items by adding to
+       the "items" key of the yielded dictionary
+
+    :param name: stage name, string
+    :param unit: name of items, string
+    :param calls: number of calls to count for the block
+    :return: context manager, yielding a dictionary with key "items"
+    """
+    counter = {"items": 0}
+    frame = None
+    if tracemalloc.is_tracing():
+        # The peak counter is global, to the process, so hand the peak to
+        # the open stages (enclosing ones, and those of other threads)
+        # before resetting it; memory is process wide, so the peak of a
+        # stage includes what concurrent stages allocate
+        with instrument_lock:
+            current = fold_memory_peak()
+            frame = {"start": current, "peak": current}
+            memory_frames.append(frame)
+    wall = perf_counter()
+    cpu = process_time()
+    try:
+        yield counter
+    finally:
+        wall = perf_counter() - wall
+        cpu = process_time() - cpu
+        memory = None
+        if frame is not None:
+            with instrument_lock:
+                if tracemalloc.is_tracing():
+                    fold_memory_peak()
+                    memory = max(0, frame["peak"] - frame["start"])
+                memory_frames.remove(frame)
+        record_stage(name, wall, cpu, calls=calls, items=counter["items"],
+                     unit=unit, memory=memory)
+
+
+def timed_stage(name, unit=None, count=None):
+    """Decorate a function to time its calls as a stage; for generator
+       functions only the time spent inside the generator is counted
+
+    :param name: stage name, string
+    :param unit: name of items, string
+    :param count: function of the return value (for generators, of each
+                  yielded value) followed by the call arguments, returning the
+                  number of items processed; None to count nothing
+    :return: decorator
+    """
+    def decorator(function):
+        if isgeneratorfunction(function):
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                generator = function(*args, **kwargs)
+                calls = 1
+                try:
+                    while True:
+                        with stage(name, unit=unit, calls=calls) as counter:
+                            calls = 0
+                            try:
+                                value = next(generator)
+                            except StopIteration:
+                                return
+                            if count is not None:
+                                counter["items"] += count(value, *args,
+                                                          **kwargs)
+                        yield value
+                finally:
+                    generator.close()
+        else:
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                with stage(name, unit=unit) as counter:
+                    value = function(*args, **kwargs)
+                    if count is not None:
+                        counter["items"] += count(value, *args, **kwargs)
+                return value
+        return wrapper
+    return decorator
+
+
+def get_stage_report():
+    """Summarise the stage records
+
+    :return: dictionary with stage names as keys and dictionaries of calls,
+             wall and CPU seconds, items, their unit, items per wall second
+             and peak traced memory (if tracing) as values
+    """
+    report = {}
+    for (name, record) in stage_records.items():
+        report[name] = {
+            "calls": record["calls"],
+            "wall_seconds": record["wall"],
+            "cpu_seconds": record["cpu"],
+            "items": record["items"],
+            "unit": record["unit"],
+            "items_per_second": record["items"] / record["wall"]
+            if record["items"] and record["wall"] > 0 else None}
+        if record["memory"] is not None:
+            report[name]["peak_memory_bytes"] = record["memory"]
+    return report
+
+
+def get_cprofile_report(profiler, top=25):
+    """Functions with the most cumulative time in a profile
+
+    :param profiler: cProfile.Profile object, disabled
+    :param top: number of functions to list
+    :return: list of dictionaries with function, calls, own and cumulative
+             seconds
+    """
+    from pstats import Stats
+    statistics = Stats(profiler).stats
+    functions = sorted(statistics.items(), key=lambda item: -item[1][3])
+    return [{"function": "{}:{}({})".format(*function),
+             "calls": calls, "total_seconds": total,
+             "cumulative_seconds": cumulative}
+            for (function, (primitive, calls, total, cumulative, callers))
+            in functions[:top]]
+
+
+def get_tracemalloc_report(top=10):
+    """Peak traced memory and the lines holding the most memory now
+
+    :param top: number of lines to list
+    :return: dictionary with peak bytes and list of dictionaries with line and
+             bytes
+    """
+    peak = max(memory_peak_overall["bytes"],
+               tracemalloc.get_traced_memory()[1])
+    statistics = tracemalloc.take_snapshot().statistics("lineno")
+    return {"peak_bytes": peak,
+            "lines": [{"line": str(statistic.traceback), "bytes": statistic.size,
+                       "blocks": statistic.count}
+                      for statistic in statistics[:top]]}
+
+
+def write_instrumentation_report(report_file=None, profiler=None):
+    """Write the JSON report of stages and captures; run at exit, see
+       start_instrumentation
+
+    :param report_file: report filename, None or "-" for standard error; with
+                        cProfile, the profile is saved as report_file.prof
+    :param profiler: enabled cProfile.Profile object, None if not profiling
+    """
+    report = {"command": argv,
+              "wall_seconds": perf_counter() - instrumentation_start["wall"],
+              "cpu_seconds": process_time() - instrumentation_start["cpu"],
+              "stages": get_stage_report()}
+    if profiler is not None:
+        profiler.disable()
+        report["cprofile"] = get_cprofile_report(profiler)
+        if report_file not in (None, "-"):
+            profiler.dump_stats(report_file + ".prof")
+    if tracemalloc.is_tracing():
+        report["tracemalloc"] = get_tracemalloc_report()
+        tracemalloc.stop()
+    if report_file in (None, "-"):
+        dump(report, stderr, indent=2)
+        stderr.write("\n")
+    else:
+        with open(report_file, 'w') as outfile:
+            dump(report, outfile, indent=2)
+
+
+def add_instrument_arguments(parser, profile=None):
+    """Add the options of start_instrumentation to a command line parser, as
+       a group along with the SQLite PRAGMA profile of programs using a
+       database
+
+    :param parser: argparse.ArgumentParser
+    :param profile: default name of PRAGMA settings, see
+                    database.connect_database; None for no -profile option
+    :return: the argument group
+    """
+    group = parser.add_argument_group("performance options")
+    if profile is not None:
+        group.add_argument(
+            "-profile", nargs=1, default=[profile], metavar="str",
+            help="SQLite PRAGMA profile [" + ",".join(pragma_profiles) +
+                 "], default=" + profile)
+    group.add_argument(
+        "-report", nargs=1, default=[None], metavar="FILE",
+        help="Write a JSON report of wall and CPU time, calls and " +
+             "throughput per stage to FILE, - for stderr, default=None")
+    group.add_argument(
+        "-trace", nargs=1, default=[None], metavar="str",
+        help="Add captures to the report [" + ",".join(trace_options) +
+             "], default=None")
+    return group
+
+
+def start_instrumentation(report_file=None, trace=None):
+    """Start capturing, and write the report when the program exits; does
+       nothing unless a report file or trace is given
+
+    :param report_file: report filename, "-" for standard error
+    :param trace: comma separated string of trace_options, None for stage
+                  timings only
+    :return: True if instrumentation was started
+    """
+    trace = [] if trace is None else trace.split(',')
+    for option in trace:
+        if option not in trace_options:
+            raise ValueError("Unknown trace option '{}', expected one of {}".format(
+                option, ",".join(trace_options)))
+    if report_file is None and not trace:
+        return False
+    instrumentation_start["wall"] = perf_counter()
+    instrumentation_start["cpu"] = process_time()
+    profiler = None
+    if "tracemalloc" in trace:
+        tracemalloc.start()
+    if "cprofile" in trace:
+        from cProfile import Profile
+        profiler = Profile()
+        profiler.enable()
+    register(write_instrumentation_report, report_file, profiler)
+    return True
@@ -1,12 +1,11 @@
 #!/usr/bin/env python3
 import numpy
-import seaborn as sns
-import matplotlib.pyplot as plt
 from .database import get_model_correlates as database_get_model_correlates
 from .database import get_correlates as database_get_correlates
 from .database import get_models as database_get_models
-from internal.data import remove_residue_column
-from interface.pandas import get_dataframe, score_column
+from .internal.data import remove_residue_column
+from .interface.pandas import get_dataframe, score_column
+from .internal.instrument import timed_stage
 
 
 '''
@@ -68,12 +67,24 @@ def get_model_correlats(database, model, methods):
     return database_get_model_correlates(database, model, methods)
 
 
-def plot_correlates(correlates):
+@timed_stage("plotting", unit="figures", count=lambda *args, **kwargs: 1)
+def plot_correlates(correlates, matrix=False):
+    """Plot a heatmap of correlations between methods
+
+    :param correlates: Pandas DataFrame with a column of scores per method, or
+                       a correlation matrix if matrix is True (e.g. from
+                       interface/plotting.py correlation_matrix_local)
+    :param matrix: if True, correlates is already a correlation matrix
+    :return: tuple of figure and correlation matrix
+    """
+    # Drawing libraries are slow to import, so only when plotting
+    import matplotlib.pyplot as plt
+    import seaborn as sns
     # seaborn setting
     sns.set(style="white")
 
-    # Get correlation matrix via pandas
-    corrmatrix = correlates.corr()
+    # Get correlation matrix via pandas, unless already computed
+    corrmatrix = correlates if matrix else correlates.corr()
 
     # Generate a mask for the upper triangle
     mask = numpy.zeros_like(corrmatrix, dtype=numpy.bool)
@@ -88,4 +99,58 @@ def plot_correlates(correlates):
     # Draw the heatmap with the mask and correct aspect ratio
     sns.heatmap(corrmatrix, mask=mask, cmap=cmap, vmax=.3, center=0,
                     square=True, linewidths=.5, cbar_kws={"shrink": .5})
-    return (f, corrmatrix)
\ No newline at end of file
+    return (f, corrmatrix)
+
+
+def plot_seaborn_hexbin(a, b):
+    # Drawing libraries are slow to import, so only when plotting
+    import numpy
+    import seaborn
+    from scipy.stats import kendalltau
+    # Seaborn settings
+    seaborn.set(style="ticks")
+    x = numpy.array(a)
+    y = numpy.array(b)
+    return seaborn.jointplot(x, y, kind="hex", stat_func=kendalltau, color="#4CB391")
+
+
+@timed_stage("plotting", unit="figures", count=lambda *args, **kwargs: 1)
+def plot_density(histograms, edges, names, sample=None):
+    """Plot a grid of density panels of method pairs from binned correlates,
+       with the histogram of each method on the diagonal; drawn as raster
+       images, so that the figure size does not grow with the data
+
+    :param histograms: dictionary of histograms, see
+                       internal/calculations.py accumulate_histograms
+    :param edges: list of numpy arrays with bin edges, one per method
+    :param names: list of method names
+    :param sample: 2D numpy array of sampled correlates to overlay, or None
+    :return: figure
+    """
+    import matplotlib.pyplot as plt
+    from matplotlib.colors import LogNorm
+    size = len(names)
+    f, axes = plt.subplots(size, size, figsize=(2.5 * size, 2.5 * size),
+                           squeeze=False)
+    for y in range(size):
+        for x in range(size):
+            ax = axes[y][x]
+            if x == y:
+                ax.stairs(histograms[(x, x)], edges[x], fill=True)
+            else:
+                # Histograms are stored for (low, high) method index pairs
+                counts = histograms[(min(x, y), max(x, y))]
+                if x < y:
+                    counts = counts.T
+                ax.pcolormesh(edges[x], edges[y],
+                              numpy.ma.masked_equal(counts, 0),
+                              norm=LogNorm(), cmap="viridis", rasterized=True)
+                if sample is not None:
+                    ax.scatter(sample[:, x], sample[:, y], s=2, c="r",
+                               alpha=0.5, linewidths=0, rasterized=True)
+            if y == size - 1:
+                ax.set_xlabel(names[x])
+            if x == 0:
+                ax.set_ylabel(names[y])
+    f.tight_layout()
+    return f